@@ -14,5 +14,6 @@ from . import config
 from . import alertstates
 from . import templates
 from .alert_generator import generate_alerts
+from .history import History
 from .mailer import mail
 from . import my_runner
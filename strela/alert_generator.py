@@ -1,60 +1,879 @@
-"""Central function to analyze symbols and create alerts."""
+"""Central function to analyze symbols and create alerts. Plus `LiveAlertGenerator`,
+its counterpart for streams of individual history entries (ticks).
+"""
 
-from typing import Callable, List, Type
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import itertools
 import logging
 import traceback
+import numpy as np
 import pandas as pd
-from strela.alertstates import AlertState, BaseAlertStateRepository
+from strela.alertstates import (
+    AlertState,
+    BaseAlertStateRepository,
+    CoMovementAlertState,
+    LiveAlertState,
+)
+from strela.history import (
+    History,
+    HistoryLike,
+    MetricHistories,
+    as_history,
+    select_metric,
+)
+from strela.journal import RunJournal
+from strela.memprofile import MemoryProfiler
+from strela.resampling import DailyResampler
 from strela.symboltype import SymbolType
 from strela.templates import AlertToTextTemplate
+from strela.thresholds import SymbolThresholds
+
+
+@dataclass
+class RunStats:
+    """Counters that `generate_alerts` fills in if you hand it a `RunStats` object."""
+
+    symbols: int = 0
+    """Number of symbols processed."""
+
+    fetch_errors: int = 0
+    """Number of symbols whose history couldn't be fetched."""
+
+    skipped_unchanged: int = 0
+    """Number of symbols skipped because their history hasn't changed since the last
+    evaluation."""
+
+    evaluated: int = 0
+    """Number of symbols for which an alert state was created."""
+
+    alerts: int = 0
+    """Number of alerts generated."""
+
+    prefiltered: int = 0
+    """Number of symbols skipped because their state provably can't be ringing."""
+
+    resumed: int = 0
+    """Number of symbols skipped because an interrupted earlier attempt of the run was
+    done with them already (see `strela.journal`)."""
+
+
+PREFILTER_BATCH_SIZE = 256
+"""Number of symbols `generate_alerts` prefilters at a time."""
 
 
 def generate_alerts(
     alertstate_class: Type[AlertState],
-    metric_history_callback: Callable[[SymbolType], pd.DataFrame],
+    metric_history_callback: Callable[[SymbolType], HistoryLike],
     symbols: List[SymbolType],
     template: AlertToTextTemplate,
     repo: BaseAlertStateRepository,
+    skip_unchanged: bool = True,
+    stats: Optional[RunStats] = None,
+    profiler: Optional[MemoryProfiler] = None,
+    prefilter: bool = True,
+    journal: Optional[RunJournal] = None,
+    resampler: Optional[DailyResampler] = None,
+    thresholds: Optional[SymbolThresholds] = None,
 ) -> list[str]:
     """Check list of symbols and return a list of alert strings. Returns empty list if
     no alerts are found.
 
     - `alertstate_class`: The `strela.alertstates.AlertState` subclass to be used to
       track state and determine whether an alert has been triggered.
-    - `get_metrichistory_callback`: Callback that returns historic data for the given
-      symbol and the metric under observation as a dataframe. The dataframe must have
-      timestamps as the index and exactly one column with the metric.
+    - `metric_history_callback`: Callback that returns historic data for the given
+      symbol and the metric under observation, either as a `strela.history.History`
+      or as a dataframe. The dataframe must have timestamps as the index and exactly
+      one column with the metric. If the callback has an `iter_histories` method,
+      like `strela.fetchscheduler.FetchScheduler`, all histories are fetched through
+      that method instead. (Wrap batch callbacks, which fetch many symbols at once, in
+      a `strela.callbacks.BatchCallback`.)
     - `symbols`: The list of symbols to be analyzed.
     - `template`: The template to use to generate the alert text.
     - `repo`: The repository to use to retrieve and store the state of alerts.
+    - `skip_unchanged`: Skip symbols whose history has the same fingerprint (see
+      `strela.history.History.fingerprint`) as when they were last evaluated. Their
+      state can't have changed, so they can't produce a new alert.
+    - `stats`: A `RunStats` object to be filled in with counters for this run.
+    - `profiler`: A `strela.memprofile.MemoryProfiler` to record the memory usage of
+      the stages "fetch", "state" (state construction), "repository", and "render".
+      (Allocations of callbacks that fetch in background threads, like
+      `strela.fetchscheduler.FetchScheduler`, count towards whichever stage runs at
+      the time.)
+    - `prefilter`: Skip the full evaluation of symbols whose state provably can't be
+      ringing or active according to `strela.alertstates.AlertState.could_ring`, which
+      is evaluated for batches of `PREFILTER_BATCH_SIZE` symbols at a time. Doesn't
+      change the result.
+    - `journal`: A `strela.journal.RunJournal` to record the progress in, so that an
+      interrupted run can be resumed. The result then includes the alerts that are
+      still pending from the interrupted attempt. Call `RunJournal.complete` once the
+      alerts are delivered.
+    - `resampler`: A `strela.resampling.DailyResampler` to reduce intraday histories to
+      one entry per day before they are evaluated.
+    - `thresholds`: A `strela.thresholds.SymbolThresholds` table with the thresholds
+      of the symbols that don't use the class-wide ones of `alertstate_class`.
 
     Note that this function is kept very generic so you can plug in your own building
     blocks.
     """
-    repo.backup()
-    alerts = []
-    for symbol in symbols:
-        # Get metric history:
-        try:
-            hist = metric_history_callback(symbol)
-        except Exception:   # pylint: disable=broad-except
-            logging.error(traceback.format_exc())
+    return [
+        alert
+        for _, alert in _generate_alerts(
+            alertstate_class,
+            metric_history_callback,
+            symbols,
+            template,
+            repo,
+            skip_unchanged,
+            stats,
+            profiler,
+            prefilter,
+            journal,
+            resampler,
+            thresholds,
+        )
+    ]
+
+
+def generate_symbol_alerts(*args, **kwargs) -> List[Tuple[SymbolType, str]]:
+    """Same as `generate_alerts` (and with the same arguments) but return a list of
+    tuples of symbol and alert string.
+    """
+    return _generate_alerts(*args, **kwargs)
+
+
+@dataclass
+class AlertJob:
+    """An alert state class to be evaluated on one metric of the symbols' histories,
+    see `generate_job_alerts`.
+    """
+
+    alertstate_class: Type[AlertState]
+    """The `strela.alertstates.AlertState` subclass to be used."""
+
+    template: AlertToTextTemplate
+    """The template to use to generate the alert text. (Its `metric_name` should
+    match `metric`.)"""
+
+    repo: BaseAlertStateRepository
+    """The repository for the states of this job. Every job needs its own."""
+
+    metric: Optional[str] = None
+    """The metric to evaluate, i.e., the column of a dataframe or the key of a mapping
+    (see `strela.history.select_metric`). `None` if the histories are single metric
+    histories."""
+
+    stats: RunStats = field(default_factory=RunStats)
+    """Counters for this job, filled in by `generate_job_alerts`. (Symbols that don't
+    have the job's metric count as processed but not as evaluated.)"""
+
+    journal: Optional[RunJournal] = None
+    """The journal of this job, see the `journal` argument of `generate_alerts`."""
+
+    resampler: Optional[DailyResampler] = None
+    """The resampler of this job, see the `resampler` argument of `generate_alerts`.
+    (E.g., to reduce a price history to its daily lows for a double-down job and to its
+    closes for a fluctulert job.)"""
+
+    symbols: Optional[Mapping[str, SymbolType]] = None
+    """The symbols this job evaluates, by name, if not all of them. The job's alerts
+    are rendered with these symbol objects, which can differ from the ones handed to
+    `generate_job_alerts` (e.g., carry a tenant's own strategy information, see
+    `strela.multitenant`)."""
+
+    thresholds: Optional[SymbolThresholds] = None
+    """The per-symbol thresholds of this job, see the `thresholds` argument of
+    `generate_alerts`. (Changing a symbol's thresholds counts as a change of its
+    history for `skip_unchanged`.)"""
+
+
+def generate_job_alerts(
+    jobs: List[AlertJob],
+    metric_history_callback: Callable[[SymbolType], MetricHistories],
+    symbols: List[SymbolType],
+    skip_unchanged: bool = True,
+    profiler: Optional[MemoryProfiler] = None,
+    prefilter: bool = True,
+) -> List[List[Tuple[SymbolType, str]]]:
+    """Run several `AlertJob`s -- e.g., different alert state classes and/or different
+    metrics -- in one pass over `symbols`: Every symbol's histories are fetched once and
+    then evaluated by every job. Jobs with the same alert state class on the same metric
+    (and with the same resampler and thresholds) share the states, so every state is
+    created once no matter how many jobs -- e.g., of different tenants with their own
+    repositories -- evaluate it. Returns a list of tuples of symbol and alert string
+    per job.
+
+    - `jobs`: The jobs to run.
+    - `metric_history_callback`: Callback that returns the histories of all the metrics
+      the jobs need for the given symbol, as a dataframe with a column per metric, as
+      a mapping of metric names to histories, or -- if all jobs evaluate the same
+      single metric -- as a single history. Symbols that lack a job's metric are
+      skipped by that job.
+    - `symbols`, `skip_unchanged`, `profiler`, `prefilter`: See `generate_alerts`.
+
+    ```python
+    price_job = AlertJob(FluctulertState, price_template, price_repo, "Price")
+    volume_job = AlertJob(FluctulertState, volume_template, volume_repo, "Volume")
+    price_alerts, volume_alerts = generate_job_alerts(
+        [price_job, volume_job], price_and_volume_callback, symbols
+    )
+    ```
+    """
+    stage = profiler.stage if profiler else _no_stage
+    shared_states = _SharedStates()
+    runs = [
+        _JobRun(job, symbols, skip_unchanged, prefilter, stage, shared_states)
+        for job in jobs
+    ]
+
+    # Fetch only the symbols that some job isn't done with yet:
+    todo = [
+        i for i in range(len(symbols)) if not all([run.resume(i) for run in runs])
+    ]
+    histories = _iter_histories(metric_history_callback, [symbols[i] for i in todo])
+    if profiler:
+        histories = _staged(histories, profiler, "fetch")
+    for j, hist in histories:
+        i = todo[j]
+        open_runs = [run for run in runs if not run.is_done(i)]
+        for run in open_runs:
+            run.job.stats.symbols += 1
+        if isinstance(hist, Exception):
+            for run in open_runs:
+                run.job.stats.fetch_errors += 1
+            logging.error("".join(traceback.format_exception(hist)))
             continue
-        if hist is None or not isinstance(hist, pd.DataFrame) or hist.shape[0] == 0:
+        if (
+            hist is None
+            or not isinstance(hist, (pd.DataFrame, History, Mapping))
+            or len(hist) == 0
+        ):
             continue
-        latest_value = hist.values[-1][0]
+        # (Jobs on the same metric with the same resampler share its `History` object
+        # and thus the indicators computed from it, see `strela.indicators`.)
+        metric_histories: Dict[Any, Optional[History]] = {}
+        for run in open_runs:
+            metric, resampler = run.job.metric, run.job.resampler
+            if (metric, resampler) not in metric_histories:
+                with stage("state"):
+                    metric_histories[metric, resampler] = _select_and_resample(
+                        hist, metric, resampler, symbols[i].name
+                    )
+            metric_hist = metric_histories[metric, resampler]
+            if metric_hist is not None:
+                run.add(i, metric_hist)
+
+    return [run.finish() for run in runs]
 
-        # Create the alertstate object:
-        current_state = alertstate_class(hist)
 
-        # Get the stored/old alertstate object:
-        old_state = repo.lookup_state(symbol.name)
+def _select_and_resample(
+    hist: MetricHistories,
+    metric: Optional[str],
+    resampler: Optional[DailyResampler],
+    name: str,
+) -> Optional[History]:
+    """Return the (resampled) history of `metric` in `hist`, or `None` if there is no
+    such metric or its history is empty.
+    """
+    try:
+        metric_hist = select_metric(hist, metric)
+    except KeyError:
+        return None
+    if len(metric_hist) == 0:
+        return None
+    if resampler is not None:
+        metric_hist = resampler((name, metric), metric_hist)
+    return metric_hist
+
 
-        # Check if there was a change:
+@dataclass
+class Portfolio:
+    """A basket of symbols that is evaluated as a whole, see
+    `generate_portfolio_alerts`.
+    """
+
+    name: str
+    """The portfolio's name, under which its state is stored and alerted."""
+
+    symbols: List[SymbolType]
+    """The portfolio's members."""
+
+
+def generate_portfolio_alerts(
+    alertstate_class: Type[CoMovementAlertState],
+    metric_history_callback: Callable[[SymbolType], HistoryLike],
+    portfolios: List[Portfolio],
+    template: AlertToTextTemplate,
+    repo: BaseAlertStateRepository,
+    stats: Optional[RunStats] = None,
+) -> List[str]:
+    """Counterpart of `generate_alerts` for portfolio-level alert states (see
+    `strela.alertstates.CoMovementAlertState`), which evaluate the histories of all
+    members of a portfolio at once. Every member is fetched once, even if it's in
+    several portfolios. The states are stored under the portfolios' names; they are
+    stored after every run (not only when they alert), since every state builds on the
+    previous one. The alerts are rendered with the portfolio as the symbol and the
+    state's `latest_value` as the latest value.
+
+    - `metric_history_callback`: See `generate_alerts`. (A
+      `strela.fetchscheduler.FetchScheduler` shares the histories with other
+      categories that fetch through it.)
+    - `portfolios`: The portfolios to be analyzed.
+    - `stats`: A `RunStats` object to be filled in; it counts portfolios, except for
+      `fetch_errors`, which counts members.
+    - `alertstate_class`, `template`, `repo`: See `generate_alerts`.
+    """
+    stats = stats or RunStats()
+    members: Dict[str, SymbolType] = {}
+    for portfolio in portfolios:
+        for symbol in portfolio.symbols:
+            members.setdefault(symbol.name, symbol)
+    symbols = list(members.values())
+    histories: Dict[str, History] = {}
+    for i, hist in _iter_histories(metric_history_callback, symbols):
+        if isinstance(hist, Exception):
+            stats.fetch_errors += 1
+            logging.error("".join(traceback.format_exception(hist)))
+            continue
+        if (
+            hist is not None
+            and isinstance(hist, (pd.DataFrame, History))
+            and len(hist) > 0
+        ):
+            histories[symbols[i].name] = as_history(hist)
+
+    alerts = []
+    for portfolio in portfolios:
+        stats.symbols += 1
+        member_histories = {
+            symbol.name: histories[symbol.name]
+            for symbol in portfolio.symbols
+            if symbol.name in histories
+        }
+        old_state = repo.lookup_state(portfolio.name)
+        current_state = alertstate_class(member_histories, previous=old_state)
+        stats.evaluated += 1
         if current_state.is_ringing() and not current_state.eq(old_state):
-            repo.update_state(symbol.name, current_state)
             alerts.append(
-                template.apply(symbol, current_state, old_state, latest_value)
+                template.apply(
+                    portfolio, current_state, old_state, current_state.latest_value
+                )
             )
-
+        repo.update_state(portfolio.name, current_state)
+    repo.mark_seen(portfolio.name for portfolio in portfolios)
+    stats.alerts += len(alerts)
+    logging.info(
+        "%s: %d portfolios of %d symbols, %d alerts.",
+        alertstate_class.__name__,
+        len(portfolios),
+        len(symbols),
+        len(alerts),
+    )
     return alerts
+
+
+async def generate_alerts_async(
+    alertstate_class: Type[AlertState],
+    metric_history_callback: Callable[[SymbolType], Awaitable[HistoryLike]],
+    symbols: List[SymbolType],
+    template: AlertToTextTemplate,
+    repo: BaseAlertStateRepository,
+    skip_unchanged: bool = True,
+    stats: Optional[RunStats] = None,
+    prefilter: bool = True,
+    max_concurrency: int = 100,
+    executor: Optional[concurrent.futures.Executor] = None,
+) -> List[str]:
+    """Counterpart of `generate_alerts` for coroutine callbacks, e.g., of asyncio-based
+    data adapters. Fetches up to `max_concurrency` histories at a time on the running
+    event loop. Creates the states -- the CPU-bound part -- in `executor` (default: the
+    loop's default executor; pass a `concurrent.futures.ProcessPoolExecutor` to use
+    several cores). Updates the repository and generates the alerts in symbol order on
+    the event loop's thread. The result is the same as the one of `generate_alerts`.
+
+    - `metric_history_callback`: Coroutine function that returns the history of the
+      given symbol, like the callback of `generate_alerts`.
+    - `max_concurrency`: Maximum number of fetches in flight. (At most four times as
+      many symbols are fetched ahead of the one whose state is stored next, which
+      bounds the memory for histories and states that are waiting.)
+    - `executor`: Executor for the state creation.
+    - `alertstate_class`, `symbols`, `template`, `repo`, `skip_unchanged`, `stats`,
+      `prefilter`: See `generate_alerts`.
+    """
+    job = AlertJob(alertstate_class, template, repo, stats=stats or RunStats())
+    run = _JobRun(job, symbols, skip_unchanged, prefilter, _no_stage)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_and_create_state(i: int) -> Any:
+        async with semaphore:
+            try:
+                hist = await metric_history_callback(symbols[i])
+            except Exception as exc:  # pylint: disable=broad-except
+                return exc
+        if (
+            hist is None
+            or not isinstance(hist, (pd.DataFrame, History))
+            or len(hist) == 0
+        ):
+            return None
+        hist = as_history(hist)
+        if run.skip_unchanged and (
+            run.known_fingerprints.get(symbols[i].name) == hist.fingerprint()
+        ):
+            return hist, None  # (`run.is_unchanged` accounts for it below.)
+        state = await loop.run_in_executor(
+            executor, _create_state, alertstate_class, hist, prefilter
+        )
+        return hist, state
+
+    tasks: Deque[asyncio.Future] = collections.deque()
+    todo = iter(range(len(symbols)))
+    evaluated: List[Tuple[int, History, Optional[AlertState]]] = []
+    try:
+        for i in itertools.islice(todo, 4 * max_concurrency):
+            tasks.append(asyncio.ensure_future(fetch_and_create_state(i)))
+        # (Tasks are created and awaited in symbol order.)
+        for i in range(len(symbols)):
+            outcome = await tasks.popleft()
+            for j in itertools.islice(todo, 1):
+                tasks.append(asyncio.ensure_future(fetch_and_create_state(j)))
+            job.stats.symbols += 1
+            if isinstance(outcome, Exception):
+                job.stats.fetch_errors += 1
+                logging.error("".join(traceback.format_exception(outcome)))
+                continue
+            if outcome is None or run.is_unchanged(i, outcome[0]):
+                continue
+            evaluated.append((i, *outcome))
+            if len(evaluated) >= PREFILTER_BATCH_SIZE:
+                run.apply(evaluated)
+                evaluated = []
+        run.apply(evaluated)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return [alert for _, alert in run.finish()]
+
+
+def _create_state(
+    alertstate_class: Type[AlertState], hist: History, prefilter: bool
+) -> Optional[AlertState]:
+    """Create the state of `hist` -- or return `None` if the prefilter rules out that
+    it's ringing. (Runs in the executor of `generate_alerts_async`.)
+    """
+    if prefilter:
+        summaries = alertstate_class.summarize(hist)[np.newaxis]
+        if not alertstate_class.could_ring(summaries)[0]:
+            return None
+    return alertstate_class(hist)
+
+
+def _generate_alerts(
+    alertstate_class: Type[AlertState],
+    metric_history_callback: Callable[[SymbolType], HistoryLike],
+    symbols: List[SymbolType],
+    template: AlertToTextTemplate,
+    repo: BaseAlertStateRepository,
+    skip_unchanged: bool = True,
+    stats: Optional[RunStats] = None,
+    profiler: Optional[MemoryProfiler] = None,
+    prefilter: bool = True,
+    journal: Optional[RunJournal] = None,
+    resampler: Optional[DailyResampler] = None,
+    thresholds: Optional[SymbolThresholds] = None,
+) -> List[Tuple[SymbolType, str]]:
+    """Implementation of `generate_alerts` and `generate_symbol_alerts`: A single
+    `AlertJob`.
+    """
+    job = AlertJob(
+        alertstate_class,
+        template,
+        repo,
+        stats=stats or RunStats(),
+        journal=journal,
+        resampler=resampler,
+        thresholds=thresholds,
+    )
+    return generate_job_alerts(
+        [job], metric_history_callback, symbols, skip_unchanged, profiler, prefilter
+    )[0]
+
+
+class _SharedStates:
+    """The states that several jobs create from the same history, created only once.
+    Every job that is going to need a state claims it, and the state is dropped as
+    soon as all of them took it (or found that they don't need it after all).
+    """
+
+    def __init__(self) -> None:
+        self._claims: Dict[tuple, int] = {}
+        self._states: Dict[tuple, AlertState] = {}
+
+    def claim(self, key: tuple) -> None:
+        """Announce that a job is going to take (or release) the state `key`."""
+        self._claims[key] = self._claims.get(key, 0) + 1
+
+    def take(self, key: tuple, create: Callable[[], AlertState]) -> AlertState:
+        """Return the state `key`, creating it with `create` if nobody did yet."""
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = create()
+        self.release(key)
+        return state
+
+    def release(self, key: tuple) -> None:
+        """Withdraw a claim of the state `key`."""
+        self._claims[key] -= 1
+        if not self._claims[key]:
+            del self._claims[key]
+            self._states.pop(key, None)
+
+
+class _JobRun:
+    """Everything `generate_job_alerts` keeps track of per job."""
+
+    def __init__(
+        self,
+        job: AlertJob,
+        symbols: List[SymbolType],
+        skip_unchanged: bool,
+        prefilter: bool,
+        stage: Callable[[str], ContextManager],
+        shared_states: Optional[_SharedStates] = None,
+    ) -> None:
+        self.job = job
+        self.symbols = symbols
+        self.shared_states = shared_states or _SharedStates()
+        self.skip_unchanged = skip_unchanged
+        self.prefilter = prefilter
+        self.stage = stage
+        with stage("repository"):
+            job.repo.backup()
+            self.known_fingerprints = (
+                job.repo.lookup_fingerprints() if skip_unchanged else {}
+            )
+        self.new_fingerprints: Dict[str, bytes] = {}
+        self.alerts: List[Tuple[int, str]] = []
+        self.batch: List[Tuple[int, History]] = []
+        self.done = job.journal.done() if job.journal else {}
+        # (The thresholds of all symbols, aligned with `symbols`.)
+        self.thresholds: Optional[np.ndarray] = None
+        self.custom_thresholds: Optional[np.ndarray] = None
+        if job.thresholds is not None:
+            self.thresholds = job.thresholds.aligned([s.name for s in symbols])
+            self.custom_thresholds = ~job.thresholds.is_default(self.thresholds)
+
+    def wants(self, i: int) -> bool:
+        """Whether the job evaluates the symbol at position `i`."""
+        return self.job.symbols is None or self.symbols[i].name in self.job.symbols
+
+    def symbol(self, i: int) -> SymbolType:
+        """Return the job's own object of the symbol at position `i`."""
+        if self.job.symbols is None:
+            return self.symbols[i]
+        return self.job.symbols[self.symbols[i].name]
+
+    def is_done(self, i: int) -> bool:
+        """Whether the job has nothing to do with the symbol at position `i`: It
+        doesn't evaluate it, or an earlier attempt of the run was done with it already.
+        """
+        return not self.wants(i) or self.symbols[i].name in self.done
+
+    def resume(self, i: int) -> bool:
+        """Account for the symbol at position `i` if an earlier attempt of the run was
+        done with it already. Return whether the job has nothing to do with it (see
+        `is_done`).
+        """
+        if not self.wants(i):
+            return True
+        name = self.symbols[i].name
+        if name not in self.done:
+            return False
+        self.job.stats.symbols += 1
+        self.job.stats.resumed += 1
+        if self.done[name] is not None:
+            self.new_fingerprints[name] = self.done[name]
+        return True
+
+    def _record_done(self, names: Iterable[str]) -> None:
+        if self.job.journal:
+            for name in names:
+                self.job.journal.record_done(name, self.new_fingerprints.get(name))
+
+    def add(self, i: int, hist: History) -> None:
+        """Evaluate the history `hist` of the symbol at position `i` (as part of a
+        batch, if prefiltering).
+        """
+        if self.is_unchanged(i, hist):
+            return
+        self.shared_states.claim(self._state_key(i))
+        self.batch.append((i, hist))
+        if len(self.batch) >= (PREFILTER_BATCH_SIZE if self.prefilter else 1):
+            self._evaluate()
+
+    def is_unchanged(self, i: int, hist: History) -> bool:
+        """Return whether the symbol at position `i` is to be skipped because its
+        history `hist` hasn't changed since the last evaluation (and account for it).
+        """
+        if not self.skip_unchanged:
+            return False
+        name = self.symbols[i].name
+        fingerprint = hist.fingerprint()
+        if self.custom_thresholds is not None and self.custom_thresholds[i]:
+            # (So that the symbol gets evaluated again when its thresholds change.)
+            digest = hashlib.blake2b(fingerprint, digest_size=len(fingerprint))
+            digest.update(self.thresholds[i].tobytes())  # type: ignore
+            fingerprint = digest.digest()
+        if self.known_fingerprints.get(name) == fingerprint:
+            self.job.stats.skipped_unchanged += 1
+            self._record_done([name])
+            return True
+        self.new_fingerprints[name] = fingerprint
+        return False
+
+    def _evaluate(self) -> None:
+        batch, self.batch = self.batch, []
+        alertstate_class, stage = self.job.alertstate_class, self.stage
+        # (The thresholds of the batch's symbols, if they have their own.)
+        thresholds = None
+        if self.thresholds is not None:
+            thresholds = self.thresholds[[i for i, _ in batch]]
+        could_ring = [True] * len(batch)
+        if self.prefilter and batch:
+            with stage("state"):
+                summaries = np.array(
+                    [alertstate_class.summarize(hist) for _, hist in batch]
+                )
+                if thresholds is None:
+                    could_ring = alertstate_class.could_ring(summaries)
+                else:
+                    could_ring = alertstate_class.could_ring(summaries, thresholds)
+        evaluated = []
+        for row, ((i, hist), could) in enumerate(zip(batch, could_ring)):
+            key = self._state_key(i)
+            if not could:
+                self.shared_states.release(key)
+                evaluated.append((i, hist, None))
+                continue
+            # Create the alertstate object (unless another job did already):
+            kwargs = {} if thresholds is None else {"thresholds": thresholds[row]}
+            with stage("state"):
+                state = self.shared_states.take(
+                    key, lambda: alertstate_class(hist, **kwargs)  # type: ignore
+                )
+            evaluated.append((i, hist, state))
+        self.apply(evaluated)
+
+    def _state_key(self, i: int) -> tuple:
+        job = self.job
+        thresholds = None
+        if self.custom_thresholds is not None and self.custom_thresholds[i]:
+            thresholds = self.thresholds[i].tobytes()  # type: ignore
+        return (i, job.alertstate_class, job.metric, job.resampler, thresholds)
+
+    def apply(self, evaluated: List[Tuple[int, History, Optional[AlertState]]]) -> None:
+        """Take tuples of a symbol's position, its history, and its freshly created
+        state (or `None` if the prefilter ruled out that it's ringing), compare the
+        states to the stored ones, and update the repository and generate alerts where
+        they differ. In the given order.
+        """
+        stats, stage = self.job.stats, self.stage
+        for i, hist, current_state in evaluated:
+            if current_state is None:
+                stats.prefiltered += 1
+                continue
+            stats.evaluated += 1
+            symbol = self.symbol(i)
+
+            # Get the stored/old alertstate object:
+            with stage("repository"):
+                old_state = self.job.repo.lookup_state(symbol.name)
+
+            # Check if there was a change:
+            if current_state.is_ringing() and not current_state.eq(old_state):
+                with stage("render"):
+                    alert = self.job.template.apply(
+                        symbol, current_state, old_state, hist.latest_value
+                    )
+                # (Record the alert before the state, so a crash in between can't lose
+                # it; see `strela.journal`.)
+                if self.job.journal:
+                    self.job.journal.record_alert(symbol.name, alert)
+                with stage("repository"):
+                    self.job.repo.update_state(symbol.name, current_state)
+                    self.job.repo.record_transition(
+                        symbol.name, hist, self.new_fingerprints.get(symbol.name)
+                    )
+                self.alerts.append((i, alert))
+        with stage("repository"):
+            self.job.repo.record_status(
+                self.job.alertstate_class,
+                ((self.symbols[i].name, state, hist) for i, hist, state in evaluated),
+            )
+        self._record_done(self.symbols[i].name for i, _, _ in evaluated)
+
+    def finish(self) -> List[Tuple[SymbolType, str]]:
+        """Evaluate what's left, update the repository, and return the alerts."""
+        self._evaluate()
+        repo, stats = self.job.repo, self.job.stats
+        with self.stage("repository"):
+            repo.update_fingerprints(self.new_fingerprints)
+            repo.mark_seen(
+                self.symbols[i].name
+                for i in range(len(self.symbols))
+                if self.wants(i)
+            )
+        stats.alerts += len(self.alerts)
+        logging.info(
+            "%s%s: %d symbols, %d skipped as unchanged, %d prefiltered, %d evaluated, "
+            "%d alerts.",
+            self.job.alertstate_class.__name__,
+            "" if self.job.metric is None else f" on {self.job.metric}",
+            stats.symbols,
+            stats.skipped_unchanged,
+            stats.prefiltered,
+            stats.evaluated,
+            stats.alerts,
+        )
+        alerts = self.alerts
+        if self.job.journal:
+            # (Incl. the alerts of an interrupted earlier attempt of the run.)
+            alerts = self._pending_alerts()
+        # (Histories can arrive in any order, but alerts are reported in symbol order.)
+        return [
+            (self.symbol(i), alert) for i, alert in sorted(alerts, key=lambda x: x[0])
+        ]
+
+    def _pending_alerts(self) -> List[Tuple[int, str]]:
+        positions = {symbol.name: i for i, symbol in enumerate(self.symbols)}
+        alerts = []
+        for name, alert in self.job.journal.pending_alerts().items():  # type: ignore
+            if name in positions:
+                alerts.append((positions[name], alert))
+            else:
+                logging.warning("Dropping pending alert of unknown symbol %s.", name)
+        return alerts
+
+
+def _no_stage(_: str) -> ContextManager:
+    """Stand-in for `MemoryProfiler.stage` when not profiling."""
+    return nullcontext()
+
+
+def _staged(iterable: Iterable, profiler: MemoryProfiler, name: str) -> Iterator:
+    """Yield the items of `iterable`, retrieving each one within the profiler's stage
+    `name`.
+    """
+    iterator = iter(iterable)
+    while True:
+        with profiler.stage(name):
+            item = next(iterator, _STOP)
+        if item is _STOP:
+            return
+        yield item
+
+
+_STOP = object()
+
+
+def _iter_histories(
+    metric_history_callback: Callable[[SymbolType], HistoryLike],
+    symbols: List[SymbolType],
+) -> Iterator[Tuple[int, Union[HistoryLike, Exception]]]:
+    """Yield tuples of each symbol's position in `symbols` and its history -- or the
+    exception raised while fetching it. Uses the callback's `iter_histories` method if
+    it has one (see `strela.fetchscheduler.FetchScheduler`), otherwise calls the
+    callback for one symbol after the other.
+    """
+    iter_histories = getattr(metric_history_callback, "iter_histories", None)
+    if iter_histories is not None:
+        yield from iter_histories(symbols)
+        return
+    for i, symbol in enumerate(symbols):
+        try:
+            yield i, metric_history_callback(symbol)
+        except Exception as exc:  # pylint: disable=broad-except
+            yield i, exc
+
+
+class LiveAlertGenerator:
+    """Generate alerts from a stream of ticks, i.e., individual history entries, for
+    many symbols. Keeps one `strela.alertstates.livestates.LiveAlertState` per symbol,
+    so every tick costs amortized O(1). The decision whether to alert is the same as in
+    `generate_alerts`.
+
+    ```python
+    generator = LiveAlertGenerator(LiveFluctulertState, template, repo)
+    for symbol, timestamp, value in tick_stream:
+        alert = generator.update(symbol, timestamp, value)
+        if alert:
+            print(alert)
+    ```
+    """
+
+    def __init__(
+        self,
+        live_state_factory: Callable[[], LiveAlertState],
+        template: AlertToTextTemplate,
+        repo: BaseAlertStateRepository,
+    ) -> None:
+        """`LiveAlertGenerator` initializer.
+
+        - `live_state_factory`: Creates a new live state, e.g., a
+          `strela.alertstates.livestates.LiveAlertState` subclass.
+        - `template`: The template to use to generate the alert text.
+        - `repo`: The repository to use to retrieve and store the state of alerts.
+        """
+        self.live_state_factory = live_state_factory
+        self.template = template
+        self.repo = repo
+        self.live_states: Dict[str, LiveAlertState] = {}
+        self._stored_states: Dict[str, Optional[AlertState]] = {}
+
+    def warm_up(self, symbol: SymbolType, hist: HistoryLike) -> None:
+        """Feed the history `hist` of `symbol` without generating any alerts. Use this
+        to start from the (batch) history before processing live ticks.
+        """
+        live = self.live_states[symbol.name] = self.live_state_factory()
+        live.feed(hist)
+
+    def update(self, symbol: SymbolType, timestamp, value: float) -> Optional[str]:
+        """Process a tick for `symbol`. Return the alert string if the tick leads to an
+        alert, `None` otherwise.
+        """
+        live = self.live_states.get(symbol.name)
+        if live is None:
+            live = self.live_states[symbol.name] = self.live_state_factory()
+        live.update(timestamp, value)
+        if not live.is_ringing():
+            return None
+        current_state = live.snapshot()
+        if symbol.name not in self._stored_states:
+            self._stored_states[symbol.name] = self.repo.lookup_state(symbol.name)
+        old_state = self._stored_states[symbol.name]
+        if current_state.eq(old_state):
+            return None
+        self.repo.update_state(symbol.name, current_state)
+        self._stored_states[symbol.name] = current_state
+        return self.template.apply(symbol, current_state, old_state, value)
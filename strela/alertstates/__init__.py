@@ -3,4 +3,16 @@
 from .alertstate import AlertState
 from .fluctulertstate import FluctulertState
 from .doubledownalertstate import DoubleDownAlertState
-from .alertstaterepository import AlertStateRepository, BaseAlertStateRepository
+from .comovementalertstate import CoMovementAlertState
+from .volatilityfluctulertstate import VolatilityFluctulertState
+from .alertstaterepository import (
+    AlertStateRepository,
+    BaseAlertStateRepository,
+    CompactionReport,
+)
+from .livestates import (
+    LiveAlertState,
+    LiveFluctulertState,
+    LiveDoubleDownAlertState,
+    LiveVolatilityFluctulertState,
+)
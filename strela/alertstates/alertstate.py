@@ -3,7 +3,8 @@
 from __future__ import annotations
 from typing import Optional
 from abc import ABC, abstractmethod
-from pandas import DataFrame
+import numpy as np
+from strela.history import History, HistoryLike
 
 
 class AlertState(ABC):
@@ -12,9 +13,10 @@ class AlertState(ABC):
     """
 
     @abstractmethod
-    def __init__(self, hist: DataFrame) -> None:
-        """Constructor. Takes a history dataframe `hist`. The dataframe must have
-        timestamps as the index and exactly one column with the metric.
+    def __init__(self, hist: HistoryLike) -> None:
+        """Constructor. Takes a metric history `hist`, which is either a
+        `strela.history.History` or a dataframe. The dataframe must have timestamps as
+        the index and exactly one column with the metric.
         """
 
     @abstractmethod
@@ -37,5 +39,56 @@ class AlertState(ABC):
         period) and not cooled down yet.
         """
 
+    def status(self) -> str:
+        """Return a short summary of the alert condition that is currently active, or an
+        empty string if none is. (For `strela.statusindex`.) This default says
+        "ringing" while the state is ringing.
+        """
+        return "ringing" if self.is_ringing() else ""
+
+    @classmethod
+    def default_thresholds(cls) -> np.ndarray:
+        """Return the class-wide thresholds (e.g., triggers) of the alert logic as a
+        1-D array. Subclasses that support per-symbol thresholds (see
+        `strela.thresholds`) return them here and take an array of the same length as
+        the `thresholds` argument of their constructor. (This default says there are
+        none.)
+        """
+        return np.empty(0)
+
+    @classmethod
+    def check_thresholds(cls, thresholds: np.ndarray) -> None:
+        """Raise a `ValueError` if `thresholds` can't replace `default_thresholds`.
+        This default checks their number; subclasses add their own constraints.
+        """
+        expected = cls.default_thresholds().shape
+        if np.shape(thresholds) != expected:
+            raise ValueError(
+                f"Expected {expected[0]} thresholds, got {np.size(thresholds)}."
+            )
+
+    @classmethod
+    def summarize(cls, hist: History) -> np.ndarray:
+        """Return a few summary numbers of the (non-empty) history `hist` for
+        `could_ring`. Much cheaper than creating the state.
+        """
+        return np.empty(0)
+
+    @classmethod
+    def could_ring(
+        cls, summaries: np.ndarray, thresholds: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Take the summaries (see `summarize`) of many histories, one per row, and
+        return a boolean array that is `False` for the histories whose state can't be
+        ringing and has no active alert condition (i.e., its `status` is empty). The
+        bound must be conservative, i.e., if in doubt, return `True`.
+        Subclasses that change the alert logic must adapt `summarize` and `could_ring`
+        accordingly. (This default says `True` for all histories.)
+
+        `thresholds` are the histories' own thresholds (see `default_thresholds`), one
+        row per history, or `None` if all of them use the class-wide ones.
+        """
+        return np.ones(len(summaries), dtype=bool)
+
     def __str__(self) -> str:
         return self.textify()
@@ -1,14 +1,50 @@
 """AlertState repository classes"""
 
-import glob
+from dataclasses import dataclass
 import shutil
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+import dbm
+import json
 import os
 import shelve
+import tempfile
 import slugify
-from strela import config
+from strela import config, statusindex
+from strela.history import History
+from strela.statusindex import StatusEntry, StatusIndex
+from strela.transitionlog import TransitionLog
 from . import AlertState
 
+_RUNS_KEY = "\0runs"
+"""Key of the run counter among the last-seen entries. (Can't clash with a symbol
+name.)"""
+
+_DBM_SUFFIXES = ("", ".db", ".dat", ".dir", ".bak", ".pag")
+"""File name suffixes that the dbm implementations behind `shelve` use."""
+
+_MANIFEST = "suffixes.json"
+"""Name of the file listing the new database's file name suffixes in the folder that
+`_rewrite_dbm` writes the new database to."""
+
+
+@dataclass
+class CompactionReport:
+    """The outcome of `BaseAlertStateRepository.compact`."""
+
+    pruned: int = 0
+    """Number of symbols whose state and fingerprint were removed."""
+
+    bytes_before: int = 0
+    """Size of the repository's files before compaction."""
+
+    bytes_after: int = 0
+    """Size of the repository's files after compaction."""
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        """Space freed by the compaction."""
+        return self.bytes_before - self.bytes_after
+
 
 class BaseAlertStateRepository:
     """Simple repository that resides just in memory. It's also the base class for other
@@ -16,8 +52,25 @@ class BaseAlertStateRepository:
     (FIXME)*)
     """
 
-    def __init__(self, _):
+    def __init__(
+        self,
+        filename: str,
+        status_index: Optional[StatusIndex] = None,
+        transition_log: Optional[TransitionLog] = None,
+    ):
+        """Create a new repository. `filename` is informational only here.
+        `status_index` is the `strela.statusindex.StatusIndex` to keep up to date (see
+        `record_status`), if any. `transition_log` is the
+        `strela.transitionlog.TransitionLog` to append the alerts to (see
+        `record_transition`), if any.
+        """
+        self.filename = filename
+        self.status_index = status_index
+        self.transition_log = transition_log
         self.states = {}
+        self.fingerprints = {}
+        self.runs = 0
+        self.last_seen = {}
 
     def lookup_state(self, symbol_name: str) -> Optional[AlertState]:
         """Look up symbol's state. Return None if nothing is found."""
@@ -30,6 +83,127 @@ class BaseAlertStateRepository:
         """Update symbol's state."""
         self.states[symbol_name] = state
 
+    def delete_state(self, symbol_name: str) -> None:
+        """Forget everything about the symbol. No-op if there is nothing."""
+        self.states.pop(symbol_name, None)
+        self.fingerprints.pop(symbol_name, None)
+        self.last_seen.pop(symbol_name, None)
+        if self.status_index:
+            self.status_index.remove(self.filename, symbol_name)
+
+    def record_status(
+        self,
+        alertstate_class: Type[AlertState],
+        evaluations: Iterable[Tuple[str, Optional[AlertState], History]],
+    ) -> None:
+        """Record the status of freshly evaluated states in the status index, if the
+        repository has one. `evaluations` are tuples of symbol name, state, and the
+        history the state was evaluated from. (`None` for the state means that the
+        prefilter ruled out that it's ringing or has an active alert condition, see
+        `strela.alertstates.AlertState.could_ring`.)
+        """
+        if not self.status_index:
+            return
+        evaluated_at = statusindex.now()
+        self.status_index.update(
+            StatusEntry(
+                repo=self.filename,
+                symbol=name,
+                alert_type=alertstate_class.__name__,
+                ringing=state is not None and state.is_ringing(),
+                status="" if state is None else state.status(),
+                latest_value=float(hist.latest_value),
+                as_of=str(hist.dates()[-1].astype("datetime64[s]")),
+                evaluated_at=evaluated_at,
+            )
+            for name, state, hist in evaluations
+        )
+
+    def record_transition(
+        self, symbol_name: str, hist: History, fingerprint: Optional[bytes] = None
+    ) -> None:
+        """Append a ringing state change (an alert) of `symbol_name`, evaluated from
+        `hist` (whose fingerprint is `fingerprint`, if known), to the transition log,
+        if the repository has one.
+        """
+        if not self.transition_log:
+            return
+        self.transition_log.append(
+            self.filename,
+            symbol_name,
+            fingerprint if fingerprint is not None else hist.fingerprint(),
+            float(hist.latest_value),
+            int(hist.timestamps[-1]),
+        )
+
+    def symbol_names(self) -> List[str]:
+        """Return the names of all symbols with a stored state."""
+        return list(self.states)
+
+    def lookup_fingerprints(self) -> Dict[str, bytes]:
+        """Return the fingerprints of the histories the symbols were last evaluated
+        with (see `strela.history.History.fingerprint`).
+        """
+        return dict(self.fingerprints)
+
+    def update_fingerprints(self, fingerprints: Dict[str, bytes]) -> None:
+        """Update the fingerprints for the symbols in `fingerprints`."""
+        self.fingerprints.update(fingerprints)
+
+    def mark_seen(self, symbol_names: Iterable[str]) -> int:
+        """Count a new run in which the symbols in `symbol_names` were seen. Return the
+        number of runs so far. (See `compact`.)
+        """
+        self.runs += 1
+        self.last_seen.update(dict.fromkeys(symbol_names, self.runs))
+        return self.runs
+
+    def update_last_seen(self, last_seen: Dict[str, int]) -> None:
+        """Set the run in which each symbol in `last_seen` was last seen (counted in
+        this repository's runs, see `lookup_last_seen`).
+        """
+        self.last_seen.update(last_seen)
+
+    def _symbols_to_prune(
+        self,
+        names: Iterable[str],
+        keep_symbols: Optional[Iterable[str]],
+        max_unseen_runs: Optional[int],
+    ) -> List[str]:
+        """Return the symbols among `names` that `compact` is supposed to prune."""
+        keep = None if keep_symbols is None else set(keep_symbols)
+        runs, last_seen = self.lookup_last_seen()
+        return [
+            name
+            for name in names
+            if (keep is not None and name not in keep)
+            or (
+                max_unseen_runs is not None
+                and runs - last_seen.get(name, 0) > max_unseen_runs
+            )
+        ]
+
+    def lookup_last_seen(self) -> Tuple[int, Dict[str, int]]:
+        """Return the number of runs so far and the run in which each symbol was last
+        seen (see `mark_seen`).
+        """
+        return self.runs, dict(self.last_seen)
+
+    def compact(
+        self,
+        keep_symbols: Optional[Iterable[str]] = None,
+        max_unseen_runs: Optional[int] = None,
+    ) -> CompactionReport:
+        """Prune the states of symbols that are not in `keep_symbols` (if given) or that
+        haven't been seen (see `mark_seen`) in more than `max_unseen_runs` runs (if
+        given), then rewrite the repository compactly.
+        """
+        names = set(self.states) | set(self.fingerprints) | set(self.last_seen)
+        pruned = self._symbols_to_prune(names, keep_symbols, max_unseen_runs)
+        for name in pruned:
+            self.delete_state(name)
+        return CompactionReport(pruned=len(pruned))
+
     def backup(self):
         """Backup repo. No-op for this type of repo."""
 
@@ -40,11 +214,33 @@ class AlertStateRepository(BaseAlertStateRepository):
     _FOLDER = config.ALERT_REPOSITORY_FOLDER
     _BACKUPFOLDER = os.path.join(_FOLDER, "backups")
 
-    def __init__(self, filename: str):  # pylint: disable=super-init-not-called
+    def __init__(
+        self,
+        filename: str,
+        folder: Optional[str] = None,
+        status_index: Optional[StatusIndex] = None,
+        transition_log: Optional[TransitionLog] = None,
+    ):  # pylint: disable=super-init-not-called
         """Create a new repository. `filename` is the name of the shelf file to be
-        used."""
+        used. `folder` is the folder for the shelf files (default:
+        `config.ALERT_REPOSITORY_FOLDER`); backups go to its "backups" subfolder.
+        `status_index`, `transition_log`: See `BaseAlertStateRepository`."""
         self.filename = slugify.slugify(filename)
-        self._fullpath = os.path.join(self._FOLDER, self.filename)
+        self.status_index = status_index
+        self.transition_log = transition_log
+        folder = self._FOLDER if folder is None else folder
+        self._backupfolder = (
+            self._BACKUPFOLDER
+            if folder == self._FOLDER
+            else os.path.join(folder, "backups")
+        )
+        self._fullpath = os.path.join(folder, self.filename)
+        self._fingerprints_path = self._fullpath + "-fingerprints"
+        self._last_seen_path = self._fullpath + "-last-seen"
+        for path in (self._fullpath, self._fingerprints_path, self._last_seen_path):
+            # (Completes a compaction that was interrupted after the new files were
+            # complete. See `_rewrite_dbm`.)
+            _finish_rewrite(path)
 
     def lookup_state(self, symbol_name: str) -> Optional[AlertState]:
         try:
@@ -54,10 +250,143 @@ class AlertStateRepository(BaseAlertStateRepository):
             return None
 
     def update_state(self, symbol_name: str, state: AlertState) -> None:
-        with shelve.open(self._fullpath, writeback=True) as shelf:
+        with shelve.open(self._fullpath) as shelf:
             shelf[symbol_name] = state
 
+    def delete_state(self, symbol_name: str) -> None:
+        for path in (self._fullpath, self._fingerprints_path, self._last_seen_path):
+            with shelve.open(path) as shelf:
+                shelf.pop(symbol_name, None)
+        if self.status_index:
+            self.status_index.remove(self.filename, symbol_name)
+
+    def symbol_names(self) -> List[str]:
+        with shelve.open(self._fullpath) as shelf:
+            return list(shelf.keys())
+
+    def lookup_fingerprints(self) -> Dict[str, bytes]:
+        with shelve.open(self._fingerprints_path) as shelf:
+            return dict(shelf)
+
+    def update_fingerprints(self, fingerprints: Dict[str, bytes]) -> None:
+        if not fingerprints:
+            return
+        with shelve.open(self._fingerprints_path) as shelf:
+            shelf.update(fingerprints)
+
+    def mark_seen(self, symbol_names: Iterable[str]) -> int:
+        with shelve.open(self._last_seen_path) as shelf:
+            runs = shelf.get(_RUNS_KEY, 0) + 1
+            shelf.update(dict.fromkeys(symbol_names, runs))
+            shelf[_RUNS_KEY] = runs
+        return runs
+
+    def update_last_seen(self, last_seen: Dict[str, int]) -> None:
+        if not last_seen:
+            return
+        with shelve.open(self._last_seen_path) as shelf:
+            shelf.update(last_seen)
+
+    def lookup_last_seen(self) -> Tuple[int, Dict[str, int]]:
+        with shelve.open(self._last_seen_path) as shelf:
+            last_seen = dict(shelf)
+        return last_seen.pop(_RUNS_KEY, 0), last_seen
+
+    def compact(
+        self,
+        keep_symbols: Optional[Iterable[str]] = None,
+        max_unseen_runs: Optional[int] = None,
+    ) -> CompactionReport:
+        """Prune the states of symbols that are not in `keep_symbols` (if given) or that
+        haven't been seen (see `mark_seen`) in more than `max_unseen_runs` runs (if
+        given), then rewrite the shelf files so they don't contain any unused space.
+        """
+        paths = (self._fullpath, self._fingerprints_path, self._last_seen_path)
+        report = CompactionReport(bytes_before=sum(map(_dbm_size, paths)))
+        names = (
+            set(self.symbol_names())
+            | set(self.lookup_fingerprints())
+            | set(self.lookup_last_seen()[1])
+        )
+        pruned = set(self._symbols_to_prune(names, keep_symbols, max_unseen_runs))
+        report.pruned = len(pruned)
+        for path in paths:
+            _rewrite_dbm(path, skip_keys={name.encode() for name in pruned})
+        if self.status_index:
+            for name in pruned:
+                self.status_index.remove(self.filename, name)
+        report.bytes_after = sum(map(_dbm_size, paths))
+        return report
+
     def backup(self):
         """Move a copy of the shelf files to the backup folder."""
-        for file in glob.glob(self._fullpath + "*"):
-            shutil.copy(file, self._BACKUPFOLDER)
+        if self._backupfolder != self._BACKUPFOLDER:
+            os.makedirs(self._backupfolder, exist_ok=True)
+        # (Only this repository's own files: A glob on the name would also match,
+        # e.g., "repo-shard-10" when backing up "repo-shard-1".)
+        for path in [self._fullpath, self._fingerprints_path, self._last_seen_path]:
+            for file in _dbm_files(path):
+                shutil.copy(file, self._backupfolder)
+
+
+def _dbm_files(path: str) -> List[str]:
+    """Return the files of the dbm database at `path`."""
+    return [path + suffix for suffix in _DBM_SUFFIXES if os.path.isfile(path + suffix)]
+
+
+def _dbm_size(path: str) -> int:
+    """Return the total size of the files of the dbm database at `path`."""
+    return sum(os.path.getsize(file) for file in _dbm_files(path))
+
+
+def _rewrite_dbm(path: str, skip_keys: set) -> None:
+    """Copy the dbm database at `path` without the keys in `skip_keys` (which are
+    bytes) into a new database and replace the old one with it. The values are copied
+    as is, i.e., without unpickling them.
+
+    Crash-safe: The new database is written into a temporary folder, which is renamed
+    to `path + "-compacted"` only once it is complete. Then its files replace the old
+    ones (the index file last). If that gets interrupted, `_finish_rewrite` completes
+    it later; if anything before gets interrupted, the old database is still intact.
+    """
+    _finish_rewrite(path)
+    if not _dbm_files(path):
+        return
+    folder, name = os.path.split(path)
+    tmp_folder = tempfile.mkdtemp(prefix=f".{name}-", dir=folder or None)
+    try:
+        tmp_path = os.path.join(tmp_folder, name)
+        with dbm.open(path, "r") as old, dbm.open(tmp_path, "n") as new:
+            for key in old.keys():
+                if key not in skip_keys:
+                    new[key] = old[key]
+        suffixes = [x for x in _DBM_SUFFIXES if os.path.isfile(tmp_path + x)]
+        with open(os.path.join(tmp_folder, _MANIFEST), "w", encoding="utf-8") as file:
+            json.dump(suffixes, file)
+        os.replace(tmp_folder, path + "-compacted")
+    except BaseException:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        raise
+    _finish_rewrite(path)
+
+
+def _finish_rewrite(path: str) -> None:
+    """Replace the files of the dbm database at `path` with the complete new ones that
+    `_rewrite_dbm` left in `path + "-compacted"`, if there are any. Can be repeated if
+    it gets interrupted itself.
+    """
+    new_folder = path + "-compacted"
+    if not os.path.isdir(new_folder):
+        return
+    with open(os.path.join(new_folder, _MANIFEST), encoding="utf-8") as file:
+        new_suffixes = json.load(file)
+    new_path = os.path.join(new_folder, os.path.basename(path))
+    for suffix in set(_DBM_SUFFIXES) - set(new_suffixes):
+        if os.path.isfile(path + suffix):
+            os.remove(path + suffix)
+    # (The index last, so that it never points into a data file it doesn't belong to
+    # unless this is still to be completed.)
+    for suffix in sorted(new_suffixes, key=lambda suffix: suffix in (".dir", ".bak")):
+        if os.path.isfile(new_path + suffix):
+            os.replace(new_path + suffix, path + suffix)
+    shutil.rmtree(new_folder)
@@ -0,0 +1,278 @@
+"""Co-movement alert state: A portfolio-level alert for when the symbols of a portfolio
+start to move together.
+
+Unlike the other alert states, a `CoMovementAlertState` looks at the histories of all
+members of a portfolio at once (see `strela.alert_generator.generate_portfolio_alerts`).
+It compares the correlations of the members' daily log returns over the last `window`
+days with those over the `baseline_window` days before, and rings if a large enough
+share of all pairs of members became markedly more correlated -- e.g., when a whole
+crypto basket moves in lockstep.
+
+A correlation matrix over thousands of members is expensive to compute from scratch.
+So the state keeps the running co-moments of both windows (see `CoMoments`) and hands
+them on to the next run's state, which only applies a rank-1 update per day that
+entered, left, or got revised in a window. Only the pairs whose correlation over
+`window` reaches `min_correlation` (the prefilter) are compared with the baseline.
+"""
+
+from __future__ import annotations
+from typing import ClassVar, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from strela.history import NS_PER_DAY, History, HistoryLike, as_history
+from . import AlertState
+
+
+class CoMoments:
+    """Running count, sums, and sums of outer products of the return vectors of a
+    window of days -- everything needed for the covariance of every pair of members.
+    """
+
+    tolerance: ClassVar[float] = 1e-10
+    """Variances up to this share of `magnitudes` count as rounding residue, i.e., as
+    0."""
+
+    def __init__(self, size: int) -> None:
+        """`CoMoments` initializer. `size` is the number of members."""
+        self.count = 0
+        self.sums = np.zeros(size)
+        self.products = np.zeros((size, size))
+        self.magnitudes = np.zeros(size)
+        """Per member, the sum of the squared returns that were ever added or removed,
+        which bounds the rounding errors of its variance."""
+
+    def add(self, returns: np.ndarray) -> None:
+        """Add the return vectors of some days (one row per day). (A rank-1 update per
+        day, done as one rank-k update.)
+        """
+        self.count += len(returns)
+        self.sums += returns.sum(axis=0)
+        self.products += returns.T @ returns
+        self.magnitudes += (returns**2).sum(axis=0)
+
+    def remove(self, returns: np.ndarray) -> None:
+        """Remove the return vectors of some days that were added before."""
+        self.count -= len(returns)
+        self.sums -= returns.sum(axis=0)
+        self.products -= returns.T @ returns
+        self.magnitudes += (returns**2).sum(axis=0)
+
+    def correlations(
+        self, rows: Optional[np.ndarray] = None, cols: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Return the correlation matrix -- or, given index arrays `rows` and `cols`,
+        the correlations of these pairs only. Pairs with a member that didn't move get
+        a correlation of 0. (After many `add`s and `remove`s, the variance of such a
+        member is rounding residue, see `tolerance`, rather than exactly 0.)
+        """
+        count = self.count
+        variances = np.diag(self.products) - self.sums**2 / count
+        moved = variances > self.tolerance * self.magnitudes
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scales = 1 / np.sqrt(np.where(moved, variances, np.nan))
+        scales = np.nan_to_num(scales, nan=0.0)
+        if rows is None or cols is None:
+            covariances = self.products - np.outer(self.sums, self.sums) / count
+            correlations = covariances * scales[:, np.newaxis] * scales
+        else:
+            covariances = (
+                self.products[rows, cols] - self.sums[rows] * self.sums[cols] / count
+            )
+            correlations = covariances * scales[rows] * scales[cols]
+        # (Rounding can push the correlations of perfectly correlated pairs past 1.)
+        return np.clip(correlations, -1, 1)
+
+
+def daily_returns(
+    histories: Sequence[History], days: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the last `days` days on which any of `histories` has an entry (as days
+    since the epoch) and the daily log returns of every history on these days, one row
+    per day and one column per history. Histories are carried forward over days
+    without an entry of their own; returns that can't be computed (before a history's
+    first entry, or of non-positive values) are 0.
+    """
+    daily = []
+    for hist in histories:
+        hist_days = hist.timestamps // NS_PER_DAY
+        # (The last entry of every day.)
+        last = np.append(hist_days[1:] != hist_days[:-1], True)
+        daily.append((hist_days[last][-days - 1 :], hist.values[last][-days - 1 :]))
+    all_days = np.unique(np.concatenate([d for d, _ in daily] or [np.zeros(0, int)]))
+    all_days = all_days[-days - 1 :]
+    prices = np.full((len(all_days), len(histories)), np.nan)
+    for column, (hist_days, values) in enumerate(daily):
+        positions = np.searchsorted(hist_days, all_days, side="right") - 1
+        known = positions >= 0
+        prices[known, column] = values[positions[known]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(prices), axis=0)
+    returns[~np.isfinite(returns)] = 0
+    return all_days[1:], returns
+
+
+class CoMovementAlertState(AlertState):
+    """Concrete class for co-movement alert states of portfolios."""
+
+    # Class variables:
+
+    window: ClassVar[int] = 20
+    """Number of days over which the current correlations are measured."""
+
+    baseline_window: ClassVar[int] = 120
+    """Number of days before `window` over which the baseline correlations are
+    measured."""
+
+    min_correlation: ClassVar[float] = 0.6
+    """Prefilter: Pairs whose correlation over `window` is lower than this don't count
+    as moving together and aren't compared with the baseline."""
+
+    trigger: ClassVar[float] = 0.3
+    """A pair moves together if its correlation rose by at least this much over the
+    baseline."""
+
+    min_share: ClassVar[float] = 0.2
+    """The alert rings if at least this share of all pairs moves together."""
+
+    resync_interval: ClassVar[int] = 250
+    """Number of daily updates after which the co-moments are computed from scratch,
+    which bounds their rounding errors."""
+
+    listed_pairs: ClassVar[int] = 10
+    """Max number of pairs listed in the alert."""
+
+    # Instance variables:
+
+    members: List[str]
+    """Names of the portfolio's members with a history."""
+
+    share: float
+    """Share of all pairs of members that move together."""
+
+    pairs: List[Tuple[str, str, float, float]]
+    """The pairs that move together with their current and baseline correlation, the
+    largest rise in correlation first."""
+
+    def __init__(
+        self,
+        hist: Mapping[str, HistoryLike],
+        previous: Optional[CoMovementAlertState] = None,
+    ) -> None:
+        """Constructor. Takes the histories of the members of a portfolio by name (see
+        `daily_returns`) and the portfolio's previous state, whose co-moments it
+        continues if it has the same members.
+        """
+        super().__init__(hist)  # type: ignore
+        self.members = list(hist)
+        span = self.window + self.baseline_window
+        self._days, self._returns = daily_returns(
+            [as_history(h) for h in hist.values()], span
+        )
+        self.share = 0.0
+        self.pairs = []
+        if len(self._days) < span or len(self.members) < 2:
+            self._recent = self._baseline = None
+            self._updates = 0
+            return
+        if not self._continue(previous):
+            self._recent = CoMoments(len(self.members))
+            self._recent.add(self._returns[self.baseline_window :])
+            self._baseline = CoMoments(len(self.members))
+            self._baseline.add(self._returns[: self.baseline_window])
+            self._updates = 0
+        self._evaluate()
+
+    def _continue(self, previous: Optional[CoMovementAlertState]) -> bool:
+        """Take over the co-moments of `previous` and bring them up to date. Return
+        `False` if that's not possible or not worth it.
+        """
+        # pylint: disable=protected-access
+        if (
+            previous is None
+            or getattr(previous, "_recent", None) is None
+            or previous.members != self.members
+            or previous._updates >= self.resync_interval
+            or len(previous._days) != len(self._days)
+        ):
+            return False
+        self._recent, self._baseline = previous._recent, previous._baseline
+        updates = 0
+        for moments, window in [
+            (self._recent, slice(self.baseline_window, None)),
+            (self._baseline, slice(None, self.baseline_window)),
+        ]:
+            old_days, old_returns = previous._days[window], previous._returns[window]
+            new_days, new_returns = self._days[window], self._returns[window]
+            _, old_positions, new_positions = np.intersect1d(
+                old_days, new_days, assume_unique=True, return_indices=True
+            )
+            same = (old_returns[old_positions] == new_returns[new_positions]).all(
+                axis=1
+            )
+            keep_old = np.zeros(len(old_days), dtype=bool)
+            keep_old[old_positions[same]] = True
+            keep_new = np.zeros(len(new_days), dtype=bool)
+            keep_new[new_positions[same]] = True
+            if (~keep_new).sum() >= self.window:
+                return False  # (Cheaper to start from scratch.)
+            moments.remove(old_returns[~keep_old])
+            moments.add(new_returns[~keep_new])
+            updates = max(updates, int((~keep_new).sum()))
+        # (The previous state keeps nothing it would need: It's done evaluating.)
+        previous._recent = previous._baseline = None
+        self._updates = previous._updates + updates
+        return True
+
+    def _evaluate(self) -> None:
+        """Find the pairs that move together."""
+        recent = self._recent.correlations()  # type: ignore
+        rows, cols = np.nonzero(np.triu(recent >= self.min_correlation, k=1))
+        current = recent[rows, cols]
+        baseline = self._baseline.correlations(rows, cols)  # type: ignore
+        rises = current - baseline
+        together = np.flatnonzero(rises >= self.trigger)
+        count = len(self.members)
+        self.share = len(together) / (count * (count - 1) / 2)
+        together = together[np.argsort(-rises[together], kind="stable")]
+        self.pairs = [
+            (
+                self.members[rows[k]],
+                self.members[cols[k]],
+                float(current[k]),
+                float(baseline[k]),
+            )
+            for k in together
+        ]
+
+    @property
+    def latest_value(self) -> float:
+        """The share of the pairs that move together, rounded (for the templates)."""
+        return round(self.share, 3)
+
+    def is_ringing(self) -> bool:
+        return bool(self.pairs) and self.share >= self.min_share
+
+    def status(self) -> str:
+        """Return the share of the pairs that move together, e.g., "35% co-moving"."""
+        return f"{self.share:.0%} co-moving" if self.is_ringing() else ""
+
+    def textify(self, other: Optional[CoMovementAlertState] = None) -> str:
+        if not self.is_ringing():
+            return ""
+        s = f"{self.share:.0%} of all pairs move together"
+        if other is not None:
+            s += f" (before: {other.share:.0%})"
+        s += ":\n"
+        for a, b, current, baseline in self.pairs[: self.listed_pairs]:
+            s += f"{a} · {b}: {current:.2f} (was {baseline:.2f})\n"
+        if len(self.pairs) > self.listed_pairs:
+            s += f"… and {len(self.pairs) - self.listed_pairs} more pairs\n"
+        return s
+
+    def htmlify(self, other: Optional[CoMovementAlertState] = None) -> str:
+        return self.textify(other)
+
+    def eq(self, other: Optional[CoMovementAlertState]) -> bool:
+        """Whether `other` was ringing too. (The repository keeps the latest state of
+        every portfolio, so this alerts once per episode of co-movement.)
+        """
+        return other is not None and other.is_ringing() == self.is_ringing()
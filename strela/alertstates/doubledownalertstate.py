@@ -3,9 +3,11 @@
 from __future__ import annotations
 from collections import namedtuple
 from typing import Optional, ClassVar, List
-import statistics
-from pandas import DataFrame
+import numpy as np
+from strela.history import History, HistoryLike
+from strela.indicators import indicators_for
 from . import AlertState
+from .fluctulertstate import PREFILTER_MARGIN
 
 
 class Level(namedtuple("Level", ["trigger", "factor"])):
@@ -30,14 +32,15 @@ class DoubleDownAlertState(AlertState):
     # Class variables:
 
     levels: ClassVar[List[Level]] = [
-        Level(trigger=0.1, factor=2),  # FIXME Levels should be configurable somewhere
+        Level(trigger=0.1, factor=2),
         Level(trigger=0.2, factor=4),
         Level(trigger=0.3, factor=6),
         Level(trigger=0.4, factor=8),
         Level(trigger=0.5, factor=10),
     ]
     """The different levels at which alerts are triggered including the double-down
-    factors for each level."""
+    factors for each level. (The triggers can be overridden per symbol, see
+    `strela.thresholds`.)"""
 
     averagingperiod: ClassVar[int] = 30
     """Number of days to average over when determining if an alert triggers."""
@@ -60,57 +63,150 @@ class DoubleDownAlertState(AlertState):
     alerthistory: list
     """History of all the alerts that have been triggered."""
 
-    def __init__(self, hist: DataFrame) -> None:
+    def __init__(
+        self, hist: HistoryLike, thresholds: Optional[np.ndarray] = None
+    ) -> None:
+        """Constructor. `thresholds` overrides the triggers of `levels` (one per level,
+        in ascending order, see `default_thresholds`); the factors stay the same.
+        """
         super().__init__(hist)
+        if thresholds is not None:
+            self.check_thresholds(thresholds)
+            # (An instance variable that shadows the class variable.)
+            self.levels = [  # type: ignore
+                Level(float(trigger), level.factor)
+                for trigger, level in zip(thresholds, self.levels)
+            ]
         self.currentlevel = None
         self.alertactivated = False
         self.alerthistory = []
-        self._scan_for_alerts(hist)
+        self._origavg = None
+        self._counter = None
+        self._scan_for_alerts(indicators_for(hist).history)
 
-    def _scan_for_alerts(self, hist: DataFrame) -> Optional[Level]:
+    def _scan_for_alerts(self, hist: History) -> None:
         """Scan the entire history `hist` for alerts and set up the corresponding
         attributes (alertactivated, alerthistory, currentlevel) in the object.
         """
+        if len(hist) <= self.averagingperiod:
+            return
+        dates = hist.dates()
+        values = hist.values.tolist()
+        averages = indicators_for(hist).rolling_mean(self.averagingperiod).tolist()
+        for i in range(self.averagingperiod, len(values)):
+            newlevel = self._step(values[i], averages[i - self.averagingperiod])
+            if newlevel:
+                self.alerthistory.append((dates[i], newlevel))
+
+    def _step(self, value: float, average: float) -> Optional[Level]:
+        """Process the next history entry `value`, with `average` being the average
+        over the `averagingperiod` entries before it. Return the new alert level if one
+        is reached, `None` otherwise.
+
+        (This is the entire alert logic. Both the constructor and
+        `strela.alertstates.livestates.LiveDoubleDownAlertState` go through here.)
+        """
+        self.alertactivated = False
 
-        def _find_max_level(diff: int) -> Optional[Level]:
-            """Return max level that gets triggered for diff. Or None if no level gets
-            triggered.
-            """
-            for level in reversed(self.levels):
-                if diff >= level.trigger:
-                    return level
-            return None
-
-        dates = list(hist.index.values)
-        values = list(hist.iloc[:, 0].values)
-        origavg = None
-        counter = None
-        for i in range(self.averagingperiod, len(dates)):
-            date, value = dates[i], values[i]
-            self.alertactivated = False
-
-            # (Re-)Set original average if no alert level active currently:
-            if self.currentlevel is None:
-                origavg = statistics.mean(values[i - self.averagingperiod : i])
-
-            # Check if new alert level is reached:
-            diff = (value - origavg) / origavg * -1
-            newlevel = _find_max_level(diff)
-            if newlevel and newlevel > self.currentlevel:
-                self.alerthistory.append((date, newlevel))
-                self.alertactivated = True
-                self.currentlevel = newlevel
-                counter = self.cooldownperiod
-
-            # Cool down (if on an alert level currently):
-            if self.currentlevel is not None:
-                counter -= 1
-                if counter == 0:
-                    self.currentlevel = None
+        # (Re-)Set original average if no alert level active currently:
+        if self.currentlevel is None:
+            self._origavg = average
+
+        # Check if new alert level is reached:
+        diff = (value - self._origavg) / self._origavg * -1
+        newlevel = self._find_max_level(diff)
+        if newlevel and newlevel > self.currentlevel:
+            self.alertactivated = True
+            self.currentlevel = newlevel
+            self._counter = self.cooldownperiod
+        else:
+            newlevel = None
+
+        # Cool down (if on an alert level currently):
+        if self.currentlevel is not None:
+            self._counter -= 1
+            if self._counter == 0:
+                self.currentlevel = None
+        return newlevel
+
+    def _find_max_level(self, diff: float) -> Optional[Level]:
+        """Return max level that gets triggered for diff. Or None if no level gets
+        triggered.
+        """
+        for level in reversed(self.levels):
+            if diff >= level.trigger:
+                return level
+        return None
 
     def is_ringing(self) -> bool:
         return self.alertactivated
 
+    def status(self) -> str:
+        """Return the active level, e.g., "20% (4×)", even if it was activated earlier
+        and isn't ringing anymore.
+        """
+        if not self.currentlevel:
+            return ""
+        return f"{self.currentlevel.trigger:.0%} ({self.currentlevel.factor}×)"
+
+    @classmethod
+    def default_thresholds(cls) -> np.ndarray:
+        """Return the triggers of `levels`."""
+        return np.array([level.trigger for level in cls.levels])
+
+    @classmethod
+    def check_thresholds(cls, thresholds: np.ndarray) -> None:
+        """Also check that the triggers are ascending and between 0 and 1 (exclusive),
+        i.e., declines the levels can tell apart.
+        """
+        super().check_thresholds(thresholds)
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        if not np.all((thresholds > 0) & (thresholds < 1)):
+            raise ValueError(f"Thresholds {list(thresholds)} aren't all in (0, 1).")
+        if np.any(np.diff(thresholds) <= 0):
+            raise ValueError(f"Thresholds {list(thresholds)} aren't ascending.")
+
+    @classmethod
+    def summarize(cls, hist: History) -> np.ndarray:
+        """Return the number of entries, the last value, the max and min of the
+        entries before it that an active level's original average can stem from, and
+        the min of the entries that can have activated a level that is still active.
+        """
+        # A level stays active for at most `cooldownperiod` entries after the latest
+        # activation, and every activation while a level is active is to a higher
+        # level. So the original average is at most `len(levels) * cooldownperiod`
+        # entries old, and it averages the `averagingperiod` entries before that.
+        lookback = cls.averagingperiod + len(cls.levels) * cls.cooldownperiod
+        indicators = indicators_for(hist)
+        minvalue, maxvalue = indicators.tail_extremes(lookback, skip_last=1)
+        # (The latest activation of an active level is at most `cooldownperiod`
+        # entries old.)
+        recentmin, _ = indicators.tail_extremes(cls.cooldownperiod)
+        return np.array(
+            [len(hist), hist.values[-1], maxvalue, minvalue, recentmin],
+            dtype=np.float64,
+        )
+
+    @classmethod
+    def could_ring(
+        cls, summaries: np.ndarray, thresholds: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Every average is at most the max of the values it averages. So for positive
+        values, if the last value is above that max minus the lowest trigger, it can't
+        activate a new level -- and if all the values since the cooldown period began
+        are, no level can be active.
+        """
+        count, _, maxvalue, minvalue, recentmin = summaries.T
+        if thresholds is None:
+            lowest_trigger = cls.default_thresholds().min()
+        else:
+            lowest_trigger = np.asarray(thresholds).min(axis=1)
+        provable = np.isfinite(summaries).all(axis=1) & (minvalue > 0)
+        could_be_active = recentmin <= maxvalue * (
+            1 - lowest_trigger * (1 - PREFILTER_MARGIN)
+        )
+        return (count > cls.averagingperiod) & (~provable | could_be_active)
+
     def textify(self, other: Optional[DoubleDownAlertState] = None) -> str:
         if not self.currentlevel:
             return ""
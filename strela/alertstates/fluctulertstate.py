@@ -4,11 +4,16 @@ from __future__ import annotations
 from typing import Optional, ClassVar
 from dataclasses import InitVar, dataclass, field
 import re
-from pandas import DataFrame
-import pandas
+import numpy as np
+from strela.history import History, HistoryLike
+from strela.indicators import indicators_for
 from . import AlertState
 
 
+PREFILTER_MARGIN = 1e-9
+"""Relative safety margin of the `could_ring` bounds against rounding differences."""
+
+
 @dataclass
 class PeriodStat:
     """Helper class to calculate the stats for a given period in the history."""
@@ -19,8 +24,8 @@ class PeriodStat:
     dtrigger: float
     """Required dmin / dmax to trigger an alert."""
 
-    hist: InitVar[DataFrame]
-    """Dataframe with daily values for the metric."""
+    hist: InitVar[HistoryLike]
+    """History (or dataframe) with daily values for the metric."""
 
     dmin: float = field(init=False)
     """Difference in % between lastvalue and min value in period. Derived attribute."""
@@ -28,31 +33,47 @@ class PeriodStat:
     dmax: float = field(init=False)
     """Difference in % between lastvalue and max value in period. Derived attribute."""
 
-    def __post_init__(self, hist: DataFrame):
+    def __post_init__(self, hist: HistoryLike):
         """Calculate dmin and dmax.
 
         (post-init bc this is a dataclass that has a default initiator.)
 
-        - `hist`: A dataframe with timestamp as the index and exactly 1 column with the
-          values for the metric. The function picks this one column to do the
-          calculations.
+        - `hist`: A `strela.history.History` or a dataframe with timestamp as the index
+          and exactly 1 column with the values for the metric.
 
         (Example dataframe: '{"price":{"1604275200000":33.32}}')
         """
-        if hist.shape[1] != 1:
-            raise ValueError("Need a dataframe with exactly 1 column.")
+        indicators = indicators_for(hist)
+        hist = indicators.history
 
         if len(hist) == 0:
             self.dmin = self.dmax = 0
             return
 
-        colname = hist.columns[0]
-        lastvalue = hist[colname][-1]
-        today = hist.index[-1]
-        from_date = today - pandas.offsets.DateOffset(days=self.period)
-        from_date = from_date.strftime("%Y-%m-%d")
-        minvalue = hist[hist.index > from_date].min()[colname]
-        maxvalue = hist[hist.index > from_date].max()[colname]
+        lastvalue = hist.values[-1]
+        minvalue, maxvalue = indicators.window_extremes(self.period)
+        self._set_from_extremes(lastvalue, minvalue, maxvalue)
+
+    @classmethod
+    def from_extremes(
+        cls, period: int, dtrigger: float, lastvalue, minvalue, maxvalue
+    ) -> PeriodStat:
+        """Create a `PeriodStat` from the last value and the min and max values in the
+        period rather than from a history. (Pass `None` for `lastvalue` to signify an
+        empty history.)
+        """
+        stat = cls.__new__(cls)
+        stat.period = period
+        stat.dtrigger = dtrigger
+        if lastvalue is None:
+            stat.dmin = stat.dmax = 0
+        else:
+            stat._set_from_extremes(  # pylint: disable=protected-access
+                *np.array([lastvalue, minvalue, maxvalue], dtype=np.float64)
+            )
+        return stat
+
+    def _set_from_extremes(self, lastvalue, minvalue, maxvalue) -> None:
         self.dmin = abs((lastvalue - minvalue) / minvalue)
         self.dmax = abs((maxvalue - lastvalue) / maxvalue)
 
@@ -80,7 +101,7 @@ class FluctulertState(AlertState):
     # Class variables:
 
     period_trigger_config: ClassVar[list] = [
-        (3, 0.05),  # FIXME Should these be configurable?
+        (3, 0.05),
         (6, 0.07),
         (14, 0.1),
         (30, 0.15),
@@ -90,20 +111,80 @@ class FluctulertState(AlertState):
         (360, 0.35),
     ]
     """The different levels at which to trigger. E.g., (14, 0.1) means: If there is a
-    10% change in 14 days, trigger an alert."""
+    10% change in 14 days, trigger an alert. (The triggers can be overridden per
+    symbol, see `strela.thresholds`.)"""
 
     # Instance variables:
 
     stats: list
     """A collection of `PeriodStat` objects."""
 
-    def __init__(self, hist: DataFrame) -> None:
+    def __init__(
+        self, hist: HistoryLike, thresholds: Optional[np.ndarray] = None
+    ) -> None:
+        """Constructor. `thresholds` overrides the triggers of `period_trigger_config`
+        (one per period, see `default_thresholds`).
+        """
         super().__init__(hist)
+        hist = indicators_for(hist).history
+        periods = [period for period, _ in self.period_trigger_config]
+        if thresholds is None:
+            thresholds = self.default_thresholds()
+        else:
+            self.check_thresholds(thresholds)
         self.stats = [
-            PeriodStat(period, trigger, hist)
-            for period, trigger in self.period_trigger_config
+            PeriodStat(period, float(trigger), hist)
+            for period, trigger in zip(periods, thresholds)
         ]
 
+    @classmethod
+    def from_stats(cls, stats: list) -> FluctulertState:
+        """Create a `FluctulertState` from ready-made `PeriodStat`s rather than from a
+        history.
+        """
+        state = cls.__new__(cls)
+        state.stats = stats
+        return state
+
+    @classmethod
+    def default_thresholds(cls) -> np.ndarray:
+        """Return the triggers of `period_trigger_config`."""
+        return np.array([trigger for _, trigger in cls.period_trigger_config])
+
+    @classmethod
+    def check_thresholds(cls, thresholds: np.ndarray) -> None:
+        """Also check that the triggers are positive."""
+        super().check_thresholds(thresholds)
+        if not np.all(np.asarray(thresholds) > 0):
+            raise ValueError(f"Thresholds {list(thresholds)} aren't all positive.")
+
+    @classmethod
+    def summarize(cls, hist: History) -> np.ndarray:
+        """Return the last value and the min and max values in the longest period."""
+        longest = max(period for period, _ in cls.period_trigger_config)
+        minvalue, maxvalue = indicators_for(hist).window_extremes(longest)
+        return np.array([hist.values[-1], minvalue, maxvalue], dtype=np.float64)
+
+    @classmethod
+    def could_ring(
+        cls, summaries: np.ndarray, thresholds: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """The windows of all periods lie within the one of the longest period. So for
+        positive values, no period's dmin or dmax can exceed those of the longest
+        period, and if these are below the lowest trigger, nothing triggers.
+        """
+        lastvalue, minvalue, maxvalue = summaries.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dmin = (lastvalue - minvalue) / minvalue
+            dmax = (maxvalue - lastvalue) / maxvalue
+        if thresholds is None:
+            lowest_trigger = cls.default_thresholds().min()
+        else:
+            lowest_trigger = np.asarray(thresholds).min(axis=1)
+        bound = lowest_trigger * (1 - PREFILTER_MARGIN)
+        provable = np.isfinite(summaries).all(axis=1) & (minvalue > 0)
+        return ~provable | (dmin >= bound) | (dmax >= bound)
+
     def textify(self, other: Optional[FluctulertState] = None) -> str:
         """Return all stats as a text. Returns an empty string if there are no stats,
         i.e., if nothing happened that would trigger a trigger.
@@ -135,6 +216,15 @@ class FluctulertState(AlertState):
     def is_ringing(self) -> bool:
         return self.textify() != ""
 
+    def status(self) -> str:
+        """Return the periods that trigger, e.g., "3d↑ 90d↓"."""
+        return " ".join(
+            f"{ps.period}d{'↑' if ps.mintriggers() else ''}"
+            f"{'↓' if ps.maxtriggers() else ''}"
+            for ps in self.stats
+            if ps.mintriggers() or ps.maxtriggers()
+        )
+
     def eq(self, other: Optional[FluctulertState]) -> bool:
         """Check for equality of this PeriodStat and `other`."""
         return other is not None and all(
@@ -0,0 +1,216 @@
+"""Live alert states that are updated one history entry (tick) at a time.
+
+The regular alert states compute everything from the entire history in their
+constructor. A live alert state instead accepts one entry after the other via
+`LiveAlertState.update` and maintains what it needs in amortized O(1) time per update:
+
+- `LiveFluctulertState` keeps a monotonic deque per period for the min and the max
+  values in that period.
+- `LiveDoubleDownAlertState` keeps the entries of the averaging period.
+- `LiveVolatilityFluctulertState` additionally keeps the rolling moments of the log
+  returns (see `strela.indicators.RollingMoments`).
+
+At any point, `LiveAlertState.snapshot` returns a regular alert state that is equal to
+the one the batch constructor creates from the same entries. (See
+`strela.alert_generator.LiveAlertGenerator` to run live states for many symbols.)
+"""
+
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional, Type
+import copy
+import math
+import numpy as np
+from strela.history import NS_PER_DAY, History, HistoryLike, as_history, to_ns
+from strela.indicators import RollingMoments, exact_mean
+from . import AlertState, DoubleDownAlertState, FluctulertState
+from .fluctulertstate import PeriodStat
+from .volatilityfluctulertstate import VolatilityFluctulertState
+
+
+_EMPTY_HISTORY = History(np.empty(0, dtype=np.int64), np.empty(0))
+
+
+class LiveAlertState(ABC):
+    """The abstract base class for live alert states."""
+
+    alertstate_class: Type[AlertState]
+    """The alert state class whose logic this live state implements (incl. its
+    configuration in the class variables)."""
+
+    def __init__(self, alertstate_class: Type[AlertState]) -> None:
+        self.alertstate_class = alertstate_class
+        self._latest_timestamp: Optional[int] = None
+
+    @classmethod
+    def from_history(cls, hist: HistoryLike, **kwargs) -> LiveAlertState:
+        """Create a live state and feed it all the entries in `hist`."""
+        live = cls(**kwargs)
+        live.feed(hist)
+        return live
+
+    def feed(self, hist: HistoryLike) -> None:
+        """Process all the entries in `hist`."""
+        hist = as_history(hist)
+        for timestamp, value in zip(hist.timestamps.tolist(), hist.values.tolist()):
+            self.update(timestamp, value)
+
+    def update(self, timestamp, value: float) -> None:
+        """Process the next entry. `timestamp` can be anything `strela.history.to_ns`
+        understands. Timestamps must not decrease.
+        """
+        timestamp = to_ns(timestamp)
+        if self._latest_timestamp is not None and timestamp < self._latest_timestamp:
+            raise ValueError("Timestamps must not decrease.")
+        self._latest_timestamp = timestamp
+        self._update(timestamp, value)
+
+    @abstractmethod
+    def _update(self, timestamp: int, value: float) -> None:
+        """Process the next entry, with `timestamp` in ns."""
+
+    @abstractmethod
+    def is_ringing(self) -> bool:
+        """Return `True` if the current snapshot would be ringing. (Cheaper than
+        creating the snapshot.)
+        """
+
+    @abstractmethod
+    def snapshot(self) -> AlertState:
+        """Return the regular alert state for the entries processed so far."""
+
+
+class _WindowExtremes:
+    """Min and max over a sliding calendar window via monotonic deques."""
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self.mins: deque = deque()  # (timestamp, value), values increasing
+        self.maxs: deque = deque()  # (timestamp, value), values decreasing
+
+    def update(self, timestamp: int, value: float) -> None:
+        if not math.isnan(value):
+            while self.mins and self.mins[-1][1] >= value:
+                self.mins.pop()
+            self.mins.append((timestamp, value))
+            while self.maxs and self.maxs[-1][1] <= value:
+                self.maxs.pop()
+            self.maxs.append((timestamp, value))
+        # Same window as `strela.history.History.window_start`:
+        from_ts = timestamp - self.period * NS_PER_DAY
+        from_ts -= from_ts % NS_PER_DAY
+        while self.mins and self.mins[0][0] <= from_ts:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= from_ts:
+            self.maxs.popleft()
+
+    def extremes(self) -> tuple:
+        if not self.mins:
+            return math.nan, math.nan
+        return self.mins[0][1], self.maxs[0][1]
+
+
+class LiveFluctulertState(LiveAlertState):
+    """Live counterpart of `FluctulertState`."""
+
+    def __init__(self, alertstate_class: Type[FluctulertState] = FluctulertState):
+        super().__init__(alertstate_class)
+        self._lastvalue: Optional[float] = None
+        self._windows = [
+            (_WindowExtremes(period), trigger)
+            for period, trigger in alertstate_class.period_trigger_config
+        ]
+
+    def _update(self, timestamp: int, value: float) -> None:
+        self._lastvalue = value
+        for window, _ in self._windows:
+            window.update(timestamp, value)
+
+    def _stats(self) -> list:
+        return [
+            PeriodStat.from_extremes(
+                window.period, trigger, self._lastvalue, *window.extremes()
+            )
+            for window, trigger in self._windows
+        ]
+
+    def is_ringing(self) -> bool:
+        return any(ps.mintriggers() or ps.maxtriggers() for ps in self._stats())
+
+    def snapshot(self) -> FluctulertState:
+        return self.alertstate_class.from_stats(self._stats())
+
+
+class LiveVolatilityFluctulertState(LiveFluctulertState):
+    """Live counterpart of `VolatilityFluctulertState`."""
+
+    alertstate_class: Type[VolatilityFluctulertState]
+
+    def __init__(
+        self,
+        alertstate_class: Type[VolatilityFluctulertState] = VolatilityFluctulertState,
+    ):
+        super().__init__(alertstate_class)
+        self._moments = RollingMoments(alertstate_class.volatility_window)
+        self._lastlog: Optional[float] = None
+
+    def _update(self, timestamp: int, value: float) -> None:
+        # (Same arithmetic as `strela.indicators.log_returns`.)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log = float(np.log(np.array([value], dtype=np.float64))[0])
+        if self._lastlog is not None:
+            logreturn = log - self._lastlog
+            self._moments.update(logreturn if math.isfinite(logreturn) else math.nan)
+        self._lastlog = log
+        super()._update(timestamp, value)
+
+    def _stats(self) -> list:
+        scale = self.alertstate_class.trigger_scale(self._moments.variance)
+        return [
+            PeriodStat.from_extremes(
+                window.period,
+                float(trigger * scale),
+                self._lastvalue,
+                *window.extremes(),
+            )
+            for window, trigger in self._windows
+        ]
+
+    def snapshot(self) -> VolatilityFluctulertState:
+        return self.alertstate_class.from_stats(
+            self._stats(), math.sqrt(self._moments.variance)
+        )
+
+
+class LiveDoubleDownAlertState(LiveAlertState):
+    """Live counterpart of `DoubleDownAlertState`."""
+
+    def __init__(
+        self, alertstate_class: Type[DoubleDownAlertState] = DoubleDownAlertState
+    ):
+        super().__init__(alertstate_class)
+        self._state = alertstate_class(_EMPTY_HISTORY)
+        self._period = alertstate_class.averagingperiod
+        self._window: deque = deque(maxlen=self._period)
+
+    def _update(self, timestamp: int, value: float) -> None:
+        value = float(value)
+        state = self._state
+        if len(self._window) == self._period:
+            # The mean over the `averagingperiod` entries before this one. (Same
+            # arithmetic as `strela.indicators.running_means`, in O(averagingperiod).)
+            newlevel = state._step(  # pylint: disable=protected-access
+                value, exact_mean(self._window)
+            )
+            if newlevel:
+                state.alerthistory.append((np.datetime64(timestamp, "ns"), newlevel))
+        self._window.append(value)
+
+    def is_ringing(self) -> bool:
+        return self._state.is_ringing()
+
+    def snapshot(self) -> DoubleDownAlertState:
+        state = copy.copy(self._state)
+        state.alerthistory = list(state.alerthistory)
+        return state
@@ -0,0 +1,110 @@
+"""Volatility-normalized fluctulert state."""
+
+from __future__ import annotations
+from typing import ClassVar, Optional, Tuple
+import math
+import numpy as np
+from strela.history import History, HistoryLike
+from strela.indicators import indicators_for
+from .fluctulertstate import FluctulertState
+
+
+class VolatilityFluctulertState(FluctulertState):
+    """Fluctulert whose triggers scale with the symbol's own volatility: The fixed
+    triggers of `period_trigger_config` ring all the time for volatile symbols and
+    hardly ever for calm ones. Here, they apply as they are to a symbol whose daily log
+    returns have a standard deviation of `reference_volatility` over the last
+    `volatility_window` returns, and scale proportionally for other symbols (within
+    `scale_bounds`). E.g., with a reference of 2% a day, a symbol that moves 4% a day
+    needs a 10% change in 3 days rather than a 5% one.
+
+    The volatility comes from `strela.indicators.Indicators.return_moments`, i.e., from
+    `strela.indicators.RollingMoments`, whose incremental updates
+    `strela.alertstates.livestates.LiveVolatilityFluctulertState` keeps up tick by tick.
+    """
+
+    # Class variables:
+
+    volatility_window: ClassVar[int] = 90
+    """Number of most recent daily log returns the volatility is measured over. (Those
+    that aren't finite, e.g., next to a NaN, are left out.)"""
+
+    reference_volatility: ClassVar[float] = 0.02
+    """Volatility (standard deviation of the daily log returns) for which the triggers
+    of `period_trigger_config` apply as they are."""
+
+    scale_bounds: ClassVar[Tuple[float, float]] = (0.5, 4.0)
+    """Lower and upper bound of the factor the triggers are scaled by. (Histories with
+    too few returns to measure a volatility use a factor of 1.)"""
+
+    # Instance variables:
+
+    volatility: float
+    """The volatility the triggers are scaled for (NaN if there were too few
+    returns)."""
+
+    def __init__(
+        self, hist: HistoryLike, thresholds: Optional[np.ndarray] = None
+    ) -> None:
+        """Constructor. `thresholds` overrides the triggers of `period_trigger_config`
+        before they are scaled (see `FluctulertState`).
+        """
+        indicators = indicators_for(hist)
+        _, variance = indicators.return_moments(self.volatility_window)
+        self.volatility = math.sqrt(variance)
+        if thresholds is None:
+            thresholds = self.default_thresholds()
+        super().__init__(
+            indicators.history,
+            np.asarray(thresholds, dtype=np.float64) * self.trigger_scale(variance),
+        )
+
+    @classmethod
+    def from_stats(  # pylint: disable=arguments-differ
+        cls, stats: list, volatility: float = math.nan
+    ) -> VolatilityFluctulertState:
+        """Create a `VolatilityFluctulertState` from ready-made `PeriodStat`s (with
+        scaled triggers) and the volatility they were scaled for.
+        """
+        state = super().from_stats(stats)
+        state.volatility = volatility  # type: ignore
+        return state  # type: ignore
+
+    @classmethod
+    def trigger_scale(cls, variance):
+        """Return the factor the triggers are scaled by for the `variance` of the log
+        returns (a float or an array).
+        """
+        low, high = cls.scale_bounds
+        with np.errstate(invalid="ignore"):
+            scale = np.clip(np.sqrt(variance) / cls.reference_volatility, low, high)
+        return np.where(np.isnan(scale), 1.0, scale)
+
+    @classmethod
+    def summarize(cls, hist: History) -> np.ndarray:
+        """Return the summary of `FluctulertState` plus the variance of the log
+        returns.
+        """
+        _, variance = indicators_for(hist).return_moments(cls.volatility_window)
+        return np.append(super().summarize(hist), variance)
+
+    @classmethod
+    def could_ring(
+        cls, summaries: np.ndarray, thresholds: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Same bound as the one of `FluctulertState`, with the scaled triggers."""
+        if thresholds is None:
+            thresholds = np.tile(cls.default_thresholds(), (len(summaries), 1))
+        scales = cls.trigger_scale(summaries[:, 3])
+        return super().could_ring(
+            summaries[:, :3], np.asarray(thresholds) * scales[:, np.newaxis]
+        )
+
+    def textify(self, other: Optional[FluctulertState] = None) -> str:
+        """Return the stats as a text (see `FluctulertState.textify`), plus the
+        volatility the triggers were scaled for.
+        """
+        s = super().textify(other)
+        if s and not math.isnan(self.volatility):
+            s += f"(Volatility {self.volatility:.1%}/d)\n"
+        return s
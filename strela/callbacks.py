@@ -0,0 +1,144 @@
+"""Wrappers around metric history callbacks.
+
+The callbacks handed to `strela.alert_generator.generate_alerts` are plain functions that
+take a symbol and return its metric history. The classes here wrap such functions to add
+behavior without the generator having to know about it.
+
+Sources with bulk endpoints are better served by a batch callback, which takes a list
+of symbols and returns a mapping of symbol names to histories. `BatchCallback` wraps
+such a function so that it can be used wherever a (single symbol) callback is expected;
+`generate_alerts` then fetches the histories in batches. `batched` goes the other way
+and turns a single symbol callback into a batch callback:
+
+```python
+generate_alerts(..., metric_history_callback=BatchCallback(fetch_prices, 250), ...)
+```
+"""
+
+from typing import Callable, Dict, Iterator, List, Mapping, Tuple, Union
+import logging
+import threading
+import pandas as pd
+from strela.history import HistoryLike
+from strela.symboltype import SymbolType
+
+BatchResult = Mapping[str, Union[HistoryLike, Exception]]
+"""What a batch callback returns: The history -- or the exception that occurred while
+fetching it -- by symbol name. Symbols without an entry count as failed."""
+
+
+class CachingCallback:
+    """Wrap a metric history callback so that every symbol's history is fetched only
+    once, no matter how many alert categories ask for it. Symbols are identified by
+    their name.
+
+    Safe to use from several threads: Concurrent requests for the same symbol wait for
+    the first fetch to finish instead of fetching again. Failed fetches are not cached,
+    so the next request for that symbol will try again.
+
+    `strela.my_runner` uses `strela.fetchscheduler.FetchScheduler`, which does the same
+    deduplication besides limiting the requests per source. This class stays for
+    runners that just want to share the fetches between categories without any thread
+    pools or limits of their own.
+    """
+
+    def __init__(self, callback: Callable[[SymbolType], pd.DataFrame]) -> None:
+        """`CachingCallback` initializer.
+
+        - `callback`: The callback to be wrapped.
+        """
+        self.callback = callback
+        self._cache: Dict[str, pd.DataFrame] = {}
+        self._symbol_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol: SymbolType) -> pd.DataFrame:
+        with self._lock:
+            symbol_lock = self._symbol_locks.setdefault(symbol.name, threading.Lock())
+        with symbol_lock:
+            if symbol.name not in self._cache:
+                self._cache[symbol.name] = self.callback(symbol)
+            return self._cache[symbol.name]
+
+    def clear(self) -> None:
+        """Forget all cached histories."""
+        with self._lock:
+            self._cache.clear()
+            self._symbol_locks.clear()
+
+
+class BatchCallback:
+    """Wrap a batch callback so it can be used as a metric history callback. Provides
+    the `iter_histories` method that `strela.alert_generator.generate_alerts` uses to
+    fetch all histories (see `strela.fetchscheduler.FetchScheduler` for another
+    implementation), so the generator fetches `batch_size` symbols per call.
+
+    Failures are reported per symbol: A symbol that lacks an entry in the result or
+    whose entry is an exception counts as failed, the others in the same batch don't.
+    If the whole batch call raises, all of its symbols count as failed.
+    """
+
+    def __init__(
+        self,
+        batch_callback: Callable[[List[SymbolType]], BatchResult],
+        batch_size: int = 100,
+    ) -> None:
+        """`BatchCallback` initializer.
+
+        - `batch_callback`: Takes a list of symbols and returns a `BatchResult`.
+        - `batch_size`: Maximum number of symbols per call.
+        """
+        if batch_size < 1:
+            raise ValueError("Need a batch size of at least 1.")
+        self.batch_callback = batch_callback
+        self.batch_size = batch_size
+
+    def __call__(self, symbol: SymbolType) -> HistoryLike:
+        """Fetch the history of a single symbol (as a batch of one)."""
+        outcome = self._fetch([symbol])[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def iter_histories(
+        self, symbols: List[SymbolType]
+    ) -> Iterator[Tuple[int, Union[HistoryLike, Exception]]]:
+        """Fetch the histories of all `symbols` in batches and yield tuples of the
+        symbol's position in `symbols` and the history -- or the exception if the
+        fetch failed.
+        """
+        for start in range(0, len(symbols), self.batch_size):
+            batch = symbols[start : start + self.batch_size]
+            for offset, outcome in enumerate(self._fetch(batch)):
+                yield start + offset, outcome
+
+    def _fetch(self, batch: List[SymbolType]) -> List[Union[HistoryLike, Exception]]:
+        try:
+            result = self.batch_callback(batch)
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.warning("Batch of %d symbols failed: %s", len(batch), exc)
+            return [exc] * len(batch)
+        return [
+            result.get(symbol.name, KeyError(f"No history for {symbol.name}"))
+            for symbol in batch
+        ]
+
+
+def batched(
+    callback: Callable[[SymbolType], HistoryLike]
+) -> Callable[[List[SymbolType]], BatchResult]:
+    """Turn the single symbol `callback` into a batch callback, e.g., to combine it
+    with batch callbacks of other sources. Exceptions of `callback` end up in the
+    result.
+    """
+
+    def batch_callback(symbols: List[SymbolType]) -> BatchResult:
+        result: Dict[str, Union[HistoryLike, Exception]] = {}
+        for symbol in symbols:
+            try:
+                result[symbol.name] = callback(symbol)
+            except Exception as exc:  # pylint: disable=broad-except
+                result[symbol.name] = exc
+        return result
+
+    return batch_callback
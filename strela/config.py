@@ -75,9 +75,43 @@ MAIL_TO_ADDRESS = None
 MAIL_TEST_TO_ADDRESS = None
 
 
+# How many alert categories `strela.my_runner` runs concurrently:
+RUNNER_MAX_WORKERS = 4
+
+# Limits for fetching metric histories, per source. See
+# `strela.fetchscheduler.SourceLimits` for the available keys, e.g.:
+# {"coingecko": {"rate": 0.5, "max_concurrency": 1, "failure_threshold": 3}}
+FETCH_SOURCE_LIMITS = {}
+# Max seconds a single fetch may take (None for no limit):
+FETCH_REQUEST_TIMEOUT = 120
+# Max seconds all the fetches of a run may take together (None for no limit):
+FETCH_RUN_DEADLINE = None
+
 # The folder where the alert repo is stored:
 ALERT_REPOSITORY_FOLDER = None
 # FIXME Not all future repos need a folder (e.g., a sql db).
+# Compact the repositories every this many runs (None to never compact). Compaction
+# prunes the states of symbols that aren't watched anymore and rewrites the files:
+REPOSITORY_COMPACTION_INTERVAL = None
+# Also prune the states of symbols that haven't been seen in this many runs (None for
+# no limit):
+REPOSITORY_MAX_UNSEEN_RUNS = None
+
+# Profile the memory usage of `strela.my_runner` runs (slow; categories then run one
+# after the other). See `strela.memprofile`:
+MEMORY_PROFILE = False
+# The folder for the memory profile reports (None for ALERT_REPOSITORY_FOLDER):
+MEMORY_PROFILE_FOLDER = None
+
+# Record every history that `strela.my_runner` fetches in an archive per run, to replay
+# the run offline later. See `strela.recording`:
+RECORD_RUNS = False
+# Path of an archive to replay instead of fetching live data (None to fetch live data).
+# Combine with NO_MAIL and a separate ALERT_REPOSITORY_FOLDER to leave the production
+# states alone:
+REPLAY_RUN = None
+# None to replay at full speed, 1 to replay at the recorded latencies, 2 twice as fast:
+REPLAY_SPEED = None
 
 # ---------- Load user's settings file ----------
 
@@ -0,0 +1,457 @@
+"""Scheduling of metric history fetches with per-source limits.
+
+Symbols come from different sources (e.g., "coingecko" or "yahoo"), each with its own
+rate limits and latency profile. `FetchScheduler` wraps a metric history callback and
+fetches the histories concurrently, with a separate set of worker threads per source so
+that a slow or throttled source doesn't hold up the healthy ones. Per source, it
+applies:
+
+- a token bucket to limit the request rate,
+- a limit on the number of concurrent requests,
+- a circuit breaker that skips the source after repeated failures.
+
+In addition, every request has a deadline (`request_timeout`) and so has the run as a
+whole (`deadline`), so the time spent fetching is bounded by configuration rather than
+by the slowest upstream. The worker threads are daemon threads, so fetches that are
+still hanging when the scheduler gives up on them don't keep the process alive either.
+
+A `FetchScheduler` can be passed to `strela.alert_generator.generate_alerts` wherever a
+metric history callback is expected. The generator then fetches all symbols through
+`FetchScheduler.iter_histories`. Fetches are deduplicated by symbol name for the
+lifetime of the scheduler, so alert categories that share symbols share the fetches.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+import concurrent.futures
+import queue
+import threading
+import time
+from strela.history import HistoryLike
+from strela.symboltype import SymbolType
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised for fetches that are skipped because their source's circuit is open."""
+
+
+class FetchTimeoutError(TimeoutError):
+    """Raised for fetches that didn't finish before their deadline."""
+
+
+@dataclass
+class SourceLimits:
+    """The limits that apply to one source."""
+
+    rate: Optional[float] = None
+    """Max number of requests per second. `None` for no limit."""
+
+    burst: int = 1
+    """Number of requests that can be made at once before `rate` applies."""
+
+    max_concurrency: int = 4
+    """Max number of requests in flight at the same time."""
+
+    failure_threshold: int = 5
+    """Number of consecutive failures after which the source's circuit opens, i.e.,
+    after which the source gets skipped."""
+
+    reset_after: Optional[float] = None
+    """Seconds after which an open circuit lets a trial request through again. `None`
+    means the circuit stays open for the rest of the scheduler's lifetime."""
+
+
+class TokenBucket:
+    """Token bucket rate limiter. Thread-safe."""
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        """`TokenBucket` initializer.
+
+        - `rate`: Tokens added per second.
+        - `capacity`: Max number of tokens in the bucket.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> bool:
+        """Take a token, waiting for one if necessary. Return `False` without taking a
+        token if none would be available before `deadline` (a `time.monotonic` value).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Circuit breaker that opens after a number of consecutive failures.
+    Thread-safe.
+    """
+
+    def __init__(self, failure_threshold: int, reset_after: Optional[float] = None):
+        """`CircuitBreaker` initializer. See `SourceLimits` for the arguments."""
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the circuit is open (ignoring a possible reset)."""
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """Return `True` if a request may go through. Once `reset_after` has passed, an
+        open circuit lets a single trial request through (half-open); everybody else
+        keeps getting `False` until the trial has been recorded as a success or a
+        failure.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if (
+                self.reset_after is not None
+                and not self._trial_running
+                and time.monotonic() - self._opened_at >= self.reset_after
+            ):
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Record a successful request, which closes the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """Record a failed request, which opens the circuit at the threshold. A failed
+        trial re-opens it right away.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._trial_running:
+                self._trial_running = False
+                self._opened_at = time.monotonic()
+            elif self._failures >= self.failure_threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+
+
+class _DaemonPool:
+    """A minimal thread pool whose workers are daemon threads. (The interpreter joins
+    the workers of a `concurrent.futures.ThreadPoolExecutor` at exit, so a single hung
+    request would keep the process alive long after its deadline.)
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str) -> None:
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> concurrent.futures.Future:
+        """Schedule `fn(*args)` and return its future."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit after shutdown")
+            self._queue.put((future, fn, args))
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"{self.thread_name_prefix}_{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def shutdown(self) -> None:
+        """Cancel the queued calls and let the workers exit once they're idle. Calls
+        in flight are abandoned.
+        """
+        with self._lock:
+            self._shutdown = True
+            while True:
+                try:
+                    future, _, _ = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                future.cancel()
+            for _ in self._threads:
+                self._queue.put(None)
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as exception:  # pylint: disable=broad-except
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+
+class _Source:
+    """Everything the scheduler keeps per source."""
+
+    def __init__(self, name: Optional[str], limits: SourceLimits) -> None:
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst) if limits.rate else None
+        self.breaker = CircuitBreaker(limits.failure_threshold, limits.reset_after)
+        self.executor = _DaemonPool(limits.max_concurrency, f"fetch-{name}")
+
+
+class _Fetch:
+    """A single (possibly shared) fetch."""
+
+    __slots__ = ("source", "future", "started", "timed_out", "recorded")
+
+    def __init__(self, source: _Source) -> None:
+        self.source = source
+        self.future: Optional[concurrent.futures.Future] = None
+        self.started: Optional[float] = None
+        self.timed_out = False
+        self.recorded = False
+
+
+class FetchScheduler:
+    """Fetch metric histories through `callback` with per-source limits. See the module
+    docstring for an overview.
+    """
+
+    _POLL_INTERVAL = 0.05
+    """Seconds between deadline checks while some fetches are still queued."""
+
+    def __init__(
+        self,
+        callback: Callable[[SymbolType], HistoryLike],
+        limits: Optional[Mapping[str, Union[SourceLimits, dict]]] = None,
+        default_limits: Optional[SourceLimits] = None,
+        request_timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        source_of: Optional[Callable[[SymbolType], Optional[str]]] = None,
+    ) -> None:
+        """`FetchScheduler` initializer.
+
+        - `callback`: The metric history callback to be wrapped.
+        - `limits`: `SourceLimits` (or dicts with the same keys) per source name.
+        - `default_limits`: The limits for sources not in `limits`.
+        - `request_timeout`: Max seconds a single request may take. `None` for no
+          limit.
+        - `deadline`: Max seconds, counted from now, that all fetches through this
+          scheduler may take. `None` for no limit.
+        - `source_of`: Returns a symbol's source name. Defaults to the symbol's `source`
+          attribute (or `None` if there is none).
+        """
+        self.callback = callback
+        self.limits = {
+            k: v if isinstance(v, SourceLimits) else SourceLimits(**v)
+            for k, v in (limits or {}).items()
+        }
+        self.default_limits = default_limits or SourceLimits()
+        self.request_timeout = request_timeout
+        self.deadline = None if deadline is None else time.monotonic() + deadline
+        self.source_of = source_of or (lambda symbol: getattr(symbol, "source", None))
+        self._sources: Dict[Optional[str], _Source] = {}
+        self._fetches: Dict[str, _Fetch] = {}
+        self._running: Dict[int, _Fetch] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> FetchScheduler:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop all worker threads. Queued fetches get cancelled, fetches in flight are
+        abandoned (and don't keep the process from exiting).
+        """
+        with self._lock:
+            for source in self._sources.values():
+                source.executor.shutdown()
+            self._sources.clear()
+
+    def breaker(self, source_name: Optional[str]) -> CircuitBreaker:
+        """Return the circuit breaker of source `source_name`."""
+        return self._get_source(source_name).breaker
+
+    def __call__(self, symbol: SymbolType) -> HistoryLike:
+        """Fetch a single history (waiting for it) so the scheduler can be used like a
+        plain callback.
+        """
+        fetch = self._submit(symbol)
+        outcome = self._wait(fetch)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def iter_histories(
+        self, symbols: List[SymbolType]
+    ) -> Iterator[Tuple[int, Union[HistoryLike, Exception]]]:
+        """Fetch the histories of all `symbols` and yield tuples of the symbol's
+        position in `symbols` and the history -- or the exception if the fetch failed
+        or timed out. Yields in the order the fetches finish.
+        """
+        waiting: Dict[concurrent.futures.Future, List[Tuple[int, _Fetch]]] = {}
+        for i, symbol in enumerate(symbols):
+            fetch = self._submit(symbol)
+            waiting.setdefault(fetch.future, []).append((i, fetch))
+        while waiting:
+            done, _ = concurrent.futures.wait(
+                waiting,
+                timeout=self._next_timeout(),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                for i, fetch in waiting.pop(future):
+                    yield i, self._outcome(fetch)
+            for future in [f for f, v in waiting.items() if self._expired(v[0][1])]:
+                for i, fetch in waiting.pop(future):
+                    yield i, self._time_out(fetch)
+
+    # ----- Internals -----
+
+    def _get_source(self, source_name: Optional[str]) -> _Source:
+        with self._lock:
+            return self._get_source_unlocked(source_name)
+
+    def _get_source_unlocked(self, source_name: Optional[str]) -> _Source:
+        if source_name not in self._sources:
+            self._sources[source_name] = _Source(
+                source_name, self.limits.get(source_name, self.default_limits)
+            )
+        return self._sources[source_name]
+
+    def _submit(self, symbol: SymbolType) -> _Fetch:
+        """Submit a fetch for `symbol` unless there already is one."""
+        with self._lock:
+            fetch = self._fetches.get(symbol.name)
+            if fetch is not None:
+                return fetch
+            source = self._get_source_unlocked(self.source_of(symbol))
+            fetch = self._fetches[symbol.name] = _Fetch(source)
+            fetch.future = source.executor.submit(self._fetch, symbol, fetch)
+        return fetch
+
+    def _fetch(self, symbol: SymbolType, fetch: _Fetch) -> HistoryLike:
+        """Do the actual fetch. Runs in one of the source's worker threads."""
+        source = fetch.source
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise FetchTimeoutError(f"Deadline passed before fetching {symbol.name}")
+        if not source.breaker.allow():
+            raise CircuitOpenError(f"Circuit open, skipping {symbol.name}")
+        if source.bucket and not source.bucket.acquire(self.deadline):
+            raise FetchTimeoutError(f"Deadline passed before fetching {symbol.name}")
+        fetch.started = time.monotonic()
+        with self._lock:
+            self._running[id(fetch)] = fetch
+        try:
+            hist = self.callback(symbol)
+        except Exception:
+            self._record(fetch, success=False)
+            raise
+        finally:
+            with self._lock:
+                self._running.pop(id(fetch), None)
+        self._record(fetch, success=True)
+        return hist
+
+    def _record(self, fetch: _Fetch, success: bool) -> None:
+        """Record the outcome of `fetch` with its source's circuit breaker, unless it
+        has been recorded already. (A fetch that timed out while in flight counts as a
+        failure, no matter how it ends. Every request the breaker let through must be
+        recorded, though, so that a half-open trial doesn't stay pending forever.)
+        """
+        with self._lock:
+            if fetch.recorded:
+                return
+            fetch.recorded = True
+        if success:
+            fetch.source.breaker.record_success()
+        else:
+            fetch.source.breaker.record_failure()
+
+    def _limit(self, fetch: _Fetch) -> Optional[float]:
+        """Return the point in time by which `fetch` must be done."""
+        limits = [self.deadline]
+        if fetch.started is not None and self.request_timeout is not None:
+            limits.append(fetch.started + self.request_timeout)
+        limits = [x for x in limits if x is not None]
+        return min(limits) if limits else None
+
+    def _expired(self, fetch: _Fetch) -> bool:
+        limit = self._limit(fetch)
+        return (
+            not fetch.future.done() and limit is not None and time.monotonic() >= limit
+        )
+
+    def _next_timeout(self) -> Optional[float]:
+        """Return how long to wait for fetches before checking the deadlines again."""
+        with self._lock:
+            running = list(self._running.values())
+        limits = [self._limit(fetch) for fetch in running] + [self.deadline]
+        limits = [x for x in limits if x is not None]
+        timeout = max(0, min(limits) - time.monotonic()) if limits else None
+        if self.request_timeout is not None:
+            # Fetches that are still queued might start any moment:
+            timeout = (
+                self._POLL_INTERVAL
+                if timeout is None
+                else min(timeout, self._POLL_INTERVAL)
+            )
+        return timeout
+
+    def _wait(self, fetch: _Fetch) -> Union[HistoryLike, Exception]:
+        """Wait for a single fetch to finish or to time out."""
+        while True:
+            concurrent.futures.wait([fetch.future], timeout=self._next_timeout())
+            if fetch.future.done():
+                return self._outcome(fetch)
+            if self._expired(fetch):
+                return self._time_out(fetch)
+
+    def _outcome(self, fetch: _Fetch) -> Union[HistoryLike, Exception]:
+        if fetch.timed_out:
+            return FetchTimeoutError("Fetch timed out")
+        if fetch.future.cancelled():
+            return FetchTimeoutError("Fetch cancelled")
+        exception = fetch.future.exception()
+        if exception is not None:
+            return exception
+        return fetch.future.result()
+
+    def _time_out(self, fetch: _Fetch) -> Exception:
+        """Give up on `fetch`. Counts as a failure of the source if the request was
+        actually in flight (rather than still queued).
+        """
+        if not fetch.timed_out:
+            fetch.timed_out = True
+            if fetch.started is not None:
+                self._record(fetch, success=False)
+        return FetchTimeoutError("Fetch timed out")
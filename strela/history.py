@@ -0,0 +1,171 @@
+"""Lightweight metric history type.
+
+Alert states and the alert generator accept a metric history either as a pandas
+dataframe (timestamps as the index and exactly one column with the metric) or as a
+`History`, which is simply a pair of numpy arrays. Internally, everything works on
+`History` objects; dataframes get converted via `History.from_dataframe`, which doesn't
+copy any data in the common case.
+
+Callers whose data doesn't come from pandas in the first place can create a `History`
+directly and skip the dataframe construction altogether:
+
+```python
+History(timestamps=np.array(["2020-01-01", "2020-01-02"], dtype="datetime64[ns]"),
+        values=np.array([1.0, 1.1]))
+```
+
+To evaluate several metrics of a symbol in one go (see
+`strela.alert_generator.generate_job_alerts`), a callback returns them as a dataframe
+with one column per metric or as a mapping of metric names to histories;
+`select_metric` picks a single metric's history from either.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Mapping, Optional, Union
+import hashlib
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10**9
+"""Nanoseconds per day."""
+
+
+@dataclass(frozen=True)
+class History:
+    """A metric history as two aligned numpy arrays.
+
+    Timestamps without timezone are taken as is; timestamps in a timezone other than
+    UTC are represented by their wall time, so that calendar days are the days of that
+    timezone.
+    """
+
+    timestamps: np.ndarray
+    """Timestamps as int64 nanoseconds since the epoch, in ascending order. (Datetime64
+    arrays are accepted as well and converted.)"""
+
+    values: np.ndarray
+    """The metric values. Any numeric dtype; other dtypes are converted to float64."""
+
+    def __post_init__(self) -> None:
+        timestamps = np.asarray(self.timestamps)
+        if timestamps.dtype.kind == "M":
+            timestamps = timestamps.astype("datetime64[ns]", copy=False).view(np.int64)
+        elif timestamps.dtype != np.int64:
+            timestamps = timestamps.astype(np.int64)
+        values = np.asarray(self.values)
+        if values.dtype.kind not in "iuf":
+            values = values.astype(np.float64)
+        if timestamps.ndim != 1 or timestamps.shape != values.shape:
+            raise ValueError("Need two one-dimensional arrays of the same length.")
+        object.__setattr__(self, "timestamps", timestamps)
+        object.__setattr__(self, "values", values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> History:
+        """Create a `History` from a dataframe with timestamps as the index and exactly
+        one column with the metric. The arrays are views on the dataframe's data unless
+        a conversion is needed (unsorted or non-datetime index, timezone other than UTC,
+        non-numeric values).
+        """
+        if df.shape[1] != 1:
+            raise ValueError("Need a dataframe with exactly 1 column.")
+        index = df.index
+        if not isinstance(index, pd.DatetimeIndex):
+            index = pd.DatetimeIndex(index)
+        if index.tz is not None and str(index.tz) != "UTC":
+            index = index.tz_localize(None)
+        timestamps = index.asi8
+        values = df.iloc[:, 0].to_numpy()
+        if not index.is_monotonic_increasing:
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+        return cls(timestamps, values)
+
+    def to_dataframe(self, column: str = "value") -> pd.DataFrame:
+        """Return the history as a dataframe with a (timezone-naive) `DatetimeIndex`
+        and a single column named `column`.
+        """
+        return pd.DataFrame(
+            {column: self.values}, index=pd.DatetimeIndex(self.dates())
+        )
+
+    def dates(self) -> np.ndarray:
+        """Return the timestamps as a datetime64[ns] array (a view, not a copy)."""
+        return self.timestamps.view("datetime64[ns]")
+
+    @property
+    def latest_value(self):
+        """The most recent value."""
+        return self.values[-1]
+
+    def fingerprint(self, tail: int = 16) -> bytes:
+        """Return a cheap 16-byte fingerprint of the history. It covers the length, the
+        latest timestamp, and the last `tail` timestamps and values. So it changes when
+        entries are added or when recent entries change, but not necessarily when older
+        entries get revised.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.array([len(self)], dtype=np.int64).tobytes())
+        digest.update(self.values.dtype.str.encode())
+        digest.update(np.ascontiguousarray(self.timestamps[-tail:]).tobytes())
+        digest.update(np.ascontiguousarray(self.values[-tail:]).tobytes())
+        return digest.digest()
+
+    def window_start(self, days: int) -> int:
+        """Return the position of the first entry that lies within the `days` calendar
+        days before the latest entry. Entries at midnight `days` days before the latest
+        entry's date are not part of the window.
+        """
+        from_ts = self.timestamps[-1] - days * NS_PER_DAY
+        from_ts -= from_ts % NS_PER_DAY
+        return int(np.searchsorted(self.timestamps, from_ts, side="right"))
+
+
+HistoryLike = Union[pd.DataFrame, History]
+"""Everything that is accepted as a metric history."""
+
+MetricHistories = Union[HistoryLike, Mapping[str, HistoryLike]]
+"""Everything that is accepted as the histories of several metrics of a symbol: A
+dataframe with one column per metric, a mapping of metric names to histories, or a
+single metric history."""
+
+
+def to_ns(timestamp) -> int:
+    """Convert `timestamp` (an int in ns, a `numpy.datetime64`, a `datetime`, a
+    `pandas.Timestamp`, or a string) to int64 nanoseconds, the way `History` represents
+    timestamps.
+    """
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is not None and str(timestamp.tz) != "UTC":
+        timestamp = timestamp.tz_localize(None)
+    return timestamp.value
+
+
+def as_history(hist: HistoryLike) -> History:
+    """Return `hist` as a `History`, converting it if it is a dataframe."""
+    if isinstance(hist, History):
+        return hist
+    if isinstance(hist, pd.DataFrame):
+        return History.from_dataframe(hist)
+    raise TypeError(f"Cannot use {type(hist).__name__} as a metric history.")
+
+
+def select_metric(hist: MetricHistories, metric: Optional[str] = None) -> History:
+    """Return the history of `metric` in `hist` as a `History`. `metric` is a column
+    name if `hist` is a dataframe or a key if `hist` is a mapping. `None` selects the
+    only metric of a single metric history (or of a dataframe with a single column).
+    Raises a `KeyError` if there is no such metric.
+    """
+    if metric is None:
+        return as_history(hist)  # type: ignore
+    if isinstance(hist, pd.DataFrame):
+        return History.from_dataframe(hist[[metric]])
+    if isinstance(hist, Mapping):
+        return as_history(hist[metric])
+    raise KeyError(f"{type(hist).__name__} has no metric named {metric!r}.")
@@ -0,0 +1,316 @@
+"""Indicator kernels shared by the alert states.
+
+Alert states don't compute indicators such as rolling means or the extremes of
+calendar windows from the raw history themselves. They request them from the
+`Indicators` of the history, which computes every indicator once and caches it:
+
+```python
+indicators = indicators_for(hist)
+averages = indicators.rolling_mean(30)
+minvalue, maxvalue = indicators.window_extremes(90)
+mean, variance = indicators.return_moments(90)
+```
+
+`indicators_for` returns the same `Indicators` object for the same
+`strela.history.History` object (by identity), and `Indicators.history` is that very
+object, so passing it on keeps hitting the same cache. So when several alert state
+types -- or the prefilter and the state itself -- look at the same history in one run,
+each indicator is computed only once. The cache entries go away with the history
+objects.
+
+This relies on `History` objects being immutable, so don't modify their arrays in
+place. Dataframes, on the other hand, often are modified in place, so they are not
+cached: Every call for a dataframe converts it and returns new `Indicators`. (So to
+share the indicators between alert state types, have the metric history callback
+return `History` objects.)
+"""
+
+from __future__ import annotations
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple, Union
+import math
+import threading
+import weakref
+import numpy as np
+from strela.history import History, HistoryLike, as_history
+
+
+def exact_mean(values: Sequence[float]) -> float:
+    """Return the mean of `values` computed from their exact sum (`math.fsum`), so it
+    doesn't depend on the order of the values or on any values before them. (NaN if
+    the sum isn't defined, e.g., for both infinities.)
+    """
+    try:
+        return math.fsum(values) / len(values)
+    except ValueError:
+        return math.nan
+
+
+def running_means(values: np.ndarray, period: int) -> np.ndarray:
+    """Return the means over the `period` values before each position, starting with
+    position `period`. I.e., element `k` is the mean of `values[k : k + period]`.
+
+    Every mean is computed from its own window (see `exact_mean`), so a NaN or an
+    infinity only affects the means of the windows it is in. An incremental
+    computation over the last `period` values (e.g.,
+    `strela.alertstates.livestates.LiveDoubleDownAlertState`) gets the same means bit
+    for bit.
+    """
+    values = values.astype(np.float64, copy=False).tolist()
+    count = len(values) - period
+    if count <= 0:
+        return np.empty(0)
+    return np.array([exact_mean(values[k : k + period]) for k in range(count)])
+
+
+class RollingMoments:
+    """Mean and variance of the last `window` values of a stream, updated in O(1) per
+    value with Welford's algorithm -- and its inverse to drop the oldest value once the
+    window is full. (Unlike running sums of the values and their squares, this doesn't
+    lose the variance to cancellation.) Values that aren't finite count as missing:
+    They take up their place in the window but don't count towards the moments.
+
+    Every `window` values, the moments are recomputed from the window's values, which
+    bounds the rounding errors. The re-syncs happen at fixed positions of the stream,
+    so `from_values` reproduces the moments bit for bit from the tail of a stream (see
+    `tail_start`).
+    """
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.count = 0
+        """Number of values seen."""
+        self.mean = math.nan
+        self._window: deque = deque()
+        self._n = 0
+        self._m2 = 0.0
+
+    @staticmethod
+    def tail_start(count: int, window: int) -> int:
+        """Return the position of the last re-sync in a stream of `count` values, from
+        which on `from_values` needs the values.
+        """
+        return max(count - window, 0) // window * window
+
+    @classmethod
+    def from_values(
+        cls, values: np.ndarray, window: int, offset: int = 0
+    ) -> RollingMoments:
+        """Return the moments after a stream of `offset` values and then `values` were
+        fed one by one. Only feeds the values since the last re-sync, which need to be
+        in `values`.
+        """
+        start = cls.tail_start(offset + len(values), window) - offset
+        if start < 0:
+            raise ValueError(f"Need the values from position {start + offset} on.")
+        moments = cls(window)
+        moments.count = offset + start
+        for value in values[start:].tolist():
+            moments.update(value)
+        return moments
+
+    def update(self, value: float) -> None:
+        """Add the next value."""
+        self.count += 1
+        self._window.append(value)
+        if len(self._window) <= self.window:
+            self._add(value)
+            return
+        oldest = self._window.popleft()
+        if (self.count - self.window) % self.window == 0:
+            self.mean, self._n, self._m2 = math.nan, 0, 0.0
+            for kept in self._window:
+                self._add(kept)
+        elif math.isfinite(value) and math.isfinite(oldest):
+            # (Both steps at once.)
+            mean = self.mean
+            self.mean += (value - oldest) / self._n
+            self._m2 += (value - oldest) * (value - self.mean + oldest - mean)
+        else:
+            self._remove(oldest)
+            self._add(value)
+
+    def _add(self, value: float) -> None:
+        if not math.isfinite(value):
+            return
+        self._n += 1
+        if self._n == 1:
+            self.mean, self._m2 = value, 0.0
+            return
+        delta = value - self.mean
+        self.mean += delta / self._n
+        self._m2 += delta * (value - self.mean)
+
+    def _remove(self, value: float) -> None:
+        if not math.isfinite(value):
+            return
+        self._n -= 1
+        if self._n == 0:
+            self.mean, self._m2 = math.nan, 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self._n
+        self._m2 -= delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """The sample variance of the window (NaN for fewer than two values)."""
+        return max(self._m2, 0.0) / (self._n - 1) if self._n > 1 else math.nan
+
+
+def log_returns(values: np.ndarray) -> np.ndarray:
+    """Return the log returns between consecutive values, with NaNs for the ones that
+    aren't finite (e.g., next to NaNs or non-positive values).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(values.astype(np.float64, copy=False)))
+    returns[~np.isfinite(returns)] = math.nan
+    return returns
+
+
+def nanminmax(values: np.ndarray) -> tuple:
+    """Return min and max of `values` ignoring NaNs (NaNs if there are no other
+    values).
+    """
+    if len(values) == 0:
+        return math.nan, math.nan
+    minvalue, maxvalue = values.min(), values.max()
+    if np.isnan(minvalue):
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return math.nan, math.nan
+        minvalue, maxvalue = values.min(), values.max()
+    return minvalue, maxvalue
+
+
+class Indicators:
+    """The indicators of one history, each computed on first request. Arrays are
+    returned read-only since they are shared.
+    """
+
+    def __init__(self, hist: History, weak: bool = False) -> None:
+        """`Indicators` initializer.
+
+        - `hist`: The history to compute the indicators from.
+        - `weak`: Only keep a weak reference to `hist`. (For the cache in
+          `indicators_for`, which must not keep the histories alive.)
+        """
+        self._history: Union[History, weakref.ref] = weakref.ref(hist) if weak else hist
+        self._cache: Dict[Hashable, Any] = {}
+
+    @property
+    def history(self) -> History:
+        """The history the indicators are computed from."""
+        history = self._history
+        return history() if isinstance(history, weakref.ref) else history
+
+    def _cached(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        try:
+            return self._cache[key]
+        except KeyError:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            # (Two threads may compute the same indicator at the same time; both get
+            # the same result, so it doesn't matter which one ends up in the cache.)
+            return self._cache.setdefault(key, value)
+
+    def rolling_mean(self, period: int) -> np.ndarray:
+        """Return the means over the `period` entries before each entry, starting with
+        entry `period` (see `running_means`).
+        """
+        return self._cached(
+            ("rolling_mean", period),
+            lambda: running_means(self.history.values, period),
+        )
+
+    def window_start(self, days: int) -> int:
+        """Return the position of the first entry within the calendar window of `days`
+        days (see `strela.history.History.window_start`).
+        """
+        return self._cached(
+            ("window_start", days), lambda: self.history.window_start(days)
+        )
+
+    def window_extremes(self, days: int) -> Tuple[float, float]:
+        """Return the min and max value (ignoring NaNs) within the calendar window of
+        `days` days before the latest entry.
+        """
+        return self._cached(
+            ("window_extremes", days),
+            lambda: nanminmax(self.history.values[self.window_start(days) :]),
+        )
+
+    def tail_extremes(self, count: int, skip_last: int = 0) -> Tuple[float, float]:
+        """Return the min and max value of the last `count` entries, not counting the
+        last `skip_last` entries. (NaNs if there are no such entries.)
+        """
+
+        def compute():
+            end = len(self.history) - skip_last
+            window = self.history.values[max(end - count, 0) : max(end, 0)]
+            if len(window) == 0:
+                return math.nan, math.nan
+            return window.min(), window.max()
+
+        return self._cached(("tail_extremes", count, skip_last), compute)
+
+    def return_moments(self, window: int) -> Tuple[float, float]:
+        """Return the mean and the sample variance of the last `window` log returns,
+        leaving out the ones that aren't finite (see `log_returns` and
+        `RollingMoments`). (NaNs if there are too few.)
+        """
+
+        def compute():
+            # (Only the tail that `RollingMoments.from_values` needs, so the cost
+            # doesn't grow with the length of the history.)
+            values = self.history.values
+            start = RollingMoments.tail_start(len(values) - 1, window)
+            returns = log_returns(values[start:])
+            moments = RollingMoments.from_values(returns, window, offset=start)
+            return moments.mean, moments.variance
+
+        return self._cached(("return_moments", window), compute)
+
+    def drawdown(self) -> np.ndarray:
+        """Return the relative decline of each entry from the highest value up to that
+        entry (ignoring NaNs), e.g., 0.25 for 25% below the peak.
+        """
+
+        def compute():
+            values = self.history.values.astype(np.float64, copy=False)
+            peaks = np.fmax.accumulate(values)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return (peaks - values) / peaks
+
+        return self._cached("drawdown", compute)
+
+
+_registry: Dict[int, Indicators] = {}
+_registry_lock = threading.Lock()
+
+
+def indicators_for(hist: HistoryLike) -> Indicators:
+    """Return the `Indicators` of `hist`. For a `strela.history.History`, they are
+    shared with everybody else who asks for the indicators of the same object. For a
+    dataframe, they are new; use `Indicators.history` to pass the converted history on
+    so that its indicators are shared from there on.
+
+    The cache entry goes away when `hist` does. Thread-safe: Concurrent calls for the
+    same history get the same `Indicators`.
+    """
+    if not isinstance(hist, History):
+        return Indicators(as_history(hist))
+    key = id(hist)
+    with _registry_lock:
+        indicators = _registry.get(key)
+        if indicators is None:
+            indicators = _registry[key] = Indicators(hist, weak=True)
+            weakref.finalize(hist, _forget, key)
+        return indicators
+
+
+def _forget(key: int) -> None:
+    # (No lock here: This can run during a garbage collection that is triggered while
+    # the lock is held. Popping is atomic anyway.)
+    _registry.pop(key, None)
@@ -0,0 +1,132 @@
+"""Run journal to resume interrupted alert runs.
+
+`strela.alert_generator.generate_alerts` updates a symbol's stored state as soon as the
+state rings. If the run dies before the alerts are delivered (mailed), they are lost:
+The next run finds the same state in the repository and doesn't alert again. And it
+starts over with all the symbols.
+
+With a `RunJournal`, the generator records every alert as pending before it updates
+the state, and every symbol it is done with. A rerun then skips the symbols that are
+done already -- without fetching their histories -- and returns the pending alerts
+together with the new ones. Once the alerts are delivered, `RunJournal.complete` ends
+the run:
+
+```python
+journal = RunJournal(path, run_id=str(datetime.date.today()))
+alerts = generate_alerts(..., journal=journal)
+mail(alerts)
+journal.complete()
+```
+
+The done marks only count for the same `run_id`, so a run on the next day evaluates all
+symbols again (their histories have changed). Pending alerts are kept regardless of
+the `run_id` until they are delivered.
+
+The journal is an append-only file of JSON lines that is flushed after every record,
+so it survives the process getting killed. (A truncated last line gets ignored.)
+"""
+
+from typing import Dict, Optional
+import json
+import logging
+import os
+
+
+class RunJournal:
+    """Journal of the progress of one alert run (of one repository). Not thread-safe;
+    use one journal per `generate_alerts` call.
+    """
+
+    def __init__(self, path: str, run_id: str = "") -> None:
+        """`RunJournal` initializer. Loads the records of an earlier, interrupted run
+        from `path` if there are any.
+
+        - `path`: The journal file.
+        - `run_id`: Identifies the run, e.g., the date. Done marks of runs with another
+          id are ignored.
+        """
+        self.path = path
+        self.run_id = run_id
+        self._done: Dict[str, Optional[bytes]] = {}
+        self._pending: Dict[str, str] = {}
+        self._file = None
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning("Ignoring a damaged record in %s.", self.path)
+                    continue
+                if "alert" in record:
+                    self._pending[record["symbol"]] = record["alert"]
+                elif record.get("run_id") == self.run_id:
+                    fingerprint = record.get("fingerprint")
+                    self._done[record["symbol"]] = (
+                        None if fingerprint is None else bytes.fromhex(fingerprint)
+                    )
+
+    def _append(self, record: dict) -> None:
+        if self._file is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            # (Start on a new line in case the last one got truncated.)
+            needs_newline = os.path.isfile(self.path) and os.path.getsize(self.path) > 0
+            self._file = open(  # pylint: disable=consider-using-with
+                self.path, "a", encoding="utf-8"
+            )
+            if needs_newline:
+                self._file.write("\n")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def done(self) -> Dict[str, Optional[bytes]]:
+        """Return the names of the symbols that this run is done with, mapped to the
+        fingerprints of the histories they were evaluated with (if known).
+        """
+        return dict(self._done)
+
+    def pending_alerts(self) -> Dict[str, str]:
+        """Return the alerts that haven't been delivered yet, by symbol name."""
+        return dict(self._pending)
+
+    def record_alert(self, symbol_name: str, alert: str) -> None:
+        """Record `alert` for `symbol_name` as pending. (Replaces an earlier pending
+        alert of the same symbol.)
+        """
+        self._pending[symbol_name] = alert
+        self._append({"symbol": symbol_name, "alert": alert})
+
+    def record_done(
+        self, symbol_name: str, fingerprint: Optional[bytes] = None
+    ) -> None:
+        """Record that the run is done with `symbol_name`, whose history had the
+        fingerprint `fingerprint`.
+        """
+        self._done[symbol_name] = fingerprint
+        self._append(
+            {
+                "run_id": self.run_id,
+                "symbol": symbol_name,
+                "fingerprint": None if fingerprint is None else fingerprint.hex(),
+            }
+        )
+
+    def complete(self) -> None:
+        """End the run after its alerts have been delivered: Forget everything."""
+        self.close()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self._done.clear()
+        self._pending.clear()
+
+    def close(self) -> None:
+        """Close the journal file (without forgetting anything)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,159 @@
+"""Memory profiling of alert runs.
+
+A `MemoryProfiler` records, per stage of a run (e.g., "fetch", "state", "repository",
+"render" in `strela.alert_generator.generate_alerts`), the peak of the memory allocated
+by Python (via `tracemalloc`) and the peak RSS of the process. Whenever a stage reaches
+a new peak that is more than `snapshot_growth` above the previous one, it takes a
+`tracemalloc` snapshot and keeps the top allocation sites. `MemoryProfiler.report`
+puts it all together.
+
+```python
+profiler = MemoryProfiler()
+with profiler:
+    generate_alerts(..., profiler=profiler)
+profiler.write_report("memory-profile.txt")
+```
+
+`tracemalloc` slows Python down considerably, so only use this for diagnosis. The
+stages of a profiler must not overlap, i.e., don't use it from several threads at
+once.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+import sys
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (not available on Windows)
+    resource = None  # type: ignore
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of the process so far in bytes, or `None` if
+    it isn't available on this platform.
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # (Linux reports kilobytes, macOS bytes.)
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+@dataclass
+class StageStats:
+    """Memory statistics of one stage, aggregated over all the times it ran."""
+
+    name: str
+    """Name of the stage."""
+
+    calls: int = 0
+    """How often the stage ran."""
+
+    peak_bytes: int = 0
+    """Highest memory allocated by Python while the stage ran."""
+
+    peak_increase: int = 0
+    """Highest increase of the memory allocated by Python during one run of the stage,
+    relative to the start of that run."""
+
+    peak_rss: Optional[int] = None
+    """Peak RSS of the process at the end of the stage's latest run. (This can only
+    grow; the stage that makes it jump is the one to look at.)"""
+
+    top_allocations: List[str] = field(default_factory=list)
+    """The top allocation sites of the memory that was still allocated at the end of
+    the stage's run with the highest peak."""
+
+
+class MemoryProfiler:
+    """Record memory usage per stage of a run. See the module docstring."""
+
+    def __init__(self, top: int = 10, snapshot_growth: float = 0.1) -> None:
+        """`MemoryProfiler` initializer.
+
+        - `top`: Number of allocation sites to keep per snapshot.
+        - `snapshot_growth`: Take a new snapshot when a stage's peak grows by more
+          than this fraction.
+        """
+        self.top = top
+        self.snapshot_growth = snapshot_growth
+        self.stages: Dict[str, StageStats] = {}
+        self._started_tracing = False
+        self._snapshot_peaks: Dict[str, int] = {}
+
+    def start(self) -> None:
+        """Start tracing memory allocations (if they aren't traced already)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        """Stop tracing memory allocations if `start` started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self) -> MemoryProfiler:
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager that records the memory usage of the code it wraps as a run
+        of the stage `name`.
+        """
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            stats = self.stages.setdefault(name, StageStats(name))
+            stats.calls += 1
+            stats.peak_bytes = max(stats.peak_bytes, peak)
+            stats.peak_increase = max(stats.peak_increase, peak - start)
+            stats.peak_rss = peak_rss()
+            if peak > self._snapshot_peaks.get(name, 0) * (1 + self.snapshot_growth):
+                self._snapshot_peaks[name] = peak
+                stats.top_allocations = self._top_allocations()
+
+    def _top_allocations(self) -> List[str]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        return [str(stat) for stat in snapshot.statistics("lineno")[: self.top]]
+
+    def report(self) -> str:
+        """Return a human-readable report of all stages."""
+        lines = []
+        for stats in self.stages.values():
+            lines.append(
+                f"{stats.name}: {stats.calls} runs, "
+                f"peak {_mib(stats.peak_bytes)} traced "
+                f"(+{_mib(stats.peak_increase)} within one run), "
+                f"peak RSS {_mib(stats.peak_rss)}"
+            )
+            lines.extend(f"    {site}" for site in stats.top_allocations)
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path: str) -> None:
+        """Write `report` to the file at `path`."""
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.report())
+
+
+def _mib(num_bytes: Optional[int]) -> str:
+    return "n/a" if num_bytes is None else f"{num_bytes / 2**20:.1f} MiB"
@@ -0,0 +1,193 @@
+"""Run the alerts of several tenants (e.g., desks) in one go.
+
+Every tenant has its own config file with its own symbols file, repository folder, and
+recipient. Running `strela.my_runner` once per tenant fetches and evaluates the symbols
+that several tenants watch once per tenant. `run_tenants` instead runs the categories
+of all tenants in a single pass over the union of their symbols (see
+`strela.alert_generator.generate_job_alerts`): Every symbol is fetched once, and every
+state -- per symbol and alert state class -- is created once. Only the comparison with
+the stored states, the rendering, and the mailing happen per tenant, with the tenant's
+repositories, symbol objects, and recipient:
+
+```sh
+python -m strela.multitenant desk1/my_config.py desk2/my_config.py
+```
+
+The categories are the ones of `strela.my_runner` (see
+`strela.my_runner.alert_categories`). Symbols are identified by their name; if tenants
+configure a symbol differently, the first tenant's configuration is used to fetch it.
+Everything that isn't tenant-specific -- the mail account, fetch limits,
+`ENABLE_ALL_DOWS`, etc. -- comes from the regular config (see `strela.config`).
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import argparse
+import datetime
+import logging
+import os
+import runpy
+from strela import config
+from strela.alert_generator import AlertJob, generate_job_alerts
+from strela.alertstates import AlertStateRepository
+from strela.fetchscheduler import FetchScheduler
+from strela.journal import RunJournal
+from strela.my_runner import (
+    MyAlertToHtmlTemplate,
+    alert_categories,
+    fetch_price_history,
+    report_alerts,
+)
+from strela.statusindex import StatusIndex
+from strela.symboltype import SymbolType
+from strela.symboluniverse import load_symbol_universe
+from strela.thresholds import SymbolThresholds, ThresholdSymbol
+from strela.transitionlog import TransitionLog
+
+
+@dataclass
+class Tenant:
+    """The settings of one tenant."""
+
+    name: str
+    """Name of the tenant, for the logs."""
+
+    symbols_file: str
+    """The tenant's symbols file (see `strela.config.SYMBOLS_FILE`)."""
+
+    repository_folder: str
+    """The folder for the tenant's repositories, status index, transition log, and
+    journals."""
+
+    mail_to_address: Optional[str] = None
+    """Who gets the tenant's alerts (default: `strela.config.MAIL_TO_ADDRESS`)."""
+
+    no_mail: bool = False
+    """Print the tenant's alerts instead of mailing them."""
+
+    @classmethod
+    def from_config_file(cls, path: str, name: Optional[str] = None) -> Tenant:
+        """Read the tenant's settings from the config file at `path`, which looks like
+        a `my_config.py` (see `strela.config`): `SYMBOLS_FILE`,
+        `ALERT_REPOSITORY_FOLDER`, `MAIL_TO_ADDRESS` (default: `MAIL_FROM_ADDRESS`),
+        and `NO_MAIL`. `name` defaults to the name of the file's folder.
+        """
+        settings = {
+            key: value
+            for key, value in runpy.run_path(path).items()
+            if config.looks_like_strela_setting(key)
+        }
+        for setting in ["SYMBOLS_FILE", "ALERT_REPOSITORY_FOLDER"]:
+            if settings.get(setting) is None:
+                raise ValueError(f"Mandatory setting {setting} is not set in {path}.")
+        return cls(
+            name=name or os.path.basename(os.path.dirname(os.path.abspath(path))),
+            symbols_file=str(settings["SYMBOLS_FILE"]),
+            repository_folder=settings["ALERT_REPOSITORY_FOLDER"],
+            mail_to_address=(
+                settings.get("MAIL_TO_ADDRESS") or settings.get("MAIL_FROM_ADDRESS")
+            ),
+            no_mail=bool(settings.get("NO_MAIL", False)),
+        )
+
+
+def run_tenants(tenants: Sequence[Tenant]) -> None:
+    """Run today's alert categories of all `tenants` and report every tenant's alerts
+    to the tenant.
+    """
+    metric = "Price"
+    weekday = datetime.datetime.today().weekday()
+    union: Dict[str, SymbolType] = {}
+    plans: List[Tuple[Tenant, AlertJob]] = []
+    closeables: List[Union[StatusIndex, TransitionLog]] = []
+    for tenant in tenants:
+        status_index = StatusIndex(
+            os.path.join(tenant.repository_folder, "status-index.sqlite")
+        )
+        transition_log = TransitionLog(
+            os.path.join(tenant.repository_folder, "transitions")
+        )
+        closeables += [status_index, transition_log]
+        universe = load_symbol_universe(
+            tenant.symbols_file, which_class=ThresholdSymbol
+        )
+        for category in alert_categories(universe):
+            symbols, category_name, alert_name, alert_class, weekdays, link = category
+            if weekday not in weekdays and not config.ENABLE_ALL_DOWS:
+                continue
+            repo = AlertStateRepository(
+                f"{category_name}-{metric}-{alert_name}",
+                folder=tenant.repository_folder,
+                status_index=status_index,
+                transition_log=transition_log,
+            )
+            journal = RunJournal(
+                os.path.join(tenant.repository_folder, f"{repo.filename}-journal"),
+                run_id=str(datetime.date.today()),
+            )
+            job = AlertJob(
+                alert_class,
+                MyAlertToHtmlTemplate(category_name, alert_name, metric, link),
+                repo,
+                journal=journal,
+                symbols={symbol.name: symbol for symbol in symbols},
+                thresholds=SymbolThresholds.from_symbols(alert_class, symbols),
+            )
+            plans.append((tenant, job))
+            for symbol in symbols:
+                union.setdefault(symbol.name, symbol)
+
+    logging.info(
+        "%d tenants, %d categories, %d unique symbols.",
+        len(tenants),
+        len(plans),
+        len(union),
+    )
+    with FetchScheduler(
+        fetch_price_history,
+        limits=config.FETCH_SOURCE_LIMITS,
+        request_timeout=config.FETCH_REQUEST_TIMEOUT,
+        deadline=config.FETCH_RUN_DEADLINE,
+    ) as metric_history_callback:
+        results = generate_job_alerts(
+            [job for _, job in plans], metric_history_callback, list(union.values())
+        )
+    for closeable in closeables:
+        closeable.close()
+
+    # Report every category separately, so a failing mail doesn't keep the others'
+    # alerts from being reported (see `strela.my_runner.run`):
+    failures = []
+    for (tenant, job), alerts in zip(plans, results):
+        try:
+            report_alerts(
+                job.template,  # type: ignore
+                [alert for _, alert in alerts],
+                to_address=tenant.mail_to_address,
+                no_mail=tenant.no_mail or None,
+            )
+            job.journal.complete()  # type: ignore
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.exception(
+                "Reporting %s to %s failed.", job.repo.filename, tenant.name
+            )
+            failures.append(exc)
+    if failures:
+        raise RuntimeError(f"{len(failures)} reports failed.") from failures[0]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Command line interface: Run the alerts of the tenants with the given config
+    files.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m strela.multitenant", description=main.__doc__
+    )
+    parser.add_argument("config_files", nargs="+", help="the tenants' config files")
+    args = parser.parse_args(argv)
+    run_tenants([Tenant.from_config_file(path) for path in args.config_files])
+
+
+if __name__ == "__main__":
+    main()
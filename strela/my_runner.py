@@ -18,13 +18,30 @@ python strela/my_runner.py
 """
 
 
+import concurrent.futures
 import datetime
-from tessa.symbol import SymbolCollection, ExtendedSymbol
-from strela.alert_generator import generate_alerts
+import logging
+import os
+from typing import Callable, List, Optional, Tuple
+from strela.alert_generator import (
+    Portfolio,
+    generate_alerts,
+    generate_portfolio_alerts,
+)
+from strela.fetchscheduler import FetchScheduler
+from strela.history import History
+from strela.journal import RunJournal
+from strela.memprofile import MemoryProfiler
+from strela.recording import RecordingCallback, ReplayCallback, recording_path
+from strela.statusindex import StatusIndex, default_index_path
+from strela.symboluniverse import SymbolUniverse, load_symbol_universe
 from strela.symboltype import SymbolType
 from strela.templates import AlertToHtmlTemplate
+from strela.thresholds import SymbolThresholds, ThresholdSymbol
+from strela.transitionlog import TransitionLog, default_log_path
 from strela.alertstates import (
     AlertStateRepository,
+    CoMovementAlertState,
     DoubleDownAlertState,
     FluctulertState,
 )
@@ -50,17 +67,14 @@ class MyAlertToHtmlTemplate(AlertToHtmlTemplate):
         )
 
 
-def run() -> None:
-    """Set up everything and run the alert generation."""
-
-    # Prepare the symbol lists:
-    scoll = SymbolCollection()
-    scoll.load_yaml(config.SYMBOLS_FILE, which_class=ExtendedSymbol)
-    crypto_symbols = [x for x in scoll.symbols if x.watch and x.source == "coingecko"]
-    stockx_symbols = [x for x in scoll.symbols if x.watch and x.source != "coingecko"]
-
-    # Set up the list of all the alert categories:
-    the_alert_list = [
+def alert_categories(universe: SymbolUniverse) -> list:
+    """Return the alert categories to run on the symbols of `universe`: Tuples of the
+    symbols to check, category name, alert name, alert state class, weekdays to check,
+    and link pattern.
+    """
+    crypto_symbols = universe.select(watch=True, source="coingecko")
+    stockx_symbols = universe.select(watch=True, exclude_source="coingecko")
+    return [
         #
         # Every weekday: Check for double down alerts on both lists:
         #
@@ -101,41 +115,207 @@ def run() -> None:
         ),
     ]
 
-    # Do the actual work:
+
+def portfolio_categories(universe: SymbolUniverse) -> list:
+    """Return the portfolio alert categories (see
+    `strela.alert_generator.generate_portfolio_alerts`) to run on the symbols of
+    `universe`, as tuples like the ones of `alert_categories` but with a list of
+    portfolios rather than of symbols.
+    """
+    crypto_symbols = universe.select(watch=True, source="coingecko")
+    return [
+        #
+        # Every mon: Check if the crypto basket moves in lockstep:
+        #
+        (
+            [Portfolio("Crypto basket", crypto_symbols)],
+            "Crypto",
+            "CoMovementAlert",
+            CoMovementAlertState,
+            [0],
+            "",
+        ),
+    ]
+
+
+def fetch_price_history(symbol: SymbolType) -> History:
+    """Fetch the price history of `symbol` (a `tessa.symbol.Symbol`)."""
+    return History.from_dataframe(symbol.price_history().df)  # type: ignore
+
+
+def run() -> None:
+    """Set up everything and run the alert generation."""
+    # (With the symbols' own alert thresholds, see `strela.thresholds`.)
+    universe = load_symbol_universe(config.SYMBOLS_FILE, which_class=ThresholdSymbol)
+    the_category_list = alert_categories(universe)
+    the_portfolio_list = portfolio_categories(universe)
+    the_alert_list = the_category_list + the_portfolio_list
+    # (Up front, so that invalid thresholds in the symbols file fail the run before
+    # any category has started.)
+    the_thresholds = {
+        (category_name, alert_name): SymbolThresholds.from_symbols(alert_class, symbols)
+        for symbols, category_name, alert_name, alert_class, _, _ in the_category_list
+    }
+
+    # Do the actual work. The categories are independent of each other (they use
+    # separate repositories), so they run concurrently. All fetches go through one
+    # scheduler, which applies the per-source limits and deadlines and which makes
+    # categories that share a symbol list share the fetched histories. (As `History`
+    # objects, so they also share the indicators computed from them, see
+    # `strela.indicators`.)
     metric = "Price"
-    for (
-        symbols,
-        category_name,
-        alert_name,
-        alert_class,
-        dayofweeks,
-        link_pattern,
-    ) in the_alert_list:
-        if (
-            datetime.datetime.today().weekday() not in dayofweeks
-            and not config.ENABLE_ALL_DOWS
-        ):
-            continue
+    fetch: Callable[[SymbolType], History] = fetch_price_history
+    # (See `strela.recording`.)
+    if config.REPLAY_RUN:
+        fetch = ReplayCallback(config.REPLAY_RUN, speed=config.REPLAY_SPEED)
+    elif config.RECORD_RUNS:
+        run_id = f"{datetime.datetime.now():%Y%m%d-%H%M%S}"
+        fetch = RecordingCallback(fetch_price_history, recording_path(run_id))
+    metric_history_callback = FetchScheduler(
+        fetch,
+        limits=config.FETCH_SOURCE_LIMITS,
+        request_timeout=config.FETCH_REQUEST_TIMEOUT,
+        deadline=config.FETCH_RUN_DEADLINE,
+    )
+    profiler = MemoryProfiler() if config.MEMORY_PROFILE else None
+    # (Query it with `python -m strela.statusindex`.)
+    status_index = StatusIndex(default_index_path())
+    transition_log = TransitionLog(default_log_path())
+
+    def run_category(
+        alert_config: tuple,
+    ) -> Tuple[AlertToHtmlTemplate, List[str], Optional[RunJournal]]:
+        symbols, category_name, alert_name, alert_class, _, link_pattern = alert_config
         template = MyAlertToHtmlTemplate(
             category_name, alert_name, metric, link_pattern
         )
-        repo = AlertStateRepository(f"{category_name}-{metric}-{alert_name}")
+        repo = AlertStateRepository(
+            f"{category_name}-{metric}-{alert_name}",
+            status_index=status_index,
+            transition_log=transition_log,
+        )
+        # (If an earlier run today got interrupted, this resumes it and delivers its
+        # pending alerts.)
+        journal = RunJournal(
+            os.path.join(config.ALERT_REPOSITORY_FOLDER, f"{repo.filename}-journal"),
+            run_id=str(datetime.date.today()),
+        )
         alerts = generate_alerts(
             alertstate_class=alert_class,
-            metric_history_callback=lambda s: s.price_history().df,  # type: ignore
+            metric_history_callback=metric_history_callback,
             symbols=symbols,
             template=template,
             repo=repo,
+            profiler=profiler,
+            journal=journal,
+            thresholds=the_thresholds[category_name, alert_name],
+        )
+        interval = config.REPOSITORY_COMPACTION_INTERVAL
+        if interval and repo.lookup_last_seen()[0] % interval == 0:
+            # (The states have been updated already, so a failed compaction mustn't
+            # keep the alerts from being reported.)
+            try:
+                report = repo.compact(
+                    keep_symbols=[symbol.name for symbol in symbols],
+                    max_unseen_runs=config.REPOSITORY_MAX_UNSEEN_RUNS,
+                )
+                logging.info(
+                    "Compacted %s: %d states pruned, %d bytes reclaimed.",
+                    repo.filename,
+                    report.pruned,
+                    report.bytes_reclaimed,
+                )
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Compacting %s failed.", repo.filename)
+        return template, alerts, journal
+
+    def run_portfolio_category(
+        alert_config: tuple,
+    ) -> Tuple[AlertToHtmlTemplate, List[str], Optional[RunJournal]]:
+        portfolios, category_name, alert_name, alert_class, _, link_pattern = (
+            alert_config
+        )
+        # (The portfolios aren't symbols with a strategy, so the plain template.)
+        template = AlertToHtmlTemplate(
+            category_name, alert_name, "co-moving share", link_pattern
         )
-        alerts_str = "\n".join(alerts)  # pylint: disable=invalid-name
-        if config.NO_MAIL:
-            print(template.get_title() + "\n" + alerts_str)
-        elif alerts:
-            mailer.mail(
-                to_address=config.MAIL_TO_ADDRESS,
-                subject=template.get_title(),
-                body=template.wrap_body(alerts_str),
+        repo = AlertStateRepository(f"{category_name}-{metric}-{alert_name}")
+        alerts = generate_portfolio_alerts(
+            alert_class, metric_history_callback, portfolios, template, repo
+        )
+        return template, alerts, None
+
+    todays_alert_list = [
+        x
+        for x in the_alert_list
+        if datetime.datetime.today().weekday() in x[4] or config.ENABLE_ALL_DOWS
+    ]
+    if profiler:
+        profiler.start()
+    with metric_history_callback, concurrent.futures.ThreadPoolExecutor(
+        # (The profiler's stages must not overlap.)
+        max_workers=1 if profiler else config.RUNNER_MAX_WORKERS
+    ) as executor:
+        futures = [
+            executor.submit(
+                (
+                    run_portfolio_category
+                    if alert_config in the_portfolio_list
+                    else run_category
+                ),
+                alert_config,
             )
+            for alert_config in todays_alert_list
+        ]
+        # Report every category separately and in a stable order. A failing category
+        # must not keep the others' alerts from being reported: Their states are
+        # updated already, so their alerts would be lost for good.
+        failures = []
+        for alert_config, future in zip(todays_alert_list, futures):
+            try:
+                template, alerts, journal = future.result()
+                report_alerts(template, alerts)
+                if journal:
+                    journal.complete()
+            except Exception as exc:  # pylint: disable=broad-except
+                logging.exception("Category %s %s failed.", *alert_config[1:3])
+                failures.append(exc)
+    status_index.close()
+    transition_log.close()
+    if isinstance(fetch, (RecordingCallback, ReplayCallback)):
+        fetch.close()
+    if profiler:
+        profiler.stop()
+        report_path = os.path.join(
+            config.MEMORY_PROFILE_FOLDER or config.ALERT_REPOSITORY_FOLDER,
+            f"memory-profile-{datetime.datetime.now():%Y%m%d-%H%M%S}.txt",
+        )
+        profiler.write_report(report_path)
+        logging.info("Memory profile written to %s.", report_path)
+    if failures:
+        raise RuntimeError(f"{len(failures)} alert categories failed.") from failures[0]
+
+
+def report_alerts(
+    template: AlertToHtmlTemplate,
+    alerts: List[str],
+    to_address: Optional[str] = None,
+    no_mail: Optional[bool] = None,
+) -> None:
+    """Mail the alerts of one category (or print them if mailing is switched off).
+    `to_address` and `no_mail` default to `config.MAIL_TO_ADDRESS` and `config.NO_MAIL`.
+    """
+    alerts_str = "\n".join(alerts)  # pylint: disable=invalid-name
+    if no_mail is None:
+        no_mail = config.NO_MAIL
+    if no_mail:
+        print(template.get_title() + "\n" + alerts_str)
+    elif alerts:
+        mailer.mail(
+            to_address=to_address or config.MAIL_TO_ADDRESS,
+            subject=template.get_title(),
+            body=template.wrap_body(alerts_str),
+        )
 
 
 if __name__ == "__main__":
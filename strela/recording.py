@@ -0,0 +1,173 @@
+"""Record and replay metric histories, to rerun alerts offline.
+
+A `RecordingCallback` wraps a metric history callback and writes every history it
+fetches -- and every failure -- into an archive, together with how long the fetch took.
+A `ReplayCallback` then serves the histories from that archive without any network
+access, either at full speed or at the recorded latencies. That makes production runs
+reproducible, e.g., to benchmark or profile `strela.alert_generator.generate_alerts`
+on real data:
+
+```python
+with RecordingCallback(fetch_prices, recording_path("2024-05-01")) as callback:
+    generate_alerts(..., metric_history_callback=callback, ...)
+...
+with ReplayCallback(recording_path("2024-05-01")) as callback:
+    generate_alerts(..., metric_history_callback=callback, ...)
+```
+
+An archive is a single SQLite file with one row per symbol, indexed by the symbol's
+name. The histories are pickled and compressed with zlib. Every fetch is committed
+right away, so the recording of a run that dies is still usable. If a symbol is fetched
+more than once, the last fetch counts.
+"""
+
+from __future__ import annotations
+from typing import Callable, List, Optional
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from strela import config
+from strela.history import MetricHistories
+from strela.symboltype import SymbolType
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS histories (
+    symbol TEXT PRIMARY KEY,
+    latency REAL NOT NULL,
+    error TEXT,
+    data BLOB
+);
+"""
+
+
+class RecordedFetchError(Exception):
+    """A fetch that failed during the recording, replayed."""
+
+
+def recording_path(run_id: str) -> str:
+    """Return the default location of the archive of the run `run_id`, in the
+    "recordings" subfolder of the repository folder.
+    """
+    return os.path.join(
+        config.ALERT_REPOSITORY_FOLDER, "recordings", f"{run_id}.sqlite"
+    )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, check_same_thread=False)
+    with connection:
+        connection.executescript(_SCHEMA)
+    return connection
+
+
+class RecordingCallback:
+    """Wrap a metric history callback and record everything it returns (or raises) in
+    an archive. Thread-safe.
+    """
+
+    def __init__(
+        self, callback: Callable[[SymbolType], MetricHistories], path: str
+    ) -> None:
+        """`RecordingCallback` initializer.
+
+        - `callback`: The callback to be wrapped.
+        - `path`: The archive file. Gets created if it doesn't exist yet; existing
+          recordings of the same symbols get replaced.
+        """
+        self.callback = callback
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = _connect(path)
+
+    def __call__(self, symbol: SymbolType) -> MetricHistories:
+        start = time.perf_counter()
+        try:
+            hist = self.callback(symbol)
+        except Exception as exc:
+            self._record(symbol.name, time.perf_counter() - start, repr(exc), None)
+            raise
+        data = zlib.compress(pickle.dumps(hist, protocol=pickle.HIGHEST_PROTOCOL))
+        self._record(symbol.name, time.perf_counter() - start, None, data)
+        return hist
+
+    def _record(
+        self, name: str, latency: float, error: Optional[str], data: Optional[bytes]
+    ) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO histories VALUES (?, ?, ?, ?)",
+                (name, latency, error, data),
+            )
+
+    def __enter__(self) -> RecordingCallback:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the archive."""
+        self._connection.close()
+
+
+class ReplayCallback:
+    """Metric history callback that serves the histories from an archive that a
+    `RecordingCallback` wrote. Symbols that failed during the recording raise a
+    `RecordedFetchError`, symbols that weren't recorded a `KeyError`. Thread-safe.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None) -> None:
+        """`ReplayCallback` initializer.
+
+        - `path`: The archive file.
+        - `speed`: `None` to serve the histories right away; otherwise, every fetch
+          takes the recorded latency divided by `speed` (i.e., 1 replays the recorded
+          latencies, 2 is twice as fast).
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No recording at {path}.")
+        if speed is not None and speed <= 0:
+            raise ValueError("Need a positive speed.")
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._connection = _connect(path)
+
+    def __call__(self, symbol: SymbolType) -> MetricHistories:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT latency, error, data FROM histories WHERE symbol = ?",
+                (symbol.name,),
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No recording of {symbol.name} in {self.path}.")
+        latency, error, data = row
+        if self.speed is not None:
+            time.sleep(latency / self.speed)
+        if error is not None:
+            raise RecordedFetchError(error)
+        return pickle.loads(zlib.decompress(data))
+
+    def symbol_names(self) -> List[str]:
+        """Return the names of all recorded symbols, in alphabetical order."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT symbol FROM histories ORDER BY symbol"
+            ).fetchall()
+        return [name for name, in rows]
+
+    def __enter__(self) -> ReplayCallback:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the archive."""
+        self._connection.close()
@@ -0,0 +1,154 @@
+"""Resample intraday histories to one entry per day.
+
+The alert states treat the entries of a history as days: `DoubleDownAlertState`
+averages and cools down over a number of entries, and `FluctulertState` looks at
+calendar windows but at every entry in them. Histories of minute or hourly bars thus
+produce wrong alerts -- and take orders of magnitude longer to evaluate. Hand a
+`DailyResampler` to `strela.alert_generator.generate_alerts` to reduce every history to
+one entry per day before the states are created:
+
+```python
+generate_alerts(..., resampler=DailyResampler("min"))
+```
+
+The entry of a day has the day's midnight as its timestamp and, depending on the rule,
+the day's last (closing), first, lowest, highest, or mean value. Histories that have at
+most one entry per day already are passed on as they are.
+
+A `DailyResampler` remembers the days it has resampled per symbol, so the next run only
+resamples the days that are new (or still in progress). Like
+`strela.history.History.fingerprint`, this assumes that the sources only add or revise
+entries at the end: The cache of a symbol is reused if the history still starts with
+the same entry and has the same entry at the end of the cached days.
+"""
+
+from __future__ import annotations
+from typing import Dict, Hashable, NamedTuple
+import threading
+import numpy as np
+from strela.history import NS_PER_DAY, History
+
+RULES = ("last", "first", "min", "max", "mean")
+"""The available rules to reduce the entries of a day to a single value."""
+
+
+def is_daily(hist: History) -> bool:
+    """Return whether `hist` has at most one entry per day."""
+    days = hist.timestamps // NS_PER_DAY
+    return not np.any(days[1:] == days[:-1])
+
+
+def resample_daily(hist: History, rule: str = "last") -> History:
+    """Return `hist` with one entry per day, reduced according to `rule` (see `RULES`).
+    Returns `hist` itself if it has at most one entry per day already.
+    """
+    if rule not in RULES:
+        raise ValueError(f"Unknown rule {rule!r}, expected one of {RULES}.")
+    if is_daily(hist):
+        return hist
+    return _resample(hist, rule)
+
+
+def _resample(hist: History, rule: str) -> History:
+    days = hist.timestamps // NS_PER_DAY
+    firsts = np.flatnonzero(np.diff(days, prepend=days[:1] - 1))
+    values = hist.values
+    if rule == "last":
+        daily_values = values[np.append(firsts[1:], len(values)) - 1]
+    elif rule == "first":
+        daily_values = values[firsts]
+    elif rule == "min":
+        daily_values = np.minimum.reduceat(values, firsts)
+    elif rule == "max":
+        daily_values = np.maximum.reduceat(values, firsts)
+    else:
+        sums = np.add.reduceat(values.astype(np.float64, copy=False), firsts)
+        daily_values = sums / np.diff(np.append(firsts, len(values)))
+    return History(days[firsts] * NS_PER_DAY, daily_values)
+
+
+class _CachedDays(NamedTuple):
+    rows: int
+    """Number of raw entries that the cached days cover."""
+
+    first_timestamp: int
+    last_timestamp: int
+    last_value: float
+    """First and last raw entry covered, to check if the cache still applies."""
+
+    daily: History
+    """The resampled (complete) days."""
+
+
+class DailyResampler:
+    """Resample histories to one entry per day (see `resample_daily`) and cache the
+    complete days per key, e.g., per symbol. Thread-safe.
+    """
+
+    def __init__(self, rule: str = "last") -> None:
+        """`DailyResampler` initializer.
+
+        - `rule`: How the entries of a day are reduced to a single value, see `RULES`.
+          E.g., "last" for the closing value, "min" for the lows.
+        """
+        if rule not in RULES:
+            raise ValueError(f"Unknown rule {rule!r}, expected one of {RULES}.")
+        self.rule = rule
+        self._cache: Dict[Hashable, _CachedDays] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key: Hashable, hist: History) -> History:
+        """Return the (non-empty) history `hist` of `key` resampled to one entry per
+        day.
+        """
+        if is_daily(hist):
+            return hist
+        timestamps, values = hist.timestamps, hist.values
+        with self._lock:
+            cached = self._cache.get(key)
+        # Entries before this one belong to complete days, i.e., days before the
+        # latest one:
+        last_day = timestamps[-1] - timestamps[-1] % NS_PER_DAY
+        complete_rows = int(np.searchsorted(timestamps, last_day))
+        if cached is not None and self._applies(cached, hist):
+            rows = cached.rows
+            tail = _resample(History(timestamps[rows:], values[rows:]), self.rule)
+            daily = History(
+                np.concatenate([cached.daily.timestamps, tail.timestamps]),
+                np.concatenate([cached.daily.values, tail.values]),
+            )
+        else:
+            daily = _resample(hist, self.rule)
+        if complete_rows > 0:
+            # (All entries but the last are complete days.)
+            complete = History(daily.timestamps[:-1], daily.values[:-1])
+            with self._lock:
+                self._cache[key] = _CachedDays(
+                    complete_rows,
+                    timestamps[0],
+                    timestamps[complete_rows - 1],
+                    values[complete_rows - 1],
+                    complete,
+                )
+        return daily
+
+    @staticmethod
+    def _applies(cached: _CachedDays, hist: History) -> bool:
+        rows = cached.rows
+        if len(hist) <= rows or hist.timestamps[0] != cached.first_timestamp:
+            return False
+        last_timestamp, last_value = hist.timestamps[rows - 1], hist.values[rows - 1]
+        return (
+            last_timestamp == cached.last_timestamp
+            and (
+                last_value == cached.last_value
+                or (np.isnan(last_value) and np.isnan(cached.last_value))
+            )
+            # (The cached days must still be complete.)
+            and hist.timestamps[rows] // NS_PER_DAY > last_timestamp // NS_PER_DAY
+        )
+
+    def clear(self) -> None:
+        """Forget all cached days."""
+        with self._lock:
+            self._cache.clear()
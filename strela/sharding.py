@@ -0,0 +1,298 @@
+"""Run `strela.alert_generator.generate_alerts` in several shards.
+
+The symbols are partitioned into `num_shards` shards by a stable hash of their names
+(see `shard_of`). Every shard has its own `strela.alertstates.AlertStateRepository`
+(named `<repo_name>-shard-<shard>`), so shard workers never touch the same files and
+can run in separate processes, or on separate nodes that share the repository folder.
+The coordinator merges the shards' alerts back into symbol order, so that the result
+is the same as the one of a single `generate_alerts` call and can be templated and
+mailed as usual.
+
+Running all shards as local processes:
+
+```python
+alerts, stats = run_sharded(
+    FluctulertState, price_history, symbols, template, "crypto-price-fluctulert", 4
+)
+```
+
+Running the shards on several nodes instead: Every node runs `run_shard` for its
+`ShardTask` (from `make_shard_tasks`) and writes the result with `save_shard_result`.
+The coordinator then calls `load_shard_results` and `merge_shard_results`.
+
+When the number of shards changes, `rebalance` moves the stored states and fingerprints
+of the affected symbols (and only those) to their new shards. `run_sharded` does this
+automatically.
+"""
+
+from dataclasses import dataclass, field, fields
+from typing import Callable, Iterable, List, Optional, Tuple, Type
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import slugify
+from strela.alert_generator import RunStats, generate_symbol_alerts
+from strela.alertstates import AlertState, AlertStateRepository
+from strela.history import HistoryLike
+from strela.symboltype import SymbolType
+from strela.templates import AlertToTextTemplate
+
+
+def shard_of(symbol_name: str, num_shards: int) -> int:
+    """Return the shard (0 ... `num_shards` - 1) of the symbol named `symbol_name`.
+
+    Uses jump consistent hashing (Lamping & Veach) on a hash of the name, so the shard
+    doesn't depend on the process (unlike `hash`), and when going from n to n + 1
+    shards, only 1/(n + 1) of the symbols move -- all of them to the new shard.
+    """
+    if num_shards < 1:
+        raise ValueError("Need at least 1 shard.")
+    key = int.from_bytes(
+        hashlib.blake2b(symbol_name.encode(), digest_size=8).digest(), "little"
+    )
+    shard, candidate = -1, 0
+    while candidate < num_shards:
+        shard = candidate
+        key = (key * 2862933555777941757 + 1) % 2**64
+        candidate = int((shard + 1) * (2**31 / ((key >> 33) + 1)))
+    return shard
+
+
+def partition(symbols: Iterable[SymbolType], num_shards: int) -> List[List[int]]:
+    """Return the positions of `symbols` per shard, in ascending order."""
+    shards: List[List[int]] = [[] for _ in range(num_shards)]
+    for i, symbol in enumerate(symbols):
+        shards[shard_of(symbol.name, num_shards)].append(i)
+    return shards
+
+
+def shard_repository_name(repo_name: str, shard: int) -> str:
+    """Return the name of the repository of `shard`."""
+    return f"{repo_name}-shard-{shard}"
+
+
+@dataclass
+class ShardTask:
+    """Everything a shard worker needs. Must be picklable to run in another process,
+    i.e., the callback must be a module-level function or a picklable object.
+    """
+
+    shard: int
+    """The shard to work on."""
+
+    alertstate_class: Type[AlertState]
+    """See `strela.alert_generator.generate_alerts`."""
+
+    metric_history_callback: Callable[[SymbolType], HistoryLike]
+    """See `strela.alert_generator.generate_alerts`."""
+
+    symbols: List[SymbolType]
+    """The symbols of this shard."""
+
+    positions: List[int]
+    """The symbols' positions in the complete symbol list (for merging)."""
+
+    template: AlertToTextTemplate
+    """See `strela.alert_generator.generate_alerts`."""
+
+    repo_name: str
+    """The name of the (unsharded) repository; see `shard_repository_name`."""
+
+    folder: Optional[str] = None
+    """The repository folder; see `strela.alertstates.AlertStateRepository`."""
+
+
+@dataclass
+class ShardResult:
+    """The outcome of `run_shard`."""
+
+    shard: int
+    """The shard that was worked on."""
+
+    alerts: List[Tuple[int, str]] = field(default_factory=list)
+    """Tuples of the symbol's position in the complete symbol list and alert string."""
+
+    stats: RunStats = field(default_factory=RunStats)
+    """The shard's counters."""
+
+
+def make_shard_tasks(
+    alertstate_class: Type[AlertState],
+    metric_history_callback: Callable[[SymbolType], HistoryLike],
+    symbols: List[SymbolType],
+    template: AlertToTextTemplate,
+    repo_name: str,
+    num_shards: int,
+    folder: Optional[str] = None,
+) -> List[ShardTask]:
+    """Partition `symbols` and return one `ShardTask` per shard. The arguments are the
+    same as for `run_sharded`.
+    """
+    return [
+        ShardTask(
+            shard,
+            alertstate_class,
+            metric_history_callback,
+            [symbols[i] for i in positions],
+            positions,
+            template,
+            repo_name,
+            folder,
+        )
+        for shard, positions in enumerate(partition(symbols, num_shards))
+    ]
+
+
+def run_shard(task: ShardTask) -> ShardResult:
+    """Run `strela.alert_generator.generate_alerts` for one shard."""
+    repo = AlertStateRepository(
+        shard_repository_name(task.repo_name, task.shard), folder=task.folder
+    )
+    result = ShardResult(task.shard)
+    symbol_alerts = generate_symbol_alerts(
+        task.alertstate_class,
+        task.metric_history_callback,
+        task.symbols,
+        task.template,
+        repo,
+        stats=result.stats,
+    )
+    positions = {symbol.name: i for symbol, i in zip(task.symbols, task.positions)}
+    result.alerts = [(positions[symbol.name], alert) for symbol, alert in symbol_alerts]
+    return result
+
+
+def merge_shard_results(results: Iterable[ShardResult]) -> Tuple[List[str], RunStats]:
+    """Merge the results of all shards into the list of alert strings (in the order of
+    the complete symbol list) and the total counters.
+    """
+    alerts = []
+    stats = RunStats()
+    for result in results:
+        alerts.extend(result.alerts)
+        for stat in fields(RunStats):
+            setattr(
+                stats,
+                stat.name,
+                getattr(stats, stat.name) + getattr(result.stats, stat.name),
+            )
+    return [alert for _, alert in sorted(alerts, key=lambda x: x[0])], stats
+
+
+def save_shard_result(result: ShardResult, results_folder: str) -> str:
+    """Write `result` to `results_folder` and return the file's path. Written
+    atomically, so the coordinator never reads a partial result.
+    """
+    os.makedirs(results_folder, exist_ok=True)
+    path = os.path.join(results_folder, f"shard-{result.shard}.pickle")
+    with open(path + ".tmp", "wb") as file:
+        pickle.dump(result, file)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_shard_results(results_folder: str, num_shards: int) -> List[ShardResult]:
+    """Read the results of all `num_shards` shards from `results_folder`. Raises
+    `FileNotFoundError` if a shard's result is missing.
+    """
+    results = []
+    for shard in range(num_shards):
+        with open(os.path.join(results_folder, f"shard-{shard}.pickle"), "rb") as file:
+            results.append(pickle.load(file))
+    return results
+
+
+def _marker_path(repo_name: str, folder: Optional[str]) -> str:
+    # pylint: disable=protected-access
+    folder = AlertStateRepository._FOLDER if folder is None else folder
+    return os.path.join(folder, slugify.slugify(repo_name) + "-shards")
+
+
+def current_num_shards(repo_name: str, folder: Optional[str] = None) -> Optional[int]:
+    """Return the number of shards the repository is currently split into, or `None`
+    if it hasn't been sharded yet.
+    """
+    try:
+        with open(_marker_path(repo_name, folder), encoding="utf-8") as file:
+            return int(file.read())
+    except FileNotFoundError:
+        return None
+
+
+def rebalance(repo_name: str, num_shards: int, folder: Optional[str] = None) -> int:
+    """Move the states, fingerprints and last-seen entries of the symbols whose shard
+    changes to their new shards, then record `num_shards` as the current number of
+    shards. Needs access to all shards, so don't run it while shard workers are running.
+    Returns the number of symbols that were moved.
+    """
+    old_num_shards = current_num_shards(repo_name, folder)
+    moved = 0
+    if old_num_shards is not None and old_num_shards != num_shards:
+        repos = [
+            AlertStateRepository(shard_repository_name(repo_name, shard), folder)
+            for shard in range(max(old_num_shards, num_shards))
+        ]
+        runs = [repo.lookup_last_seen()[0] for repo in repos]
+        for old_shard in range(old_num_shards):
+            old_repo = repos[old_shard]
+            fingerprints = old_repo.lookup_fingerprints()
+            last_seen = old_repo.lookup_last_seen()[1]
+            names = set(old_repo.symbol_names()) | set(fingerprints) | set(last_seen)
+            for name in names:
+                new_shard = shard_of(name, num_shards)
+                if new_shard == old_shard:
+                    continue
+                new_repo = repos[new_shard]
+                state = old_repo.lookup_state(name)
+                if state is not None:
+                    new_repo.update_state(name, state)
+                if name in fingerprints:
+                    new_repo.update_fingerprints({name: fingerprints[name]})
+                if name in last_seen:
+                    # (Each shard counts its own runs, so keep the number of runs
+                    # since the symbol was last seen rather than the run number.)
+                    unseen_runs = runs[old_shard] - last_seen[name]
+                    new_repo.update_last_seen({name: runs[new_shard] - unseen_runs})
+                old_repo.delete_state(name)
+                moved += 1
+    with open(_marker_path(repo_name, folder), "w", encoding="utf-8") as file:
+        file.write(str(num_shards))
+    return moved
+
+
+def run_sharded(
+    alertstate_class: Type[AlertState],
+    metric_history_callback: Callable[[SymbolType], HistoryLike],
+    symbols: List[SymbolType],
+    template: AlertToTextTemplate,
+    repo_name: str,
+    num_shards: int,
+    folder: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> Tuple[List[str], RunStats]:
+    """Run all shards in local processes and return the merged alerts and counters.
+
+    - `alertstate_class`, `metric_history_callback`, `symbols`, `template`: See
+      `strela.alert_generator.generate_alerts`. The callback must be picklable.
+    - `repo_name`: The name of the (unsharded) repository.
+    - `num_shards`: The number of shards. Rebalances the repository if it differs from
+      the last run's.
+    - `folder`: The repository folder; see `strela.alertstates.AlertStateRepository`.
+    - `max_workers`: Maximum number of processes (default: `num_shards`).
+    """
+    rebalance(repo_name, num_shards, folder)
+    tasks = make_shard_tasks(
+        alertstate_class,
+        metric_history_callback,
+        symbols,
+        template,
+        repo_name,
+        num_shards,
+        folder,
+    )
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers or num_shards
+    ) as executor:
+        results = list(executor.map(run_shard, tasks))
+    return merge_shard_results(results)
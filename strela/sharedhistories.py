@@ -0,0 +1,184 @@
+"""Zero-copy transport of histories to worker processes.
+
+Handing histories to worker processes the usual way (e.g., via
+`concurrent.futures.ProcessPoolExecutor.map`) pickles every history into the worker and
+every state back. For long histories, that can cost more than the evaluation itself.
+
+`SharedHistories` packs the timestamps and values of many histories into a single
+`multiprocessing.shared_memory` block instead, with an index of where each history
+starts. Workers attach to the block by its name and get every history as a
+`strela.history.History` whose arrays are views on the block -- nothing is copied.
+`evaluate_in_processes` builds on that: The workers evaluate the alert states of a
+range of histories each and send back compact fixed-width records (see
+`EVALUATION_RECORD`) rather than the pickled states:
+
+```python
+with concurrent.futures.ProcessPoolExecutor() as executor:
+    records = evaluate_in_processes(DoubleDownAlertState, histories, executor)
+ringing = [name for name, r in zip(names, records) if r["ringing"]]
+```
+
+Layout of a block: the number of histories `n`, the `n + 1` offsets of the histories
+(all int64), then all timestamps (int64), then all values (float64). Values of other
+dtypes are converted to float64 when packing.
+"""
+
+from __future__ import annotations
+from multiprocessing import shared_memory
+from typing import List, Sequence, Type
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from strela.alertstates import AlertState
+from strela.history import History, HistoryLike, as_history
+
+EVALUATION_RECORD = np.dtype(
+    [
+        ("ringing", "?"),
+        ("status", "U32"),
+        ("latest_value", "f8"),
+    ]
+)
+"""The record a worker sends back per history: whether the state is ringing, its
+status (see `strela.alertstates.AlertState.status`; truncated to 32 characters), and
+the latest value of the history. Empty histories get a record with an empty status
+and a NaN value."""
+
+
+class SharedHistories:
+    """Many histories in one shared memory block. Create the block with `create` in
+    the parent process and attach to it with `attach` in the workers. The histories
+    are read-only.
+    """
+
+    def __init__(self, block: shared_memory.SharedMemory, owner: bool) -> None:
+        """`SharedHistories` initializer. Use `create` or `attach` instead."""
+        self.block = block
+        self.owner = owner
+        count = int(np.ndarray(1, np.int64, block.buf)[0])
+        self._offsets = np.ndarray(count + 1, np.int64, block.buf, offset=8)
+        total = int(self._offsets[-1])
+        start = 8 * (count + 2)
+        self._timestamps = np.ndarray(total, np.int64, block.buf, offset=start)
+        self._values = np.ndarray(
+            total, np.float64, block.buf, offset=start + 8 * total
+        )
+        for array in (self._offsets, self._timestamps, self._values):
+            array.flags.writeable = False
+
+    @classmethod
+    def create(cls, histories: Sequence[HistoryLike]) -> SharedHistories:
+        """Pack `histories` into a new shared memory block."""
+        converted = [as_history(hist) for hist in histories]
+        offsets = np.zeros(len(converted) + 1, dtype=np.int64)
+        np.cumsum([len(hist) for hist in converted], out=offsets[1:])
+        total = int(offsets[-1])
+        start = 8 * (len(converted) + 2)
+        block = shared_memory.SharedMemory(create=True, size=start + 16 * total)
+        np.ndarray(1, np.int64, block.buf)[0] = len(converted)
+        np.ndarray(len(offsets), np.int64, block.buf, offset=8)[:] = offsets
+        timestamps = np.ndarray(total, np.int64, block.buf, offset=start)
+        values = np.ndarray(total, np.float64, block.buf, offset=start + 8 * total)
+        for hist, begin, end in zip(converted, offsets[:-1], offsets[1:]):
+            timestamps[begin:end] = hist.timestamps
+            values[begin:end] = hist.values
+        del timestamps, values
+        return cls(block, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> SharedHistories:
+        """Attach to the existing block named `name`."""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        """The name of the block, to `attach` to it."""
+        return self.block.name
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> History:
+        """Return the `i`th history, as views on the block."""
+        begin, end = self._offsets[i], self._offsets[i + 1]
+        return History(self._timestamps[begin:end], self._values[begin:end])
+
+    def dataframe(self, i: int, column: str = "value") -> pd.DataFrame:
+        """Return the `i`th history as a dataframe (see
+        `strela.history.History.to_dataframe`).
+        """
+        return self[i].to_dataframe(column)
+
+    def close(self) -> None:
+        """Detach from the block -- and free it if this is the creating process. All
+        histories taken from it must be gone by then.
+        """
+        del self._offsets, self._timestamps, self._values
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+
+    def __enter__(self) -> SharedHistories:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def evaluate_shared(
+    name: str, alertstate_class: Type[AlertState], start: int, stop: int
+) -> np.ndarray:
+    """Evaluate the states of the histories `start` to `stop` (exclusive) in the block
+    `name` and return an array of `EVALUATION_RECORD`s. (The worker side of
+    `evaluate_in_processes`.)
+    """
+    histories = SharedHistories.attach(name)
+    try:
+        return _evaluate(histories, alertstate_class, start, stop)
+    finally:
+        histories.close()
+
+
+def _evaluate(
+    histories: SharedHistories,
+    alertstate_class: Type[AlertState],
+    start: int,
+    stop: int,
+) -> np.ndarray:
+    records = np.zeros(stop - start, dtype=EVALUATION_RECORD)
+    records["latest_value"] = np.nan
+    for record, i in zip(records, range(start, stop)):
+        hist = histories[i]
+        if len(hist) == 0:
+            continue
+        state = alertstate_class(hist)
+        record["ringing"] = state.is_ringing()
+        record["status"] = state.status()[:32]
+        record["latest_value"] = hist.latest_value
+    return records
+
+
+def evaluate_in_processes(
+    alertstate_class: Type[AlertState],
+    histories: Sequence[HistoryLike],
+    executor: concurrent.futures.Executor,
+    chunk_size: int = 256,
+) -> np.ndarray:
+    """Evaluate the states of `histories` in the worker processes of `executor` and
+    return an array of `EVALUATION_RECORD`s in the order of `histories`. The histories
+    are shared with the workers in one block (see `SharedHistories`), in chunks of
+    `chunk_size` histories per task.
+    """
+    with SharedHistories.create(histories) as shared:
+        futures: List[concurrent.futures.Future] = [
+            executor.submit(
+                evaluate_shared,
+                shared.name,
+                alertstate_class,
+                start,
+                min(start + chunk_size, len(shared)),
+            )
+            for start in range(0, len(shared), chunk_size)
+        ]
+        chunks = [future.result() for future in futures]
+    return np.concatenate(chunks) if chunks else np.zeros(0, EVALUATION_RECORD)
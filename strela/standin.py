@@ -0,0 +1,354 @@
+"""Stand-in data source and load-test driver for the fetch path.
+
+The live source (tessa) can't tell how the fetch path of
+`strela.alert_generator.generate_alerts` behaves under realistic upstream latency,
+errors, and throttling. A `StandInSource` serves synthetic price histories instead,
+with a configurable `StandInProfile`: lognormal latencies, error and throttling rates,
+and history lengths (i.e., payload sizes). Use it in-process as a metric history
+callback, or `serve` it on localhost and fetch through an `HttpCallback` to include a
+real network round trip.
+
+`run_load_test` runs the alert pipeline (through a
+`strela.fetchscheduler.FetchScheduler`) against a callback for several concurrency
+settings and reports the throughput and the percentiles of the end-to-end latencies of
+the symbols, from the start of the run until their states have been evaluated:
+
+```sh
+python -m strela.standin --symbols 2000 --concurrency 1 8 32 --error-rate 0.01 --http
+```
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Type
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+import numpy as np
+from strela.alert_generator import RunStats, generate_alerts
+from strela.alertstates import AlertState, BaseAlertStateRepository, FluctulertState
+from strela.fetchscheduler import FetchScheduler, SourceLimits
+from strela.history import NS_PER_DAY, History
+from strela.symboltype import SymbolType
+from strela.templates import AlertToTextTemplate
+
+
+class Throttled(Exception):
+    """The source asked to slow down (HTTP 429)."""
+
+
+class StandInError(ConnectionError):
+    """An injected upstream failure (HTTP 503)."""
+
+
+@dataclass
+class StandInProfile:
+    """How a `StandInSource` behaves."""
+
+    median_latency: float = 0.05
+    """Median latency of a request in seconds."""
+
+    latency_sigma: float = 0.5
+    """Sigma of the lognormal latency distribution (0 for a constant latency)."""
+
+    error_rate: float = 0.0
+    """Share of the requests that fail."""
+
+    throttle_rate: float = 0.0
+    """Share of the requests that are throttled."""
+
+    history_length: int = 1000
+    """Number of daily entries per history."""
+
+    seed: int = 0
+    """Seed for the histories and the injected latencies and failures."""
+
+
+@dataclass
+class StandInSymbol:
+    """A symbol of the stand-in source."""
+
+    name: str
+    """The symbol's name."""
+
+    source: str = "standin"
+    """The source name, for `strela.fetchscheduler.FetchScheduler`."""
+
+
+def synthetic_history(name: str, length: int, seed: int = 0) -> History:
+    """Return a random walk of `length` daily entries. The same arguments always give
+    the same history.
+    """
+    rng = np.random.default_rng([seed, zlib.crc32(name.encode())])
+    values = 100 * np.exp(np.cumsum(rng.normal(0, rng.choice([0.01, 0.03]), length)))
+    last_day = np.datetime64("2024-01-01", "ns").astype(np.int64)
+    timestamps = last_day - np.arange(length - 1, -1, -1, dtype=np.int64) * NS_PER_DAY
+    return History(timestamps, values)
+
+
+class StandInSource:
+    """Serves synthetic histories with injected latencies and failures. Can be used as
+    a metric history callback directly. Thread-safe.
+    """
+
+    def __init__(self, profile: Optional[StandInProfile] = None) -> None:
+        """`StandInSource` initializer.
+
+        - `profile`: How the source behaves (default: `StandInProfile()`).
+        """
+        self.profile = profile or StandInProfile()
+        self._rng = np.random.default_rng(self.profile.seed)
+        self._lock = threading.Lock()
+
+    def respond(self, name: str) -> Tuple[float, int, Optional[History]]:
+        """Draw the response to a request for `name`: the latency, the HTTP status
+        (200, 429, or 503), and the history (for status 200).
+        """
+        profile = self.profile
+        with self._lock:
+            latency = profile.median_latency * float(
+                np.exp(self._rng.normal(0, profile.latency_sigma))
+            )
+            draw = self._rng.random()
+        if draw < profile.error_rate:
+            return latency, 503, None
+        if draw < profile.error_rate + profile.throttle_rate:
+            return latency, 429, None
+        history = synthetic_history(name, profile.history_length, profile.seed)
+        return latency, 200, history
+
+    def __call__(self, symbol: SymbolType) -> History:
+        latency, status, history = self.respond(symbol.name)
+        time.sleep(latency)
+        if status == 429:
+            raise Throttled(symbol.name)
+        if status != 200:
+            raise StandInError(symbol.name)
+        return history  # type: ignore
+
+
+def serve(
+    source: StandInSource, host: str = "127.0.0.1", port: int = 0
+) -> ThreadingHTTPServer:
+    """Serve `source` over HTTP (in a daemon thread) at `GET /history/<name>`, which
+    returns `{"timestamps": [...], "values": [...]}`. `port` 0 picks a free port (see
+    the server's `server_address`). Call `shutdown` on the server to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        """Request handler of the stand-in server."""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Respond to a history request."""
+            prefix = "/history/"
+            if not self.path.startswith(prefix):
+                self.send_error(404)
+                return
+            name = urllib.parse.unquote(self.path[len(prefix) :])
+            latency, status, history = source.respond(name)
+            time.sleep(latency)
+            if history is None:
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps(
+                {
+                    "timestamps": history.timestamps.tolist(),
+                    "values": history.values.tolist(),
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):  # pylint: disable=arguments-differ
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class HttpCallback:
+    """Metric history callback that fetches from a server started with `serve`."""
+
+    def __init__(self, base_url: str, timeout: float = 30) -> None:
+        """`HttpCallback` initializer.
+
+        - `base_url`: E.g., "http://127.0.0.1:8765".
+        - `timeout`: Socket timeout in seconds.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, symbol: SymbolType) -> History:
+        url = f"{self.base_url}/history/{urllib.parse.quote(symbol.name)}"
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as exc:
+            if exc.code == 429:
+                raise Throttled(symbol.name) from exc
+            raise
+        return History(
+            np.array(data["timestamps"], dtype=np.int64), np.array(data["values"])
+        )
+
+
+@dataclass
+class LoadTestResult:
+    """The outcome of one load test run."""
+
+    concurrency: int
+    """Max number of requests in flight."""
+
+    symbols: int
+    """Number of symbols."""
+
+    seconds: float
+    """Wall time of the whole run."""
+
+    errors: int
+    """Number of symbols whose fetch failed (incl. throttled ones)."""
+
+    p50: float
+    p95: float
+    p99: float
+    """Percentiles of the end-to-end latencies in seconds of the symbols that were
+    fetched successfully: From the start of the run, when all fetches are submitted to
+    the scheduler, until the symbol's state has been evaluated (incl. queueing in the
+    scheduler, the transport, and waiting for the prefilter batch)."""
+
+    @property
+    def symbols_per_second(self) -> float:
+        """Throughput of the run."""
+        return self.symbols / self.seconds if self.seconds else float("inf")
+
+    def __str__(self) -> str:
+        return (
+            f"concurrency {self.concurrency:4}: {self.symbols_per_second:8.1f} "
+            f"symbols/s, p50 {self.p50 * 1000:7.1f} ms, p95 {self.p95 * 1000:7.1f} ms, "
+            f"p99 {self.p99 * 1000:7.1f} ms, {self.errors} errors"
+        )
+
+
+class _TimingRepository(BaseAlertStateRepository):
+    """In-memory repository that notes when each symbol's state was evaluated. (The
+    generator records the status of every evaluated state, prefiltered or not.)
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.evaluated_at: Dict[str, float] = {}
+
+    def record_status(
+        self,
+        alertstate_class: Type[AlertState],
+        evaluations: Iterable[Tuple[str, Optional[AlertState], History]],
+    ) -> None:
+        evaluations = list(evaluations)
+        super().record_status(alertstate_class, evaluations)
+        now = time.perf_counter()
+        for name, _, _ in evaluations:
+            self.evaluated_at[name] = now
+
+
+def run_load_test(
+    callback,
+    symbol_count: int = 1000,
+    concurrencies: Sequence[int] = (1, 4, 16, 64),
+    alertstate_class: Type[AlertState] = FluctulertState,
+) -> List[LoadTestResult]:
+    """Run `generate_alerts` over `symbol_count` `StandInSymbol`s with histories from
+    `callback` once per concurrency setting in `concurrencies` and return the results.
+    Every run fetches through a new `strela.fetchscheduler.FetchScheduler` that lets
+    that many requests be in flight (and never opens the circuit) and uses a new
+    in-memory repository. (See `LoadTestResult` for the latencies.)
+    """
+    symbols = [StandInSymbol(f"SYM{i:06}") for i in range(symbol_count)]
+    results = []
+    for concurrency in concurrencies:
+        limits = SourceLimits(
+            max_concurrency=concurrency, failure_threshold=symbol_count + 1
+        )
+        stats = RunStats()
+        repo = _TimingRepository("loadtest")
+        start = time.perf_counter()
+        with FetchScheduler(callback, default_limits=limits) as scheduler:
+            generate_alerts(
+                alertstate_class,
+                scheduler,
+                symbols,  # type: ignore
+                AlertToTextTemplate("Load test", "", "Price"),
+                repo,
+                stats=stats,
+            )
+        seconds = time.perf_counter() - start
+        latencies = [t - start for t in repo.evaluated_at.values()]
+        p50, p95, p99 = (
+            np.percentile(latencies, [50, 95, 99]) if latencies else [np.nan] * 3
+        )
+        results.append(
+            LoadTestResult(
+                concurrency, symbol_count, seconds, stats.fetch_errors, p50, p95, p99
+            )
+        )
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Command line interface: Run a load test against a stand-in source and print the
+    results.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m strela.standin", description=main.__doc__
+    )
+    parser.add_argument("--symbols", type=int, default=1000, help="number of symbols")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16, 64]
+    )
+    parser.add_argument("--median-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--length", type=int, default=1000, help="entries per history")
+    parser.add_argument("--http", action="store_true", help="fetch via localhost")
+    args = parser.parse_args(argv)
+    source = StandInSource(
+        StandInProfile(
+            median_latency=args.median_latency,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            history_length=args.length,
+        )
+    )
+    server = None
+    callback = source
+    if args.http:
+        server = serve(source)
+        host, port = server.server_address[:2]
+        callback = HttpCallback(f"http://{host}:{port}")  # type: ignore
+    try:
+        for result in run_load_test(callback, args.symbols, args.concurrency):
+            print(result)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
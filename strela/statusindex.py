@@ -0,0 +1,222 @@
+"""Index of the current alert status of all symbols.
+
+Answering "which symbols are in an active double-down level right now?" from the
+repositories means opening every shelf and unpickling every state. A `StatusIndex`
+keeps a small SQLite table instead, with one row per repository and symbol: the alert
+type, whether the state is ringing, a short summary of the active alert condition (see
+`strela.alertstates.AlertState.status`), the latest value, and the timestamps of the
+latest history entry and of the evaluation. Queries over tens of thousands of symbols
+take milliseconds.
+
+Hand the index to the repositories; `strela.alert_generator.generate_alerts` then keeps
+it up to date with every state it evaluates:
+
+```python
+index = StatusIndex(default_index_path())
+repo = AlertStateRepository("Crypto-Price-DoubleDownAlert", status_index=index)
+generate_alerts(..., repo=repo)
+index.query(active=True, alert_type="DoubleDownAlertState")
+```
+
+Symbols that `generate_alerts` skips because their history is unchanged keep their
+row. Symbols that the prefilter skips are recorded as not ringing and without an active
+alert condition, which is what the prefilter proved about them (see
+`strela.alertstates.AlertState.could_ring`).
+
+There's also a small command line interface, e.g.:
+
+```sh
+python -m strela.statusindex --active --type DoubleDownAlertState
+```
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+from strela import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS status (
+    repo TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    alert_type TEXT NOT NULL,
+    ringing INTEGER NOT NULL,
+    status TEXT,
+    latest_value REAL,
+    as_of TEXT,
+    evaluated_at TEXT NOT NULL,
+    PRIMARY KEY (repo, symbol)
+);
+CREATE INDEX IF NOT EXISTS status_ringing ON status (ringing, alert_type);
+CREATE INDEX IF NOT EXISTS status_active ON status (alert_type, status);
+CREATE INDEX IF NOT EXISTS status_symbol ON status (symbol);
+"""
+
+
+@dataclass
+class StatusEntry:
+    """The current alert status of one symbol in one repository."""
+
+    repo: str
+    """Name of the repository (see `strela.alertstates.AlertStateRepository`)."""
+
+    symbol: str
+    """Name of the symbol."""
+
+    alert_type: str
+    """Name of the alert state class, e.g., "DoubleDownAlertState"."""
+
+    ringing: bool
+    """Whether the state was ringing when it was last evaluated."""
+
+    status: Optional[str]
+    """Summary of the active alert condition, e.g., "20% (4×)" for a double-down
+    level. Empty if none is active, `None` if unknown."""
+
+    latest_value: Optional[float]
+    """Latest value of the metric."""
+
+    as_of: Optional[str]
+    """Timestamp of the latest history entry (ISO format)."""
+
+    evaluated_at: str
+    """When the state was evaluated (ISO format, UTC)."""
+
+    @property
+    def active(self) -> bool:
+        """Whether an alert condition is active."""
+        return bool(self.status)
+
+
+def default_index_path() -> str:
+    """Return the default location of the index, in the repository folder."""
+    return os.path.join(config.ALERT_REPOSITORY_FOLDER, "status-index.sqlite")
+
+
+class StatusIndex:
+    """SQLite-backed index of `StatusEntry`s. Thread-safe."""
+
+    def __init__(self, path: str) -> None:
+        """`StatusIndex` initializer.
+
+        - `path`: The database file (`":memory:"` for an index in memory).
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def update(self, entries: Iterable[StatusEntry]) -> None:
+        """Insert or replace `entries` (in one transaction)."""
+        rows = [
+            (
+                e.repo,
+                e.symbol,
+                e.alert_type,
+                int(e.ringing),
+                e.status,
+                e.latest_value,
+                e.as_of,
+                e.evaluated_at,
+            )
+            for e in entries
+        ]
+        if not rows:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO status VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def remove(self, repo: str, symbol: str) -> None:
+        """Remove the entry of `symbol` in `repo` (if there is one)."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM status WHERE repo = ? AND symbol = ?", (repo, symbol)
+            )
+
+    def query(
+        self,
+        ringing: Optional[bool] = None,
+        active: Optional[bool] = None,
+        alert_type: Optional[str] = None,
+        repo: Optional[str] = None,
+        symbol: Optional[str] = None,
+    ) -> List[StatusEntry]:
+        """Return the entries that match all the given criteria, ordered by repository
+        and symbol. `active=False` doesn't match entries with an unknown status.
+        """
+        conditions, params = [], []
+        if ringing is not None:
+            conditions.append("ringing = ?")
+            params.append(int(ringing))
+        if active is not None:
+            conditions.append("status != ''" if active else "status = ''")
+        for column, value in [
+            ("alert_type", alert_type),
+            ("repo", repo),
+            ("symbol", symbol),
+        ]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT * FROM status"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY repo, symbol"
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        return [StatusEntry(*row[:3], bool(row[3]), *row[4:]) for row in rows]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
+
+
+def now() -> str:
+    """Return the current time in the format of `StatusEntry.evaluated_at`."""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Command line interface: Print the entries that match the given criteria."""
+    parser = argparse.ArgumentParser(
+        prog="python -m strela.statusindex", description=main.__doc__
+    )
+    parser.add_argument(
+        "--db", help="index file (default: see `default_index_path`)"
+    )
+    parser.add_argument("--ringing", action="store_true", help="only ringing states")
+    parser.add_argument(
+        "--active", action="store_true", help="only active alert conditions"
+    )
+    parser.add_argument("--type", help="alert type, e.g., DoubleDownAlertState")
+    parser.add_argument("--repo", help="repository name")
+    parser.add_argument("--symbol", help="symbol name")
+    args = parser.parse_args(argv)
+    index = StatusIndex(args.db or default_index_path())
+    entries = index.query(
+        ringing=args.ringing or None,
+        active=args.active or None,
+        alert_type=args.type,
+        repo=args.repo,
+        symbol=args.symbol,
+    )
+    index.close()
+    for e in entries:
+        print(
+            f"{e.repo:30} {e.symbol:15} {e.alert_type:22} "
+            f"{'ringing' if e.ringing else '':7} {e.status or '':25} "
+            f"{e.latest_value} (as of {e.as_of}, evaluated {e.evaluated_at})"
+        )
+    print(f"{len(entries)} entries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Load the symbol universe (i.e., the symbols file) with caching.
+
+Parsing a large symbols file into symbol objects takes noticeable time. So the parsed
+symbols are cached in a pickle file in the repository folder
+(`config.ALERT_REPOSITORY_FOLDER`) and reused as long as the symbols file doesn't
+change. The cache is considered current if the symbols file's mtime and size are
+unchanged or -- if they did change -- its content hash is unchanged. It is ignored
+after an upgrade of tessa, whose symbol classes are pickled in it.
+
+The symbols are also indexed by `source` and `watch`, so that selecting the symbols
+for an alert category is a lookup rather than a scan over all symbols:
+
+```python
+universe = load_symbol_universe(config.SYMBOLS_FILE)
+crypto_symbols = universe.select(watch=True, source="coingecko")
+stockx_symbols = universe.select(watch=True, exclude_source="coingecko")
+```
+"""
+
+from typing import Dict, List, Optional, Tuple, Type
+import hashlib
+import heapq
+import importlib.metadata
+import logging
+import os
+import pickle
+from tessa.symbol import SymbolCollection, ExtendedSymbol
+from strela import config
+
+CACHE_FORMAT_VERSION = 1
+"""Increase this if the layout of the cache changes so that old caches get ignored."""
+
+
+class SymbolUniverse:
+    """A list of symbols plus an index by `source` and `watch` attributes. (Symbols
+    without these attributes are indexed under `None` and `False` respectively.)
+    """
+
+    symbols: list
+    """All symbols in the order of the symbols file."""
+
+    def __init__(self, symbols: list) -> None:
+        self.symbols = symbols
+        self._index: Dict[Tuple[Optional[str], bool], List[int]] = {}
+        for i, symbol in enumerate(symbols):
+            source = getattr(symbol, "source", None)
+            watch = bool(getattr(symbol, "watch", False))
+            self._index.setdefault((source, watch), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def select(
+        self,
+        watch: Optional[bool] = None,
+        source: Optional[str] = None,
+        exclude_source: Optional[str] = None,
+    ) -> list:
+        """Return the symbols that match all of the given criteria (`None` means "don't
+        care") in the order of the symbols file.
+        """
+        positions = [
+            indices
+            for (isource, iwatch), indices in self._index.items()
+            if (watch is None or iwatch == watch)
+            and (source is None or isource == source)
+            and (exclude_source is None or isource != exclude_source)
+        ]
+        return [self.symbols[i] for i in heapq.merge(*positions)]
+
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def default_cache_path(symbols_file: str) -> Optional[str]:
+    """Return the path of the cache file for `symbols_file`, which is in the repository
+    folder, or `None` (no caching) if there is no repository folder.
+    """
+    if config.ALERT_REPOSITORY_FOLDER is None:
+        return None
+    path = os.path.abspath(symbols_file)
+    # (The hash of the path keeps symbols files with the same name apart.)
+    path_hash = hashlib.sha256(path.encode()).hexdigest()[:12]
+    return os.path.join(
+        config.ALERT_REPOSITORY_FOLDER,
+        f"{os.path.basename(path)}-{path_hash}.symbols-cache",
+    )
+
+
+def _tessa_version() -> Optional[str]:
+    try:
+        return importlib.metadata.version("tessa")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def load_symbol_universe(
+    symbols_file: str,
+    which_class: Type = ExtendedSymbol,
+    cache_path: Optional[str] = None,
+) -> SymbolUniverse:
+    """Load the symbols in `symbols_file` (a YAML file as understood by
+    `tessa.symbol.SymbolCollection.load_yaml`) and return them as a `SymbolUniverse`.
+
+    - `symbols_file`: Name/path of the file to load.
+    - `which_class`: The class to be instantiated for each symbol.
+    - `cache_path`: Where to cache the parsed symbols. Defaults to
+      `default_cache_path(symbols_file)`. Failing to write the cache is not an error.
+    """
+    symbols_file = str(symbols_file)
+    if cache_path is None:
+        cache_path = default_cache_path(symbols_file)
+    if cache_path is None:
+        return _parse(symbols_file, which_class)
+    stat = os.stat(symbols_file)
+    # (Stale pickles of the symbol class must not be used after a tessa upgrade.)
+    cache_key = {
+        "version": CACHE_FORMAT_VERSION,
+        "class_name": f"{which_class.__module__}.{which_class.__qualname__}",
+        "tessa_version": _tessa_version(),
+    }
+
+    # Try the cache:
+    cached = None
+    try:
+        with open(cache_path, "rb") as file:
+            cached = pickle.load(file)
+    except Exception:  # pylint: disable=broad-except
+        pass  # No (usable) cache, that's fine.
+    if cached is not None and all(
+        cached.get(key) == value for key, value in cache_key.items()
+    ):
+        if (cached["mtime_ns"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return cached["universe"]
+        file_hash = _hash_file(symbols_file)
+        if cached["sha256"] == file_hash:
+            # File was touched but not changed -- refresh the cache's stats:
+            cached.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            _write_cache(cache_path, cached)
+            return cached["universe"]
+    else:
+        file_hash = _hash_file(symbols_file)
+
+    # Parse the file and (re)write the cache:
+    universe = _parse(symbols_file, which_class)
+    _write_cache(
+        cache_path,
+        {
+            **cache_key,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": file_hash,
+            "universe": universe,
+        },
+    )
+    return universe
+
+
+def _parse(symbols_file: str, which_class: Type) -> SymbolUniverse:
+    scoll = SymbolCollection()
+    scoll.load_yaml(symbols_file, which_class=which_class)
+    return SymbolUniverse(scoll.symbols)
+
+
+def _write_cache(cache_path: str, content: dict) -> None:
+    """Write the cache atomically so that concurrent readers never see a partial file."""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            pickle.dump(content, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        logging.warning("Cannot write symbols cache %s.", cache_path)
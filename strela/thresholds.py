@@ -0,0 +1,156 @@
+"""Per-symbol alert thresholds.
+
+The triggers of the alert states are class-wide (see
+`strela.alertstates.FluctulertState.period_trigger_config` and
+`strela.alertstates.DoubleDownAlertState.levels`). Giving volatile symbols looser
+thresholds than others would take a subclass, a repository, and a pass over the data
+per set of thresholds. Instead, configure the thresholds per symbol -- e.g., in the
+symbols file, with `ThresholdSymbol`s:
+
+```yaml
+bitcoin:
+  source: coingecko
+  watch: true
+  alert_thresholds:
+    FluctulertState: 2  # All triggers twice as high as the class-wide ones
+    DoubleDownAlertState: [0.2, 0.3, 0.4, 0.5, 0.6]  # One trigger per level
+```
+
+and hand a `SymbolThresholds` table to `strela.alert_generator.generate_alerts`:
+
+```python
+thresholds = SymbolThresholds.from_symbols(FluctulertState, symbols)
+generate_alerts(FluctulertState, ..., symbols, ..., thresholds=thresholds)
+```
+
+The table holds the thresholds as an array with one row per symbol. The run looks up
+the rows of all its symbols once and evaluates the prefilter (see
+`strela.alertstates.AlertState.could_ring`) for a whole batch of symbols with their own
+thresholds at a time, so per-symbol thresholds take no extra runs. Symbols without
+thresholds of their own use the class-wide ones. Invalid thresholds (e.g., double-down
+triggers that aren't ascending) raise a `ValueError` that names the symbol as soon as
+the table is created.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Type, Union
+import numpy as np
+from tessa.symbol import ExtendedSymbol
+from strela.alertstates import AlertState
+from strela.symboltype import SymbolType
+
+ThresholdSpec = Union[float, Sequence[float]]
+"""The thresholds of a symbol for one alert state class: a factor for all the
+class-wide thresholds or one threshold per class-wide threshold."""
+
+
+@dataclass
+class ThresholdSymbol(ExtendedSymbol):
+    """An `ExtendedSymbol` with per-symbol alert thresholds. Load the symbols file with
+    `which_class=ThresholdSymbol` (see `strela.symboluniverse.load_symbol_universe`)
+    to read them from there.
+    """
+
+    alert_thresholds: Dict[str, ThresholdSpec] = field(default_factory=dict)
+    """The thresholds by the name of the alert state class (or of one of its base
+    classes)."""
+
+
+def resolve_thresholds(
+    alertstate_class: Type[AlertState], spec: Optional[ThresholdSpec]
+) -> np.ndarray:
+    """Return the thresholds of `alertstate_class` that `spec` stands for (the
+    class-wide ones if `spec` is `None`). Raise a `ValueError` if they aren't valid
+    (see `strela.alertstates.AlertState.check_thresholds`).
+    """
+    defaults = alertstate_class.default_thresholds()
+    if spec is None:
+        return defaults
+    if np.isscalar(spec):
+        thresholds = defaults * float(spec)  # type: ignore
+    else:
+        thresholds = np.array(spec, dtype=np.float64)
+    alertstate_class.check_thresholds(thresholds)
+    return thresholds
+
+
+class SymbolThresholds:
+    """The thresholds of an alert state class per symbol, as an array with one row per
+    symbol.
+    """
+
+    names: List[str]
+    """The symbols that have thresholds of their own."""
+
+    values: np.ndarray
+    """Their thresholds, one row per symbol in `names`."""
+
+    def __init__(
+        self,
+        alertstate_class: Type[AlertState],
+        specs: Dict[str, ThresholdSpec],
+    ) -> None:
+        """`SymbolThresholds` initializer.
+
+        - `alertstate_class`: The `strela.alertstates.AlertState` subclass the
+          thresholds are for.
+        - `specs`: The thresholds (see `ThresholdSpec`) by symbol name. Symbols that
+          aren't in here use the class-wide thresholds.
+
+        Raises a `ValueError` naming the symbol if its thresholds aren't valid, so a
+        bad symbols file fails when it is loaded rather than in the middle of a run.
+        """
+        self.alertstate_class = alertstate_class
+        self.defaults = alertstate_class.default_thresholds()
+        self.names = list(specs)
+        rows = []
+        for name, spec in specs.items():
+            try:
+                rows.append(resolve_thresholds(alertstate_class, spec))
+            except (TypeError, ValueError) as exc:
+                raise ValueError(
+                    f"Invalid {alertstate_class.__name__} thresholds of {name}: {exc}"
+                ) from exc
+        self.values = np.array(rows, dtype=np.float64).reshape(
+            len(self.names), len(self.defaults)
+        )
+        self._rows = {name: row for row, name in enumerate(self.names)}
+
+    @classmethod
+    def from_symbols(
+        cls,
+        alertstate_class: Type[AlertState],
+        symbols: Sequence[SymbolType],
+        attribute: str = "alert_thresholds",
+    ) -> SymbolThresholds:
+        """Create the table from the symbols' `attribute`, a mapping of alert state
+        class names to thresholds (see `ThresholdSymbol`). The entry of the most
+        specific class in `alertstate_class`'s hierarchy counts.
+        """
+        class_names = [klass.__name__ for klass in alertstate_class.__mro__]
+        specs = {}
+        for symbol in symbols:
+            symbol_specs = getattr(symbol, attribute, None) or {}
+            for class_name in class_names:
+                if class_name in symbol_specs:
+                    specs[symbol.name] = symbol_specs[class_name]
+                    break
+        return cls(alertstate_class, specs)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def aligned(self, names: Sequence[str]) -> np.ndarray:
+        """Return the thresholds of the symbols `names` -- one row per symbol, in the
+        same order.
+        """
+        aligned = np.tile(self.defaults, (len(names), 1))
+        positions = [i for i, name in enumerate(names) if name in self._rows]
+        rows = [self._rows[names[i]] for i in positions]
+        aligned[positions] = self.values[rows]
+        return aligned
+
+    def is_default(self, thresholds: np.ndarray) -> np.ndarray:
+        """Return whether the rows of `thresholds` are the class-wide thresholds."""
+        return (np.asarray(thresholds) == self.defaults).all(axis=-1)
@@ -0,0 +1,331 @@
+"""Append-only log of alert transitions with fast time range queries.
+
+The repositories only keep the latest state of every symbol: `update_state` overwrites
+the previous one. So answering "which alerts rang last quarter?" would mean replaying
+the histories. A `TransitionLog` keeps a record of every ringing state change instead
+-- i.e., of every alert -- with the time of the evaluation, the repository, the symbol,
+the fingerprint of the history (see `strela.history.History.fingerprint`), its latest
+value, and the timestamp of its latest entry.
+
+Hand the log to the repositories; `strela.alert_generator.generate_alerts` then appends
+a transition for every alert it generates:
+
+```python
+log = TransitionLog(default_log_path())
+repo = AlertStateRepository("Crypto-Price-DoubleDownAlert", transition_log=log)
+generate_alerts(..., repo=repo)
+log.query(start="2024-01-01", end="2024-04-01")
+log.timeline("bitcoin")
+```
+
+The log is a folder of segment files of fixed-width records (see `TRANSITION_RECORD`)
+in the order of their timestamps, plus a manifest that lists the segments. Records are
+appended to the latest segment, which is rotated once it holds `segment_records`
+records. A range query only reads the segments that overlap the range and finds the
+range in them by binary search on the timestamps; symbol and repository filters are
+vectorized. `TransitionLog.compact` drops old records and merges small segments.
+
+Every record is flushed when it is appended; a record that got truncated when the
+process died is dropped when the log is opened again. The manifest is replaced
+atomically, so an interrupted compaction leaves either the old or the new segments.
+A log must have only one writer at a time.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from strela import config
+from strela.history import to_ns
+
+TRANSITION_RECORD = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("as_of", "<i8"),
+        ("repo", "S64"),
+        ("symbol", "S64"),
+        ("fingerprint", "V16"),
+        ("latest_value", "<f8"),
+    ]
+)
+"""The record of a transition on disk: The time of the evaluation and the timestamp of
+the history's latest entry (both int64 nanoseconds, see `strela.history.History`),
+repository and symbol name (UTF-8, truncated to 64 bytes), fingerprint, and latest
+value."""
+
+_MANIFEST = "manifest.json"
+_SEGMENT_PATTERN = re.compile(r"segment-(\d+)\.log$")
+
+
+@dataclass
+class Transition:
+    """A ringing state change, i.e., an alert."""
+
+    timestamp: np.datetime64
+    """When the state was evaluated."""
+
+    repo: str
+    """Name of the repository (see `strela.alertstates.AlertStateRepository`)."""
+
+    symbol: str
+    """Name of the symbol."""
+
+    fingerprint: bytes
+    """Fingerprint of the history the state was evaluated from."""
+
+    latest_value: float
+    """Latest value of the history."""
+
+    as_of: np.datetime64
+    """Timestamp of the latest entry of the history."""
+
+    @classmethod
+    def from_record(cls, record: np.void) -> Transition:
+        """Create a `Transition` from a `TRANSITION_RECORD`."""
+        return cls(
+            np.datetime64(int(record["timestamp"]), "ns"),
+            record["repo"].decode(errors="ignore"),
+            record["symbol"].decode(errors="ignore"),
+            record["fingerprint"].tobytes(),
+            float(record["latest_value"]),
+            np.datetime64(int(record["as_of"]), "ns"),
+        )
+
+
+@dataclass
+class _Segment:
+    name: str
+    count: int
+    first: int
+    last: int
+    """Number of records and the first and last timestamp (if not empty)."""
+
+
+def default_log_path() -> str:
+    """Return the default location of the log, in the repository folder."""
+    return os.path.join(config.ALERT_REPOSITORY_FOLDER, "transitions")
+
+
+class TransitionLog:
+    """Segmented, append-only log of `Transition`s. Thread-safe."""
+
+    def __init__(self, folder: str, segment_records: int = 100_000) -> None:
+        """`TransitionLog` initializer. Creates the log if it doesn't exist yet.
+
+        - `folder`: The folder of the log.
+        - `segment_records`: Number of records after which a segment is rotated.
+        """
+        self.folder = folder
+        self.segment_records = segment_records
+        self._lock = threading.Lock()
+        self._file = None
+        os.makedirs(folder, exist_ok=True)
+        self._segments = [self._load_segment(name) for name in self._read_manifest()]
+        self._remove_leftovers()
+        self._last_timestamp = self._segments[-1].last if self._segments else 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def _read_manifest(self) -> List[str]:
+        try:
+            with open(self._path(_MANIFEST), encoding="utf-8") as file:
+                return json.load(file)["segments"]
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self) -> None:
+        tmp_path = self._path(_MANIFEST + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"segments": [s.name for s in self._segments]}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self._path(_MANIFEST))
+
+    def _remove_leftovers(self) -> None:
+        """Remove segments that aren't in the manifest (of an interrupted
+        compaction).
+        """
+        names = {s.name for s in self._segments}
+        for name in os.listdir(self.folder):
+            if _SEGMENT_PATTERN.match(name) and name not in names:
+                os.remove(self._path(name))
+
+    def _load_segment(self, name: str) -> _Segment:
+        path = self._path(name)
+        if not os.path.isfile(path):
+            open(path, "wb").close()  # pylint: disable=consider-using-with
+        size = os.path.getsize(path)
+        if size % TRANSITION_RECORD.itemsize:
+            # (A record that got truncated when the process died.)
+            with open(path, "r+b") as file:
+                file.truncate(size - size % TRANSITION_RECORD.itemsize)
+        records = self._records(name)
+        if len(records) == 0:
+            return _Segment(name, 0, 0, 0)
+        return _Segment(
+            name, len(records), records["timestamp"][0], records["timestamp"][-1]
+        )
+
+    def _records(self, name: str) -> np.ndarray:
+        path = self._path(name)
+        if os.path.getsize(path) < TRANSITION_RECORD.itemsize:
+            return np.zeros(0, dtype=TRANSITION_RECORD)
+        return np.memmap(path, dtype=TRANSITION_RECORD, mode="r")
+
+    def _new_segment(self, segments: List[_Segment]) -> _Segment:
+        """Create an empty segment that is numbered after `segments`."""
+        numbers = [int(_SEGMENT_PATTERN.match(s.name)[1]) for s in segments]
+        name = f"segment-{max(numbers, default=0) + 1:08}.log"
+        open(self._path(name), "wb").close()  # pylint: disable=consider-using-with
+        return _Segment(name, 0, 0, 0)
+
+    def append(
+        self,
+        repo: str,
+        symbol: str,
+        fingerprint: Optional[bytes],
+        latest_value: float,
+        as_of,
+        timestamp=None,
+    ) -> None:
+        """Append a transition. `as_of` and `timestamp` (default: now) are anything
+        `strela.history.to_ns` understands. Timestamps earlier than the latest one in
+        the log are moved up to it, so the log stays in order.
+        """
+        record = np.zeros(1, dtype=TRANSITION_RECORD)
+        record["repo"] = repo.encode()[:64]
+        record["symbol"] = symbol.encode()[:64]
+        record["fingerprint"] = np.void((fingerprint or b"").ljust(16, b"\0")[:16])
+        record["latest_value"] = latest_value
+        record["as_of"] = to_ns(as_of)
+        with self._lock:
+            now = time.time_ns() if timestamp is None else to_ns(timestamp)
+            now = max(now, self._last_timestamp)
+            record["timestamp"] = now
+            if not self._segments or self._segments[-1].count >= self.segment_records:
+                self._close_file()
+                self._segments.append(self._new_segment(self._segments))
+                self._write_manifest()
+            segment = self._segments[-1]
+            if self._file is None:
+                self._file = open(  # pylint: disable=consider-using-with
+                    self._path(segment.name), "ab"
+                )
+            self._file.write(record.tobytes())
+            self._file.flush()
+            if not segment.count:
+                segment.first = now
+            segment.count += 1
+            segment.last = self._last_timestamp = now
+
+    def query(
+        self,
+        start=None,
+        end=None,
+        repo: Optional[str] = None,
+        symbol: Optional[str] = None,
+    ) -> List[Transition]:
+        """Return the transitions from `start` (inclusive) to `end` (exclusive) -- both
+        anything `strela.history.to_ns` understands, `None` for no limit -- of the
+        given repository and symbol (`None` for all) in the order of their timestamps.
+        """
+        records = self.query_records(start, end, repo, symbol)
+        return [Transition.from_record(record) for record in records]
+
+    def query_records(
+        self,
+        start=None,
+        end=None,
+        repo: Optional[str] = None,
+        symbol: Optional[str] = None,
+    ) -> np.ndarray:
+        """Same as `query`, but return an array of `TRANSITION_RECORD`s."""
+        start_ns = None if start is None else to_ns(start)
+        end_ns = None if end is None else to_ns(end)
+        with self._lock:
+            segments = [
+                s
+                for s in self._segments
+                if s.count
+                and (start_ns is None or s.last >= start_ns)
+                and (end_ns is None or s.first < end_ns)
+            ]
+            if self._file is not None:
+                self._file.flush()
+        chunks = []
+        for segment in segments:
+            records = self._records(segment.name)[: segment.count]
+            timestamps = records["timestamp"]
+            begin = 0 if start_ns is None else np.searchsorted(timestamps, start_ns)
+            stop = (
+                len(records)
+                if end_ns is None
+                else np.searchsorted(timestamps, end_ns, side="left")
+            )
+            records = records[begin:stop]
+            if repo is not None:
+                records = records[records["repo"] == repo.encode()[:64]]
+            if symbol is not None:
+                records = records[records["symbol"] == symbol.encode()[:64]]
+            chunks.append(np.array(records))
+        if not chunks:
+            return np.zeros(0, dtype=TRANSITION_RECORD)
+        return np.concatenate(chunks)
+
+    def timeline(self, symbol: str, repo: Optional[str] = None) -> List[Transition]:
+        """Return all transitions of `symbol` (in `repo`, or in all repositories)."""
+        return self.query(repo=repo, symbol=symbol)
+
+    def compact(self, before=None) -> Tuple[int, int]:
+        """Drop the transitions before `before` (anything `strela.history.to_ns`
+        understands; `None` to keep all) and merge the remaining ones into as few
+        segments as possible. Return the number of records dropped and the number of
+        segments afterwards.
+        """
+        before_ns = None if before is None else to_ns(before)
+        with self._lock:
+            self._close_file()
+            old_segments = self._segments
+            records = [self._records(s.name)[: s.count] for s in old_segments]
+            everything = (
+                np.concatenate([np.array(r) for r in records])
+                if records
+                else np.zeros(0, dtype=TRANSITION_RECORD)
+            )
+            del records
+            kept = everything
+            if before_ns is not None:
+                kept = everything[everything["timestamp"] >= before_ns]
+            new_segments = []
+            for begin in range(0, len(kept), self.segment_records):
+                chunk = kept[begin : begin + self.segment_records]
+                segment = self._new_segment(old_segments + new_segments)
+                with open(self._path(segment.name), "wb") as file:
+                    file.write(chunk.tobytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+                segment.count = len(chunk)
+                segment.first = chunk["timestamp"][0]
+                segment.last = chunk["timestamp"][-1]
+                new_segments.append(segment)
+            # (The switch to the new segments is atomic.)
+            self._segments = new_segments
+            self._write_manifest()
+            self._remove_leftovers()
+            return len(everything) - len(kept), len(new_segments)
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        """Close the log."""
+        with self._lock:
+            self._close_file()
@@ -2,8 +2,13 @@
 
 # pylint: disable=missing-function-docstring
 
+import os
 import pytest
-from strela.alertstates import AlertStateRepository, FluctulertState
+from strela.alertstates import (
+    AlertStateRepository,
+    BaseAlertStateRepository,
+    FluctulertState,
+)
 from tests.helpers import create_metric_history_df
 
 
@@ -35,3 +40,92 @@ def test_update_and_lookup_existing_symbol():
     repo.update_state("X", state)
     assert state.eq(repo.lookup_state("X"))  
     # FIXME ^ What would be the right way to fix this type issue?
+
+
+def test_fingerprints_persist():
+    repo = AlertStateRepository("reponame")
+    assert repo.lookup_fingerprints() == {}
+    repo.update_fingerprints({"X": b"1", "Y": b"2"})
+    repo.update_fingerprints({"X": b"3"})
+    assert AlertStateRepository("reponame").lookup_fingerprints() == {
+        "X": b"3",
+        "Y": b"2",
+    }
+
+
+def test_backup_copies_only_its_own_files(tmpdir):
+    state = FluctulertState(create_metric_history_df())
+    tmpdir.mkdir("repos")
+    for name in ["repo-shard-1", "repo-shard-10"]:
+        repo = AlertStateRepository(name, folder=str(tmpdir / "repos"))
+        repo.update_state("X", state)
+        repo.update_fingerprints({"X": b"1"})
+        repo.mark_seen(["X"])
+    AlertStateRepository("repo-shard-1", folder=str(tmpdir / "repos")).backup()
+    backups = [file.basename for file in (tmpdir / "repos" / "backups").listdir()]
+    assert backups
+    assert all(name.startswith("repo-shard-1") for name in backups)
+    assert not any(name.startswith("repo-shard-10") for name in backups)
+    assert any("-fingerprints" in name for name in backups)
+    assert any("-last-seen" in name for name in backups)
+
+
+def test_compact_prunes_and_reclaims_space():
+    repo = AlertStateRepository("reponame")
+    state = FluctulertState(create_metric_history_df())
+    for name in ["A", "B", "C"]:
+        repo.update_state(name, state)
+        repo.update_fingerprints({name: b"1"})
+    assert repo.mark_seen(["A", "B", "C"]) == 1
+    # Overwriting states leaves unused space behind in the shelf files:
+    for _ in range(5):
+        repo.update_state("A", FluctulertState(create_metric_history_df(False)))
+    assert repo.mark_seen(["A", "B"]) == 2
+    assert repo.mark_seen(["A"]) == 3
+
+    report = repo.compact(max_unseen_runs=1)
+    assert report.pruned == 1
+    assert report.bytes_reclaimed > 0
+    assert report.bytes_after == repo.compact().bytes_before
+    assert sorted(repo.symbol_names()) == ["A", "B"]
+    assert sorted(repo.lookup_fingerprints()) == ["A", "B"]
+    assert repo.lookup_last_seen() == (3, {"A": 3, "B": 2})
+    assert state.eq(repo.lookup_state("B"))
+
+    report = repo.compact(keep_symbols=["B"])
+    assert report.pruned == 1
+    assert repo.symbol_names() == ["B"]
+    assert repo.mark_seen(["B"]) == 4
+
+
+def test_interrupted_compaction_is_completed(mocker, tmpdir):
+    repo = AlertStateRepository("reponame")
+    state = FluctulertState(create_metric_history_df())
+    for name in ["A", "B"]:
+        repo.update_state(name, state)
+    # Interrupted while copying: The old files stay as they are.
+    mocker.patch.object(os, "replace", side_effect=KeyboardInterrupt)
+    with pytest.raises(KeyboardInterrupt):
+        repo.compact(keep_symbols=["A"])
+    mocker.stopall()
+    assert sorted(AlertStateRepository("reponame").symbol_names()) == ["A", "B"]
+
+    # Interrupted while replacing the files: Completed by the next repository.
+    finish = mocker.patch("strela.alertstates.alertstaterepository._finish_rewrite")
+    repo.compact(keep_symbols=["A"])
+    assert finish.called
+    mocker.stopall()
+    assert AlertStateRepository("reponame").symbol_names() == ["A"]
+    assert state.eq(repo.lookup_state("A"))
+    assert all(path.isfile() for path in tmpdir.listdir())  # (No leftover folders.)
+
+
+def test_compact_in_memory_repo():
+    repo = BaseAlertStateRepository("x")
+    repo.update_state("A", "state")
+    repo.update_fingerprints({"A": b"1", "B": b"2"})
+    repo.mark_seen(["B"])
+    assert repo.compact(keep_symbols=["A"]).pruned == 1
+    assert repo.symbol_names() == ["A"] and repo.lookup_fingerprints() == {"A": b"1"}
+    assert repo.compact(max_unseen_runs=0).pruned == 1
+    assert not repo.symbol_names() and repo.lookup_last_seen() == (1, {})
@@ -1,6 +1,16 @@
 """Common helpers that are used in more than one test."""
 
+from dataclasses import dataclass
+import numpy as np
 import pandas as pd
+from strela.history import History
+
+
+@dataclass
+class DummySymbol:
+    """Stand-in for a `strela.symboltype.SymbolType` in tests that only need a name."""
+
+    name: str
 
 
 def create_metric_history_df(allsame: bool = True):
@@ -10,3 +20,24 @@ def create_metric_history_df(allsame: bool = True):
     if not allsame:
         df.loc["2020-01-01", "close"] = 100
     return df
+
+
+def create_random_histories(count: int, seed: int = 0) -> list:
+    """Return `count` random `History`s of various lengths and shapes: random walks,
+    some with a drop at the end, some around zero, some with a NaN.
+    """
+    rng = np.random.default_rng(seed)
+    histories = []
+    for i in range(count):
+        n = int(rng.integers(1, 500))
+        values = np.exp(np.cumsum(rng.normal(0, rng.choice([0.002, 0.01, 0.03]), n)))
+        values *= 100
+        if i % 4 == 1:
+            values[-1] *= rng.uniform(0.5, 1)
+        elif i % 4 == 2:
+            values -= 100
+        elif i % 4 == 3:
+            values[rng.integers(0, n)] = np.nan
+        timestamps = (np.arange(n) + 18_000) * 86_400 * 10**9
+        histories.append(History(timestamps, values))
+    return histories
@@ -1,24 +1,29 @@
 """Test the alert generator."""
 
-# pylint: disable=missing-function-docstring, missing-class-docstring
+# pylint: disable=missing-function-docstring
 
-from dataclasses import dataclass
+import asyncio
 import re
 import pytest
 import pandas as pd
-from strela.alert_generator import generate_alerts
+from strela.alert_generator import (
+    AlertJob,
+    generate_alerts,
+    generate_alerts_async,
+    generate_job_alerts,
+    RunStats,
+)
 from strela.templates import AlertToTextTemplate
 from strela.alertstates import (
     FluctulertState,
     DoubleDownAlertState,
     BaseAlertStateRepository,
 )
-from .helpers import create_metric_history_df
-
-
-@dataclass
-class DummySymbol:
-    name: str
+from .helpers import (
+    DummySymbol,
+    create_metric_history_df,
+    create_random_histories,
+)
 
 
 @pytest.mark.parametrize(
@@ -135,3 +140,208 @@ def test_repository_triggered_alert_not_to_trigger_again():
     args["metric_history_callback"] = lambda symbol: df
     alerts = generate_alerts(**args)
     assert "EA" in "".join(alerts)
+
+
+def test_unchanged_history_is_skipped(mocker):
+    df = create_metric_history_df()
+    df.loc["2020-08-01", "close"] = 0.7
+    stats = RunStats()
+    args = dict(
+        alertstate_class=DoubleDownAlertState,
+        metric_history_callback=lambda symbol: df,
+        symbols=[DummySymbol("EA"), DummySymbol("X")],
+        template=AlertToTextTemplate("", "", "Price"),
+        repo=BaseAlertStateRepository("x"),
+        stats=stats,
+    )
+    assert len(generate_alerts(**args)) == 2
+    assert (stats.evaluated, stats.skipped_unchanged) == (2, 0)
+
+    # Same histories again: Both symbols are skipped without creating any state or
+    # looking anything up in the repo:
+    init_spy = mocker.spy(DoubleDownAlertState, "__init__")
+    lookup_spy = mocker.spy(args["repo"], "lookup_state")
+    assert not generate_alerts(**args)
+    assert (stats.evaluated, stats.skipped_unchanged) == (2, 2)
+    assert init_spy.call_count == 0 and lookup_spy.call_count == 0
+
+    # A new entry makes the symbols get evaluated again:
+    df.loc[pd.Timestamp("2020-08-02", tz="UTC"), "close"] = 0.7
+    generate_alerts(**args)
+    assert (stats.evaluated, stats.skipped_unchanged) == (4, 2)
+
+
+def test_skip_unchanged_can_be_switched_off():
+    df = create_metric_history_df()
+    stats = RunStats()
+    repo = BaseAlertStateRepository("x")
+    for _ in range(2):
+        generate_alerts(
+            alertstate_class=FluctulertState,
+            metric_history_callback=lambda symbol: df,
+            symbols=[DummySymbol("EA")],
+            template=AlertToTextTemplate("", "", "Price"),
+            repo=repo,
+            skip_unchanged=False,
+            stats=stats,
+            prefilter=False,
+        )
+    assert (stats.evaluated, stats.skipped_unchanged) == (2, 0)
+
+
+@pytest.mark.parametrize("alertstate_class", [FluctulertState, DoubleDownAlertState])
+def test_prefilter_doesnt_change_alerts(alertstate_class):
+    histories = create_random_histories(600, seed=1)
+    symbols = [DummySymbol(f"S{i}") for i in range(len(histories))]
+    results = []
+    for prefilter in [False, True]:
+        stats = RunStats()
+        alerts = generate_alerts(
+            alertstate_class=alertstate_class,
+            metric_history_callback=lambda symbol: histories[int(symbol.name[1:])],
+            symbols=symbols,
+            template=AlertToTextTemplate("", "", "Price"),
+            repo=BaseAlertStateRepository("x"),
+            stats=stats,
+            prefilter=prefilter,
+        )
+        results.append((alerts, stats))
+    (alerts, stats), (prefiltered_alerts, prefiltered_stats) = results
+    assert alerts and prefiltered_alerts == alerts
+    assert stats.prefiltered == 0
+    assert prefiltered_stats.prefiltered > 0
+    assert prefiltered_stats.evaluated + prefiltered_stats.prefiltered == 600
+
+
+def test_jobs_evaluate_every_metric_in_one_pass():
+    df = create_metric_history_df()
+    df["volume"] = 1
+    df.iloc[-1] = [1, 0]  # (The volume drops, the price doesn't.)
+    fetched = []
+
+    def callback(symbol):
+        fetched.append(symbol.name)
+        return df
+
+    jobs = [
+        AlertJob(
+            alertstate_class,
+            AlertToTextTemplate("", "", metric.capitalize()),
+            BaseAlertStateRepository("x"),
+            metric,
+        )
+        for metric in ["close", "volume"]
+        for alertstate_class in [FluctulertState, DoubleDownAlertState]
+    ]
+    symbols = [DummySymbol("A"), DummySymbol("B")]
+    results = generate_job_alerts(jobs, callback, symbols)
+    assert fetched == ["A", "B"]
+    assert [len(alerts) for alerts in results] == [0, 0, 2, 2]
+    assert all("Latest Volume: 0" in alert for _, alert in results[2] + results[3])
+    assert all(job.stats.symbols == 2 for job in jobs)
+
+    # The same alerts as running each job separately:
+    for job, alerts in zip(jobs[2:], results[2:]):
+        assert [alert for _, alert in alerts] == generate_alerts(
+            job.alertstate_class,
+            lambda symbol: df[["volume"]],
+            symbols,
+            job.template,
+            BaseAlertStateRepository("y"),
+        )
+
+
+def test_jobs_skip_symbols_without_their_metric():
+    job = AlertJob(
+        DoubleDownAlertState,
+        AlertToTextTemplate("", "", "Volume"),
+        BaseAlertStateRepository("x"),
+        "volume",
+    )
+    histories = {"A": {"volume": create_metric_history_df()}, "B": {}}
+    symbols = [DummySymbol("A"), DummySymbol("B")]
+    generate_job_alerts([job], lambda symbol: histories[symbol.name], symbols)
+    assert job.stats.symbols == 2
+    assert job.stats.evaluated + job.stats.prefiltered == 1
+
+
+@pytest.mark.parametrize("alertstate_class", [FluctulertState, DoubleDownAlertState])
+def test_async_generator_matches_generate_alerts(alertstate_class):
+    histories = create_random_histories(300, seed=2)
+    symbols = [DummySymbol(f"S{i}") for i in range(len(histories))]
+    symbols.append(DummySymbol("FAIL"))
+    in_flight, max_in_flight = [0], [0]
+
+    def callback(symbol):
+        if symbol.name == "FAIL":
+            raise KeyError(symbol.name)
+        return histories[int(symbol.name[1:])]
+
+    async def async_callback(symbol):
+        in_flight[0] += 1
+        max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        await asyncio.sleep(0.001 * (len(symbol.name) % 3))
+        in_flight[0] -= 1
+        return callback(symbol)
+
+    template = AlertToTextTemplate("", "", "Price")
+    stats, async_stats = RunStats(), RunStats()
+    alerts = generate_alerts(
+        alertstate_class,
+        callback,
+        symbols,
+        template,
+        BaseAlertStateRepository("x"),
+        stats=stats,
+    )
+    repo = BaseAlertStateRepository("y")
+    async_alerts = asyncio.run(
+        generate_alerts_async(
+            alertstate_class,
+            async_callback,
+            symbols,
+            template,
+            repo,
+            stats=async_stats,
+            max_concurrency=8,
+        )
+    )
+    assert alerts and async_alerts == alerts
+    assert async_stats == stats and stats.fetch_errors == 1
+    assert max_in_flight[0] == 8
+
+    # Unchanged histories are skipped the same way:
+    async_stats = RunStats()
+    asyncio.run(
+        generate_alerts_async(
+            alertstate_class, async_callback, symbols, template, repo, stats=async_stats
+        )
+    )
+    assert async_stats.skipped_unchanged == 300
+
+
+def test_jobs_share_the_states_of_their_common_symbols(mocker):
+    df = create_metric_history_df()
+    df.iloc[-1]["close"] = 0
+    symbols = [DummySymbol(name) for name in "ABC"]
+    jobs = [
+        AlertJob(
+            DoubleDownAlertState,
+            AlertToTextTemplate("", "", "Price"),
+            BaseAlertStateRepository(str(names)),
+            symbols={name: DummySymbol(name) for name in names},
+        )
+        for names in ["AB", "BC", "C"]
+    ]
+    init = mocker.spy(DoubleDownAlertState, "__init__")
+    results = generate_job_alerts(jobs, lambda _: df, symbols)
+    assert init.call_count == 3
+    assert [[symbol.name for symbol, _ in alerts] for alerts in results] == [
+        ["A", "B"],
+        ["B", "C"],
+        ["C"],
+    ]
+    # The alerts are rendered with the jobs' own symbol objects:
+    assert results[0][0][0] is jobs[0].symbols["A"]  # type: ignore
+    assert [job.stats.evaluated for job in jobs] == [2, 2, 1]
+    assert sorted(jobs[1].repo.lookup_last_seen()[1]) == ["B", "C"]
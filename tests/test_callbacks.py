@@ -0,0 +1,103 @@
+"""Test the callback wrappers."""
+
+# pylint: disable=missing-function-docstring
+
+import threading
+import time
+import pytest
+from strela.alert_generator import RunStats, generate_alerts
+from strela.alertstates import BaseAlertStateRepository, DoubleDownAlertState
+from strela.callbacks import BatchCallback, CachingCallback, batched
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def test_caching_callback_fetches_once_per_symbol():
+    calls = []
+
+    def callback(symbol):
+        calls.append(symbol.name)
+        return create_metric_history_df()
+
+    cached = CachingCallback(callback)
+    assert cached(DummySymbol("A")) is cached(DummySymbol("A"))
+    cached(DummySymbol("B"))
+    assert calls == ["A", "B"]
+
+
+def test_caching_callback_concurrent_requests_fetch_once():
+    calls = []
+
+    def slow_callback(symbol):
+        calls.append(symbol.name)
+        time.sleep(0.05)
+        return create_metric_history_df()
+
+    cached = CachingCallback(slow_callback)
+    threads = [
+        threading.Thread(target=cached, args=(DummySymbol("A"),)) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ["A"]
+
+
+def test_caching_callback_does_not_cache_failures():
+    outcomes = [RuntimeError("boom"), create_metric_history_df()]
+
+    def flaky_callback(_):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    cached = CachingCallback(flaky_callback)
+    with pytest.raises(RuntimeError):
+        cached(DummySymbol("A"))
+    assert cached(DummySymbol("A")).shape[0] > 0
+
+
+def test_batch_callback_fetches_in_batches_and_reports_failures_per_symbol():
+    batches = []
+
+    def batch_callback(symbols):
+        batches.append([symbol.name for symbol in symbols])
+        if "E" in batches[-1]:
+            raise RuntimeError("Whole batch failed")
+        df = create_metric_history_df()
+        df.iloc[-1]["close"] = 0
+        return {
+            symbol.name: RuntimeError("boom") if symbol.name == "B" else df
+            for symbol in symbols
+            if symbol.name != "C"
+        }
+
+    stats = RunStats()
+    alerts = generate_alerts(
+        DoubleDownAlertState,
+        BatchCallback(batch_callback, batch_size=2),
+        [DummySymbol(name) for name in "ABCDE"],
+        AlertToTextTemplate("", "", "Price"),
+        BaseAlertStateRepository("x"),
+        stats=stats,
+    )
+    assert batches == [["A", "B"], ["C", "D"], ["E"]]
+    assert [alert.split()[0] for alert in alerts] == ["A", "D"]
+    assert stats.fetch_errors == 3
+
+
+def test_batch_and_single_callbacks_convert_into_each_other():
+    single = BatchCallback(batched(lambda symbol: create_metric_history_df()))
+    assert len(single(DummySymbol("A"))) > 0
+
+    def failing(_):
+        raise RuntimeError("boom")
+
+    result = batched(failing)([DummySymbol("A")])
+    assert isinstance(result["A"], RuntimeError)
+    with pytest.raises(RuntimeError):
+        BatchCallback(batched(failing))(DummySymbol("A"))
+    with pytest.raises(KeyError):
+        BatchCallback(lambda symbols: {})(DummySymbol("A"))
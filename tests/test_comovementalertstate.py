@@ -0,0 +1,154 @@
+"""Tests for the `CoMovementAlertState` class and `generate_portfolio_alerts`."""
+
+# pylint: disable=missing-function-docstring, protected-access
+
+import numpy as np
+import pytest
+from strela.alert_generator import Portfolio, RunStats, generate_portfolio_alerts
+from strela.alertstates import BaseAlertStateRepository, CoMovementAlertState
+from strela.alertstates.comovementalertstate import CoMoments, daily_returns
+from strela.history import NS_PER_DAY, History
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol
+
+
+def create_basket(count: int, days: int, lockstep_days: int, seed: int = 0) -> dict:
+    """Return `count` random walks of `days` days whose last `lockstep_days` days are
+    driven by a common factor.
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.02, (days, count))
+    if lockstep_days:
+        factor = rng.normal(0, 0.05, (lockstep_days, 1))
+        noise = rng.normal(0, 0.005, (lockstep_days, count))
+        returns[-lockstep_days:] = factor + noise
+    prices = 100 * np.exp(np.cumsum(returns, axis=0))
+    timestamps = (np.arange(days) + 18_000) * NS_PER_DAY
+    return {f"S{i}": History(timestamps, prices[:, i]) for i in range(count)}
+
+
+def test_comoments_match_numpy():
+    rng = np.random.default_rng(1)
+    returns = rng.normal(0, 1, (50, 6))
+    returns[:, 5] = 0  # (Doesn't move.)
+    moments = CoMoments(6)
+    moments.add(returns[:30])
+    moments.add(returns[30:])
+    moments.remove(returns[:10])
+    expected = np.corrcoef(returns[10:, :5], rowvar=False)
+    assert np.allclose(moments.correlations()[:5, :5], expected)
+    assert not moments.correlations()[5, :5].any()
+    rows, cols = np.array([0, 1, 3]), np.array([2, 4, 4])
+    assert np.allclose(moments.correlations(rows, cols), expected[rows, cols])
+
+
+def test_comoments_of_a_member_that_stopped_moving():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0, 0.05, (300, 4))
+    # (E.g., a stablecoin that got pegged: Its variance is down to rounding residue.)
+    returns[150:, 3] = rng.normal(0, 1e-9, 150)
+    moments = CoMoments(4)
+    moments.add(returns[:20])
+    for day in range(20, 300):
+        moments.remove(returns[day - 20 : day - 19])
+        moments.add(returns[day : day + 1])
+    correlations = moments.correlations()
+    assert not correlations[3, :3].any() and not correlations[:3, 3].any()
+    expected = np.corrcoef(returns[-20:, :3], rowvar=False)
+    assert np.allclose(correlations[:3, :3], expected)
+
+
+def test_daily_returns():
+    day = NS_PER_DAY
+    a = History(np.array([0, day, day + 1, 3 * day]), np.array([1.0, 2.0, 4.0, 8.0]))
+    b = History(np.array([2 * day, 3 * day]), np.array([1.0, 1.0]))
+    days, returns = daily_returns([a, b], 10)
+    assert list(days) == [1, 2, 3]
+    assert np.allclose(returns[:, 0], np.log([4, 1, 2]))
+    assert list(returns[:, 1]) == [0, 0, 0]
+
+
+def test_rings_when_the_basket_moves_together():
+    state = CoMovementAlertState(create_basket(8, 300, 0))
+    assert not state.is_ringing() and state.textify() == ""
+    state = CoMovementAlertState(create_basket(8, 300, 20))
+    assert state.is_ringing()
+    assert state.share == 1 and len(state.pairs) == 28
+    assert "100% of all pairs move together" in state.textify()
+    assert state.status() == "100% co-moving"
+
+
+def test_too_short_histories_dont_ring():
+    state = CoMovementAlertState(create_basket(8, 100, 20))
+    assert not state.is_ringing()
+
+
+@pytest.mark.parametrize("revise_last_day", [False, True])
+def test_continued_state_matches_fresh_one(revise_last_day):
+    basket = create_basket(8, 320, 15)
+    earlier = {
+        name: History(h.timestamps[:-5], h.values[:-5].copy())
+        for name, h in basket.items()
+    }
+    if revise_last_day:
+        for hist in earlier.values():
+            hist.values[-1] *= 1.01
+    previous = CoMovementAlertState(earlier)
+    for days in range(4, -1, -1):
+        current = {
+            name: History(h.timestamps[: len(h) - days], h.values[: len(h) - days])
+            for name, h in basket.items()
+        }
+        state = CoMovementAlertState(current, previous=previous)
+        fresh = CoMovementAlertState(current)
+        assert state._updates > 0
+        assert state.share == fresh.share
+        assert [pair[:2] for pair in state.pairs] == [pair[:2] for pair in fresh.pairs]
+        assert np.allclose(
+            [pair[2:] for pair in state.pairs], [pair[2:] for pair in fresh.pairs]
+        )
+        previous = state
+
+
+def test_generate_portfolio_alerts():
+    basket = create_basket(8, 300, 20)
+    calm = create_basket(12, 300, 0, seed=1)
+    calm = {f"C{name}": hist for name, hist in calm.items()}
+    histories = {**basket, **calm}
+    fetched = []
+
+    def callback(symbol):
+        fetched.append(symbol.name)
+        return histories[symbol.name]
+
+    symbols = {name: DummySymbol(name) for name in histories}
+    # (28 of the 190 pairs of "All" move together, too few to ring.)
+    portfolios = [
+        Portfolio("Basket", [symbols[name] for name in basket]),
+        Portfolio("Calm", [symbols[name] for name in calm]),
+        Portfolio("All", list(symbols.values())),
+    ]
+    repo = BaseAlertStateRepository("x")
+    stats = RunStats()
+    alerts = generate_portfolio_alerts(
+        CoMovementAlertState,
+        callback,
+        portfolios,
+        AlertToTextTemplate("", "", "co-moving share"),
+        repo,
+        stats=stats,
+    )
+    assert len(alerts) == 1 and alerts[0].startswith("Basket ⚠lert")
+    assert "Latest co-moving share: 1.0" in alerts[0]
+    assert sorted(fetched) == sorted(histories)
+    assert (stats.symbols, stats.evaluated, stats.alerts) == (3, 3, 1)
+    assert set(repo.symbol_names()) == {"Basket", "Calm", "All"}
+
+    # (Still moving together: no new alert.)
+    assert not generate_portfolio_alerts(
+        CoMovementAlertState,
+        callback,
+        portfolios,
+        AlertToTextTemplate("", "", "co-moving share"),
+        repo,
+    )
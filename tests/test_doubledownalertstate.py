@@ -7,6 +7,7 @@ import numpy as np
 import pandas as pd
 from strela.alertstates import AlertState, DoubleDownAlertState
 from strela.alertstates.doubledownalertstate import Level
+from .helpers import create_random_histories
 
 # FIXME Most (all?) of these tests will break if the DoubleDownAlertState.Levels are set
 # up differently. Maybe set the Levels explicitly here?
@@ -67,3 +68,27 @@ def test_eq_and_not_eq():
     b = DoubleDownAlertState(HIST_WITHALERT)
     assert a.eq(a)
     assert not a.eq(b)
+
+
+def test_could_ring_is_conservative():
+    histories = create_random_histories(500)
+    could_ring = DoubleDownAlertState.could_ring(
+        np.array([DoubleDownAlertState.summarize(hist) for hist in histories])
+    )
+    states = [DoubleDownAlertState(hist) for hist in histories]
+    ringing = np.array([state.is_ringing() for state in states])
+    active = np.array([state.status() != "" for state in states])
+    assert not ((ringing | active) & ~could_ring).any()
+    assert (~could_ring).sum() > 100  # (The bound actually filters something.)
+
+
+def test_nan_only_affects_the_averages_it_is_in():
+    df = pd.DataFrame(pd.date_range(start="01/01/2015", end="08/01/2015", tz="UTC"))
+    df["close"] = 100.0
+    df.set_index(0, inplace=True)
+    df.iloc[100, 0] = np.nan
+    df.iloc[134:, 0] = 85.0
+    a = DoubleDownAlertState(df)
+    assert a.alerthistory == [
+        (np.datetime64("2015-05-15T00:00:00.000000000"), Level(trigger=0.1, factor=2))
+    ]
@@ -0,0 +1,219 @@
+"""Test the fetch scheduler."""
+
+# pylint: disable=missing-function-docstring, missing-class-docstring
+
+from dataclasses import dataclass
+import concurrent.futures
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import pytest
+from strela.alert_generator import generate_alerts
+from strela.alertstates import BaseAlertStateRepository, DoubleDownAlertState
+from strela.fetchscheduler import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FetchScheduler,
+    FetchTimeoutError,
+    SourceLimits,
+    TokenBucket,
+)
+from strela.templates import AlertToTextTemplate
+from . import helpers
+from .helpers import create_metric_history_df
+
+
+@dataclass
+class DummySymbol(helpers.DummySymbol):
+    source: str = "fast"
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        assert bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_token_bucket_gives_up_at_deadline():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire()
+    assert not bucket.acquire(deadline=time.monotonic() + 0.1)
+
+
+def test_circuit_breaker_opens_and_resets():
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()  # Half-open trial
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open and breaker.allow()
+
+
+def test_circuit_breaker_allows_a_single_trial_at_a_time():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        allowed = list(executor.map(lambda _: breaker.allow(), range(50)))
+    assert allowed.count(True) == 1
+    assert not breaker.allow()  # (Still waiting for the trial's outcome.)
+    breaker.record_success()
+    assert all(breaker.allow() for _ in range(5))
+
+
+def test_iter_histories_yields_all_symbols():
+    symbols = [DummySymbol(name) for name in "ABCDE"]
+    with FetchScheduler(lambda s: create_metric_history_df()) as scheduler:
+        results = dict(scheduler.iter_histories(symbols))
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert all(len(hist) > 0 for hist in results.values())
+
+
+def test_fetches_are_deduplicated():
+    calls = []
+
+    def callback(symbol):
+        calls.append(symbol.name)
+        return create_metric_history_df()
+
+    with FetchScheduler(callback) as scheduler:
+        list(scheduler.iter_histories([DummySymbol("A"), DummySymbol("A")]))
+        scheduler(DummySymbol("A"))
+    assert calls == ["A"]
+
+
+def test_max_concurrency_per_source():
+    lock = threading.Lock()
+    in_flight, max_in_flight = [0], [0]
+
+    def callback(_):
+        with lock:
+            in_flight[0] += 1
+            max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        return create_metric_history_df()
+
+    symbols = [DummySymbol(str(i)) for i in range(8)]
+    with FetchScheduler(
+        callback, limits={"fast": {"max_concurrency": 2}}
+    ) as scheduler:
+        list(scheduler.iter_histories(symbols))
+    assert max_in_flight[0] == 2
+
+
+def test_request_timeout():
+    def callback(symbol):
+        if symbol.source == "slow":
+            time.sleep(1)
+        return create_metric_history_df()
+
+    symbols = [DummySymbol("S", "slow"), DummySymbol("F")]
+    start = time.monotonic()
+    with FetchScheduler(callback, request_timeout=0.1) as scheduler:
+        results = dict(scheduler.iter_histories(symbols))
+    assert time.monotonic() - start < 0.5
+    assert isinstance(results[0], FetchTimeoutError)
+    assert len(results[1]) > 0
+
+
+def test_run_deadline_bounds_total_time():
+    def callback(_):
+        time.sleep(0.1)
+        return create_metric_history_df()
+
+    symbols = [DummySymbol(str(i)) for i in range(20)]
+    start = time.monotonic()
+    with FetchScheduler(
+        callback, default_limits=SourceLimits(max_concurrency=1), deadline=0.25
+    ) as scheduler:
+        results = dict(scheduler.iter_histories(symbols))
+    assert time.monotonic() - start < 0.5
+    assert len(results) == 20
+    assert any(isinstance(x, FetchTimeoutError) for x in results.values())
+
+
+def test_hung_fetches_dont_keep_the_process_alive():
+    script = textwrap.dedent(
+        """
+        import time
+        from strela.fetchscheduler import FetchScheduler, FetchTimeoutError
+        from tests.helpers import DummySymbol
+
+        def callback(_):
+            time.sleep(6)
+
+        with FetchScheduler(callback, request_timeout=0.5, deadline=1) as scheduler:
+            [(_, outcome)] = scheduler.iter_histories([DummySymbol("HUNG")])
+        assert isinstance(outcome, FetchTimeoutError)
+        """
+    )
+    start = time.monotonic()
+    subprocess.run([sys.executable, "-c", script], check=True, timeout=30)
+    assert time.monotonic() - start < 3
+
+
+def test_circuit_breaker_skips_failing_source_only():
+    calls = []
+
+    def callback(symbol):
+        calls.append(symbol.name)
+        if symbol.source == "broken":
+            raise RuntimeError("upstream down")
+        return create_metric_history_df()
+
+    symbols = [DummySymbol(f"B{i}", "broken") for i in range(10)] + [
+        DummySymbol(f"F{i}") for i in range(5)
+    ]
+    with FetchScheduler(
+        callback,
+        limits={"broken": SourceLimits(max_concurrency=1, failure_threshold=3)},
+    ) as scheduler:
+        results = dict(scheduler.iter_histories(symbols))
+        assert scheduler.breaker("broken").is_open
+    assert len([x for x in calls if x.startswith("B")]) == 3
+    assert sum(isinstance(results[i], CircuitOpenError) for i in range(10)) == 7
+    assert all(len(results[i]) > 0 for i in range(10, 15))
+
+
+def test_call_raises_fetch_errors():
+    def callback(_):
+        raise RuntimeError("boom")
+
+    with FetchScheduler(callback) as scheduler:
+        with pytest.raises(RuntimeError):
+            scheduler(DummySymbol("A"))
+
+
+def test_generate_alerts_with_scheduler():
+    df = create_metric_history_df()
+    df.iloc[-1]["close"] = 0
+
+    def callback(symbol):
+        if symbol.name == "C":
+            raise RuntimeError("boom")
+        time.sleep(0.05 if symbol.name == "A" else 0)
+        return df
+
+    with FetchScheduler(callback) as scheduler:
+        alerts = generate_alerts(
+            alertstate_class=DoubleDownAlertState,
+            metric_history_callback=scheduler,
+            symbols=[DummySymbol("A"), DummySymbol("B"), DummySymbol("C")],
+            template=AlertToTextTemplate("", "", "Price"),
+            repo=BaseAlertStateRepository("x"),
+        )
+    # Alerts are in symbol order even though B's history arrived first:
+    assert [x.split()[0] for x in alerts] == ["A", "B"]
@@ -3,10 +3,11 @@
 # pylint: disable=missing-function-docstring
 
 import copy
+import numpy as np
 import pandas as pd
 import pytest
 from strela.alertstates.fluctulertstate import FluctulertState, PeriodStat
-from .helpers import create_metric_history_df
+from .helpers import create_metric_history_df, create_random_histories
 
 # ----- PeriodStat tests: -----
 
@@ -134,3 +135,13 @@ def test_textify(fs2):
     assert fs2.textify() == targetstring
     # FIXME What if the format is configurable at some point in the future? E.g., with a
     # template.
+
+
+def test_could_ring_is_conservative():
+    histories = create_random_histories(500)
+    could_ring = FluctulertState.could_ring(
+        np.array([FluctulertState.summarize(hist) for hist in histories])
+    )
+    ringing = np.array([FluctulertState(hist).is_ringing() for hist in histories])
+    assert not (ringing & ~could_ring).any()
+    assert (~could_ring).sum() > 50  # (The bound actually filters something.)
@@ -0,0 +1,123 @@
+"""Test the `History` type and its use by the alert states and the generator."""
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pandas as pd
+import pytest
+from strela.alert_generator import generate_alerts
+from strela.alertstates import (
+    BaseAlertStateRepository,
+    DoubleDownAlertState,
+    FluctulertState,
+)
+from strela.history import History, as_history, select_metric
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def test_from_dataframe_is_zero_copy():
+    df = create_metric_history_df().astype(float)
+    hist = History.from_dataframe(df)
+    assert len(hist) == len(df)
+    assert np.shares_memory(hist.values, df.values)
+    assert np.shares_memory(hist.timestamps, df.index.asi8)
+    assert hist.timestamps.dtype == np.int64
+    assert hist.dates()[0] == np.datetime64("2015-01-01")
+
+
+def test_from_dataframe_sorts_unsorted_index():
+    df = pd.DataFrame(
+        {"close": [2.0, 1.0]}, index=pd.to_datetime(["2020-01-02", "2020-01-01"])
+    )
+    hist = History.from_dataframe(df)
+    assert list(hist.values) == [1.0, 2.0]
+
+
+def test_from_dataframe_uses_wall_time_for_non_utc_timezones():
+    df = pd.DataFrame(
+        {"close": [1.0]},
+        index=pd.DatetimeIndex(["2020-01-01 23:00"]).tz_localize("America/New_York"),
+    )
+    assert History.from_dataframe(df).dates()[0] == np.datetime64("2020-01-01T23:00")
+
+
+def test_from_dataframe_too_many_columns():
+    with pytest.raises(ValueError):
+        History.from_dataframe(pd.DataFrame(columns=["a", "b"]))
+
+
+def test_construct_from_arrays():
+    hist = History(
+        np.array(["2020-01-01", "2020-01-02"], dtype="datetime64[D]"), [1, 2]
+    )
+    assert hist.timestamps[1] - hist.timestamps[0] == 86_400 * 10**9
+    assert hist.latest_value == 2
+    with pytest.raises(ValueError):
+        History(np.array([1, 2]), np.array([1.0]))
+
+
+def test_to_dataframe_roundtrip():
+    hist = as_history(create_metric_history_df(allsame=False))
+    again = History.from_dataframe(hist.to_dataframe())
+    assert np.array_equal(hist.timestamps, again.timestamps)
+    assert np.array_equal(hist.values, again.values)
+
+
+def test_as_history_rejects_other_types():
+    with pytest.raises(TypeError):
+        as_history([1, 2, 3])
+
+
+def test_select_metric():
+    df = create_metric_history_df()
+    df["volume"] = 5
+    assert select_metric(df, "volume").latest_value == 5
+    assert select_metric({"Price": df[["close"]]}, "Price").latest_value == 1
+    assert select_metric(df[["close"]]).latest_value == 1
+    for metric in ["nope", None]:
+        with pytest.raises((KeyError, ValueError)):
+            select_metric(df, metric)
+    with pytest.raises(KeyError):
+        select_metric(as_history(df[["close"]]), "close")
+
+
+def test_window_start():
+    hist = as_history(create_metric_history_df())  # Daily until 2020-08-01
+    assert hist.dates()[hist.window_start(3)] == np.datetime64("2020-07-30")
+
+
+@pytest.mark.parametrize("alertstate_class", [FluctulertState, DoubleDownAlertState])
+def test_states_from_history_equal_states_from_dataframe(alertstate_class):
+    df = create_metric_history_df()
+    df.loc["2020-07-01", "close"] = 3
+    df.loc["2020-07-31", "close"] = 0.5
+    from_df = alertstate_class(df)
+    from_hist = alertstate_class(as_history(df))
+    assert from_df.eq(from_hist)
+    assert from_df.textify() == from_hist.textify()
+
+
+def test_generate_alerts_with_history_callback():
+    df = create_metric_history_df()
+    df.iloc[-1]["close"] = 0
+    hist = as_history(df)
+    alerts = generate_alerts(
+        alertstate_class=DoubleDownAlertState,
+        metric_history_callback=lambda symbol: hist,
+        symbols=[DummySymbol("X")],
+        template=AlertToTextTemplate("", "", "Price"),
+        repo=BaseAlertStateRepository("x"),
+    )
+    assert "10×" in "".join(alerts)
+    assert "Latest Price: 0\n" in "".join(alerts)
+
+
+def test_fingerprint():
+    df = create_metric_history_df()
+    fingerprint = as_history(df).fingerprint()
+    assert len(fingerprint) == 16
+    assert as_history(df.copy()).fingerprint() == fingerprint
+    df.iloc[-1]["close"] = 2
+    assert as_history(df).fingerprint() != fingerprint
+    assert as_history(df.iloc[:-1]).fingerprint() != fingerprint
@@ -0,0 +1,109 @@
+"""Tests for the `strela.indicators` module."""
+
+# pylint: disable=missing-function-docstring, protected-access
+
+import concurrent.futures
+import gc
+import math
+import statistics
+import numpy as np
+import pytest
+from strela import indicators as indicators_module
+from strela.alertstates import DoubleDownAlertState, FluctulertState
+from strela.history import History
+from strela.indicators import Indicators, indicators_for, running_means
+from .helpers import create_metric_history_df
+
+
+def create_history(values) -> History:
+    timestamps = (np.arange(len(values)) + 18_000) * 86_400 * 10**9
+    return History(timestamps, np.asarray(values, dtype=np.float64))
+
+
+def test_running_means():
+    values = np.random.default_rng(0).uniform(1, 100, 200)
+    means = running_means(values, 30)
+    assert len(means) == 170
+    for k in [0, 1, 29, 30, 31, 169]:
+        assert means[k] == statistics.fmean(values[k : k + 30])
+    assert len(running_means(values[:30], 30)) == 0
+    values[50] = math.nan
+    means = running_means(values, 30)
+    assert np.isnan(means[21:51]).all() and not np.isnan(means[51:]).any()
+    values[50] = math.inf
+    values[60] = -math.inf
+    assert np.isnan(running_means(values, 30)[31:51]).all()
+
+
+def test_kernels():
+    hist = create_history([4, 8, math.nan, 2, 6])
+    indicators = indicators_for(hist)
+    np.testing.assert_array_equal(indicators.rolling_mean(2), [6, math.nan, math.nan])
+    assert indicators.window_extremes(2) == (2, 6)  # (entries of the last 2 days)
+    assert indicators.window_extremes(100) == (2, 8)
+    assert indicators.tail_extremes(2, skip_last=1) == pytest.approx(
+        (math.nan, math.nan), nan_ok=True
+    )
+    assert indicators.tail_extremes(2) == (2, 6)
+    assert indicators.tail_extremes(5, skip_last=10) == pytest.approx(
+        (math.nan, math.nan), nan_ok=True
+    )
+    np.testing.assert_allclose(indicators.drawdown(), [0, 0, np.nan, 0.75, 0.25])
+
+
+def test_indicators_are_cached_and_read_only():
+    hist = create_history(range(1, 100))
+    indicators = indicators_for(hist)
+    assert indicators_for(hist) is indicators
+    # Passing the history on keeps hitting the same cache entry:
+    assert indicators.history is hist
+    assert indicators_for(indicators.history) is indicators
+    means = indicators.rolling_mean(30)
+    assert indicators.rolling_mean(30) is means
+    assert indicators.drawdown() is indicators.drawdown()
+    with pytest.raises(ValueError):
+        means[0] = 0
+
+
+def test_dataframes_are_not_cached():
+    df = create_metric_history_df()
+    assert indicators_for(df) is not indicators_for(df)
+    hist = indicators_for(df).history
+    assert isinstance(hist, History) and len(hist) == len(df)
+
+
+def test_cache_entries_go_away_with_the_history():
+    hist = create_history(range(1, 100))
+    indicators_for(hist).rolling_mean(30)
+    key = id(hist)
+    assert key in indicators_module._registry
+    del hist
+    gc.collect()
+    assert key not in indicators_module._registry
+
+
+def test_indicators_for_is_thread_safe():
+    hist = create_history(range(1, 100))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: indicators_for(hist), range(100)))
+    assert all(indicators is results[0] for indicators in results)
+
+
+def test_alert_states_share_indicators(mocker):
+    hist = create_history(np.linspace(100, 50, 400))
+    spy = mocker.spy(indicators_module, "nanminmax")
+    FluctulertState.summarize(hist)
+    FluctulertState(hist)
+    FluctulertState(hist)
+    # (Once per period, incl. the prefilter's longest one -- no matter how often.)
+    assert spy.call_count == len(FluctulertState.period_trigger_config)
+    means = mocker.spy(indicators_module, "running_means")
+    DoubleDownAlertState(hist)
+    DoubleDownAlertState(hist)
+    assert means.call_count == 1
+
+
+def test_unshared_indicators_keep_the_history_alive():
+    indicators = Indicators(create_history([1, 2]))
+    gc.collect()
+    assert len(indicators.history) == 2
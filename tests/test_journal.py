@@ -0,0 +1,110 @@
+"""Tests for the `strela.journal` module."""
+
+# pylint: disable=missing-function-docstring
+
+import pytest
+from strela.alert_generator import RunStats, generate_alerts
+from strela.alertstates import BaseAlertStateRepository, DoubleDownAlertState
+from strela.journal import RunJournal
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+SYMBOLS = [DummySymbol(f"S{i}") for i in range(6)]
+TEMPLATE = AlertToTextTemplate("", "", "Price")
+
+
+def dropping_history(_):
+    df = create_metric_history_df()
+    df.iloc[-1]["close"] = 0
+    return df
+
+
+def test_journal_persists(tmp_path):
+    path = str(tmp_path / "journal")
+    journal = RunJournal(path, run_id="1")
+    journal.record_done("A", b"\x01")
+    journal.record_done("B")
+    journal.record_alert("A", "Alert A")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"symbol": "C", "al')  # (Killed while writing.)
+
+    journal = RunJournal(path, run_id="1")
+    assert journal.done() == {"A": b"\x01", "B": None}
+    assert journal.pending_alerts() == {"A": "Alert A"}
+    journal.record_done("C")
+    journal.close()
+    assert "C" in RunJournal(path, run_id="1").done()
+
+    # Another run only keeps the pending alerts:
+    journal = RunJournal(path, run_id="2")
+    assert journal.done() == {}
+    assert journal.pending_alerts() == {"A": "Alert A"}
+    journal.complete()
+    assert RunJournal(path, run_id="2").pending_alerts() == {}
+
+
+class Crash(BaseException):
+    """Not an `Exception`, so the run dies."""
+
+
+def test_interrupted_run_is_resumed(tmp_path):
+    repo = BaseAlertStateRepository("x")
+    path = str(tmp_path / "journal")
+    fetched = []
+    crash = [True]
+
+    def crashing_history(symbol):
+        fetched.append(symbol.name)
+        if symbol.name == "S3" and crash and crash.pop():
+            raise Crash()
+        return dropping_history(symbol)
+
+    with pytest.raises(Crash):
+        generate_alerts(
+            DoubleDownAlertState,
+            crashing_history,
+            SYMBOLS,
+            TEMPLATE,
+            repo,
+            prefilter=False,
+            journal=RunJournal(path, run_id="1"),
+        )
+    # The first three states are updated, but their alerts haven't been delivered:
+    assert sorted(repo.symbol_names()) == ["S0", "S1", "S2"]
+
+    fetched.clear()
+    stats = RunStats()
+    journal = RunJournal(path, run_id="1")
+    alerts = generate_alerts(
+        DoubleDownAlertState,
+        crashing_history,
+        SYMBOLS,
+        TEMPLATE,
+        repo,
+        stats=stats,
+        prefilter=False,
+        journal=journal,
+    )
+    assert fetched == ["S3", "S4", "S5"]
+    assert (stats.resumed, stats.evaluated, stats.alerts) == (3, 3, 3)
+    assert alerts == generate_alerts(
+        DoubleDownAlertState,
+        dropping_history,
+        SYMBOLS,
+        TEMPLATE,
+        BaseAlertStateRepository("y"),
+    )
+
+    # Once delivered, the next run starts over and doesn't alert again:
+    journal.complete()
+    fetched.clear()
+    assert not generate_alerts(
+        DoubleDownAlertState,
+        crashing_history,
+        SYMBOLS,
+        TEMPLATE,
+        repo,
+        journal=RunJournal(path, run_id="1"),
+    )
+    assert len(fetched) == 6
@@ -0,0 +1,122 @@
+"""Test the live alert states and the live alert generator."""
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pandas as pd
+import pytest
+from strela.alert_generator import LiveAlertGenerator, generate_alerts
+from strela.alertstates import (
+    BaseAlertStateRepository,
+    DoubleDownAlertState,
+    FluctulertState,
+    LiveDoubleDownAlertState,
+    LiveFluctulertState,
+)
+from strela.history import as_history
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+from .test_doubledownalertstate import HIST_NOALERT
+
+
+def random_walk(seed: int, length: int = 700, freq: str = "D") -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.04, length)))
+    index = pd.date_range("2018-01-01 16:00", periods=length, freq=freq)
+    return pd.DataFrame({"close": values}, index=index)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("freq", ["D", "B", "7H"])
+def test_live_fluctulert_equals_batch(seed, freq):
+    hist = as_history(random_walk(seed, freq=freq))
+    live = LiveFluctulertState()
+    for i, (timestamp, value) in enumerate(zip(hist.timestamps, hist.values)):
+        live.update(timestamp, value)
+        if i % 50 == 0 or i == len(hist) - 1:
+            batch = FluctulertState(hist.to_dataframe().iloc[: i + 1])
+            snapshot = live.snapshot()
+            assert [(p.dmin, p.dmax) for p in snapshot.stats] == [
+                (p.dmin, p.dmax) for p in batch.stats
+            ]
+            assert live.is_ringing() == batch.is_ringing()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_live_doubledown_equals_batch(seed):
+    hist = as_history(random_walk(seed))
+    live = LiveDoubleDownAlertState()
+    for i, (timestamp, value) in enumerate(zip(hist.timestamps, hist.values)):
+        live.update(timestamp, value)
+        batch = DoubleDownAlertState(hist.to_dataframe().iloc[: i + 1])
+        snapshot = live.snapshot()
+        assert snapshot.currentlevel == batch.currentlevel
+        assert snapshot.is_ringing() == batch.is_ringing() == live.is_ringing()
+        if i % 100 == 0:
+            assert snapshot.alerthistory == batch.alerthistory
+
+
+def test_live_doubledown_from_history_equals_batch_on_real_data():
+    live = LiveDoubleDownAlertState.from_history(HIST_NOALERT)
+    batch = DoubleDownAlertState(HIST_NOALERT)
+    assert live.snapshot().alerthistory == batch.alerthistory
+
+
+def test_live_doubledown_with_a_nan_equals_batch():
+    df = create_metric_history_df()
+    df.iloc[100, 0] = np.nan
+    df.iloc[134:, 0] *= 0.85
+    live = LiveDoubleDownAlertState.from_history(df)
+    batch = DoubleDownAlertState(df)
+    assert batch.alerthistory
+    assert live.snapshot().alerthistory == batch.alerthistory
+
+
+def test_snapshot_is_independent_of_later_updates():
+    df = create_metric_history_df()
+    df.iloc[-1]["close"] = 0
+    live = LiveDoubleDownAlertState.from_history(df)
+    snapshot = live.snapshot()
+    live.update(pd.Timestamp("2020-08-02", tz="UTC"), 0)
+    assert len(snapshot.alerthistory) == 1
+    assert snapshot.is_ringing() and not live.is_ringing()
+
+
+def test_decreasing_timestamps_are_rejected():
+    live = LiveFluctulertState()
+    live.update("2020-01-02", 1)
+    with pytest.raises(ValueError):
+        live.update("2020-01-01", 1)
+
+
+def test_live_alert_generator_matches_generate_alerts():
+    df = create_metric_history_df()
+    df.loc["2020-07-31", "close"] = 0.7
+    df.loc["2020-08-01", "close"] = 0.5
+    symbol = DummySymbol("EA")
+    template = AlertToTextTemplate("", "", "Price")
+
+    generator = LiveAlertGenerator(
+        LiveDoubleDownAlertState, template, BaseAlertStateRepository("x")
+    )
+    generator.warm_up(symbol, df.iloc[:-2])
+    live_alerts = [
+        generator.update(symbol, timestamp, value)
+        for timestamp, value in df.iloc[-2:]["close"].items()
+    ]
+    batch_alerts = [
+        generate_alerts(
+            alertstate_class=DoubleDownAlertState,
+            metric_history_callback=lambda _, df=df.iloc[:end]: df,
+            symbols=[symbol],
+            template=template,
+            repo=repo,
+        )
+        for repo in [BaseAlertStateRepository("x")]
+        for end in [len(df) - 1, len(df)]
+    ]
+    assert live_alerts == [x[0] if x else None for x in batch_alerts]
+    assert "30% down" in live_alerts[0] and "50% down" in live_alerts[1]
+
+    # Same level again doesn't alert again:
+    assert generator.update(symbol, "2020-08-02", 0.5) is None
@@ -0,0 +1,57 @@
+"""Tests for the `strela.memprofile` module."""
+
+# pylint: disable=missing-function-docstring
+
+import tracemalloc
+from strela.alert_generator import generate_alerts
+from strela.alertstates import BaseAlertStateRepository, DoubleDownAlertState
+from strela.memprofile import MemoryProfiler
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def test_stage_records_peak_and_allocation_sites():
+    profiler = MemoryProfiler(top=3)
+    with profiler:
+        with profiler.stage("big"):
+            data = bytearray(8 * 2**20)
+            del data
+        with profiler.stage("small"):
+            data = bytearray(2**10)
+    assert not tracemalloc.is_tracing()
+    big, small = profiler.stages["big"], profiler.stages["small"]
+    assert big.calls == small.calls == 1
+    assert big.peak_increase >= 8 * 2**20 > small.peak_increase
+    assert big.peak_rss is None or big.peak_rss > 0
+    assert len(small.top_allocations) <= 3
+    assert any("test_memprofile.py" in site for site in small.top_allocations)
+    report = profiler.report()
+    assert report.startswith("big: 1 runs") and "\nsmall: 1 runs" in report
+
+
+def test_stage_is_noop_when_not_tracing():
+    profiler = MemoryProfiler()
+    with profiler.stage("x"):
+        pass
+    assert not profiler.stages
+
+
+def test_generate_alerts_with_profiler(tmp_path):
+    df = create_metric_history_df()
+    df.iloc[-1]["close"] = 0
+    profiler = MemoryProfiler()
+    with profiler:
+        alerts = generate_alerts(
+            alertstate_class=DoubleDownAlertState,
+            metric_history_callback=lambda symbol: df,
+            symbols=[DummySymbol("X"), DummySymbol("Y")],
+            template=AlertToTextTemplate("", "", "Price"),
+            repo=BaseAlertStateRepository("x"),
+            profiler=profiler,
+        )
+    assert len(alerts) == 2
+    assert profiler.stages["fetch"].calls == 3  # (the last one finds no more symbols)
+    assert profiler.stages["render"].calls == 2
+    assert set(profiler.stages) == {"fetch", "state", "repository", "render"}
+    profiler.write_report(str(tmp_path / "report.txt"))
+    assert "render: 2 runs" in (tmp_path / "report.txt").read_text()
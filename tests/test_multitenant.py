@@ -0,0 +1,105 @@
+"""Tests for the `strela.multitenant` module."""
+
+# pylint: disable=missing-function-docstring, no-member
+
+import pytest
+import yagmail
+from tessa.price import PriceHistory
+from tessa.symbol import Symbol
+from strela import config
+from strela.alertstates import AlertStateRepository, FluctulertState
+from strela.multitenant import Tenant, main, run_tenants
+from .helpers import create_metric_history_df
+
+SYMBOL_TEMPLATE = """\
+{name}:
+  source: coingecko
+  strategy: [{strategy}]
+  watch: True
+"""
+
+
+def create_tenant_config(folder, address, names, strategy):
+    folder.mkdir()
+    (folder / "data").mkdir()
+    symbols_file = folder / "symbols.yaml"
+    symbols_file.write_text(
+        "".join(SYMBOL_TEMPLATE.format(name=n, strategy=strategy) for n in names)
+    )
+    config_file = folder / "my_config.py"
+    config_file.write_text(
+        f"SYMBOLS_FILE = {str(symbols_file)!r}\n"
+        f"ALERT_REPOSITORY_FOLDER = {str(folder / 'data')!r}\n"
+        f"MAIL_FROM_ADDRESS = {address!r}\n"
+    )
+    return str(config_file)
+
+
+@pytest.fixture(name="tenant_configs")
+def fixture_tenant_configs(mocker, tmp_path):
+    mocker.patch(
+        "tessa.symbol.Symbol.price_history",
+        return_value=PriceHistory(create_metric_history_df(allsame=False), "USD"),
+    )
+    mocker.patch("yagmail.SMTP")
+    mocker.patch.object(config, "ALERT_REPOSITORY_FOLDER", str(tmp_path))
+    mocker.patch.object(config, "ENABLE_ALL_DOWS", True)
+    return [
+        create_tenant_config(
+            tmp_path / "desk1", "desk1@x.y", ["bitcoin", "ethereum"], "HoldForGrowth"
+        ),
+        create_tenant_config(
+            tmp_path / "desk2",
+            "desk2@x.y",
+            ["ethereum", "solana"],
+            "HoldForDiversification",
+        ),
+    ]
+
+
+def test_tenant_from_config_file(tenant_configs, tmp_path):
+    tenant = Tenant.from_config_file(tenant_configs[0])
+    assert tenant.name == "desk1"
+    assert tenant.mail_to_address == "desk1@x.y"
+    assert tenant.repository_folder == str(tmp_path / "desk1" / "data")
+    (tmp_path / "incomplete.py").write_text("NO_MAIL = True\n")
+    with pytest.raises(ValueError):
+        Tenant.from_config_file(str(tmp_path / "incomplete.py"))
+
+
+def test_symbols_are_fetched_and_evaluated_once(mocker, tenant_configs, tmp_path):
+    init = mocker.spy(FluctulertState, "__init__")
+    main(tenant_configs)
+
+    # 3 unique symbols, not 4:
+    assert Symbol.price_history.call_count == 3  # type: ignore
+    assert init.call_count == 3
+
+    # Every tenant gets its own alerts, rendered with its own symbols:
+    sent = {
+        call.kwargs["to"]: call.kwargs["contents"]
+        for call in yagmail.SMTP().send.call_args_list  # type: ignore
+        if "Fluctulert" in call.kwargs["subject"]
+    }
+    assert "bitcoin" in sent["desk1@x.y"] and "solana" not in sent["desk1@x.y"]
+    assert "HoldForGrowth" in sent["desk1@x.y"]
+    assert "solana" in sent["desk2@x.y"] and "bitcoin" not in sent["desk2@x.y"]
+    assert "HoldForDiversification" in sent["desk2@x.y"]
+
+    # ... and its own repositories:
+    repo = AlertStateRepository(
+        "Crypto-Price-Fluctulert", folder=str(tmp_path / "desk2" / "data")
+    )
+    assert sorted(repo.symbol_names()) == ["ethereum", "solana"]
+    assert sorted(repo.lookup_last_seen()[1]) == ["ethereum", "solana"]
+
+
+def test_tenants_without_mail(mocker, tenant_configs, capsys):
+    tenants = [Tenant.from_config_file(path) for path in tenant_configs]
+    tenants[0].no_mail = True
+    run_tenants(tenants)
+    assert "bitcoin" in capsys.readouterr().out
+    assert all(
+        call.kwargs["to"] == "desk2@x.y"
+        for call in yagmail.SMTP().send.call_args_list  # type: ignore
+    )
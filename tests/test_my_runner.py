@@ -6,6 +6,7 @@ import pytest
 import pandas as pd
 import yagmail
 from tessa.price import PriceHistory, price_history
+from tessa.symbol import Symbol
 from strela import config
 import strela.my_runner as runner
 from .helpers import create_metric_history_df
@@ -31,6 +32,7 @@ testcryptosymbolname:
 """
     )
     config.SYMBOLS_FILE = file
+    mocker.patch.object(config, "ALERT_REPOSITORY_FOLDER", str(tmp_path))
     config.ENABLE_ALL_DOWS = True
     config.MAIL_TO_ADDRESS = config.MAIL_TEST_TO_ADDRESS
 
@@ -48,6 +50,71 @@ def test_price_run(mocker, prepare_environment):
     assert "testcryptosymbolname" in str(yagmail.SMTP().send.call_args)
 
 
+def test_price_run_fetches_each_symbol_once(mocker, prepare_environment):
+    """The crypto categories share their symbol list and thus the fetched histories."""
+    mocker.patch("yagmail.SMTP")
+    runner.run()
+    assert Symbol.price_history.call_count == 1  # type: ignore
+
+
+def test_failing_category_doesnt_lose_other_alerts(mocker, prepare_environment):
+    """All categories that succeed get reported, even if one before them fails."""
+    mocker.patch("yagmail.SMTP")
+    original = runner.generate_alerts
+
+    def generate_alerts(**kwargs):
+        if kwargs["alertstate_class"] is runner.DoubleDownAlertState:
+            raise ValueError("Boom")
+        return original(**kwargs)
+
+    mocker.patch.object(runner, "generate_alerts", side_effect=generate_alerts)
+    with pytest.raises(RuntimeError):
+        runner.run()
+    yagmail.SMTP().send.assert_any_call(
+        to=config.MAIL_TEST_TO_ADDRESS,
+        subject="📈🚨📉 Crypto Price Fluctulert",
+        contents=mocker.ANY,
+    )
+
+
+def test_price_run_compacts_repositories(mocker, prepare_environment):
+    mocker.patch("yagmail.SMTP")
+    mocker.patch.object(config, "REPOSITORY_COMPACTION_INTERVAL", 1)
+    compact = mocker.spy(runner.AlertStateRepository, "compact")
+    runner.run()
+    assert compact.call_count > 0
+    assert compact.call_args.kwargs["keep_symbols"] == ["testcryptosymbolname"]
+
+
+def test_price_run_writes_memory_profile(mocker, prepare_environment, tmp_path):
+    mocker.patch("yagmail.SMTP")
+    mocker.patch.object(config, "MEMORY_PROFILE", True)
+    mocker.patch.object(config, "MEMORY_PROFILE_FOLDER", str(tmp_path))
+    runner.run()
+    (report,) = tmp_path.glob("memory-profile-*.txt")
+    assert "state: " in report.read_text()
+
+
+def test_price_run_can_be_recorded_and_replayed(mocker, prepare_environment, tmp_path):
+    mocker.patch("yagmail.SMTP")
+    mocker.patch.object(config, "RECORD_RUNS", True)
+    runner.run()
+    (recording,) = (tmp_path / "recordings").glob("*.sqlite")
+    sent = list(yagmail.SMTP().send.call_args_list)
+
+    # Replay into fresh repositories, without fetching anything:
+    mocker.patch.object(config, "RECORD_RUNS", False)
+    mocker.patch.object(config, "REPLAY_RUN", str(recording))
+    mocker.patch.object(config, "ALERT_REPOSITORY_FOLDER", str(tmp_path / "replay"))
+    mocker.patch.object(runner.AlertStateRepository, "_FOLDER", tmp_path / "replay")
+    (tmp_path / "replay").mkdir()
+    Symbol.price_history.reset_mock()  # type: ignore
+    yagmail.SMTP().send.reset_mock()
+    runner.run()
+    assert Symbol.price_history.call_count == 0  # type: ignore
+    assert yagmail.SMTP().send.call_args_list == sent
+
+
 @pytest.mark.net
 def test_mailingalert_mail_real(mocker, prepare_environment):
     """This will actually send an email to the user."""
@@ -0,0 +1,61 @@
+"""Tests for the `strela.recording` module."""
+
+# pylint: disable=missing-function-docstring
+
+import time
+import pytest
+from strela.alert_generator import generate_alerts
+from strela.alertstates import BaseAlertStateRepository, FluctulertState
+from strela.recording import RecordedFetchError, RecordingCallback, ReplayCallback
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_random_histories
+
+HISTORIES = create_random_histories(20, seed=3)
+SYMBOLS = [DummySymbol(f"S{i}") for i in range(len(HISTORIES))]
+
+
+def live_history(symbol):
+    if symbol.name == "S5":
+        raise ConnectionError("Timeout")
+    time.sleep(0.01 if symbol.name == "S0" else 0)
+    return HISTORIES[int(symbol.name[1:])]
+
+
+def run(callback):
+    return generate_alerts(
+        FluctulertState,
+        callback,
+        SYMBOLS,
+        AlertToTextTemplate("", "", "Price"),
+        BaseAlertStateRepository("x"),
+    )
+
+
+def test_replay_reproduces_the_run(tmp_path):
+    path = str(tmp_path / "recordings" / "run.sqlite")
+    with RecordingCallback(live_history, path) as callback:
+        alerts = run(callback)
+    assert alerts
+
+    with ReplayCallback(path) as callback:
+        assert len(callback.symbol_names()) == 20
+        assert run(callback) == alerts
+        with pytest.raises(RecordedFetchError, match="Timeout"):
+            callback(DummySymbol("S5"))
+        with pytest.raises(KeyError):
+            callback(DummySymbol("UNKNOWN"))
+
+
+def test_replay_at_recorded_latencies(tmp_path):
+    path = str(tmp_path / "run.sqlite")
+    with RecordingCallback(live_history, path) as callback:
+        callback(DummySymbol("S0"))
+    with ReplayCallback(path, speed=1) as callback:
+        start = time.perf_counter()
+        callback(DummySymbol("S0"))
+        assert time.perf_counter() - start >= 0.01
+
+
+def test_replay_needs_a_recording(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ReplayCallback(str(tmp_path / "missing.sqlite"))
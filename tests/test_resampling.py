@@ -0,0 +1,94 @@
+"""Tests for the `strela.resampling` module."""
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pandas as pd
+import pytest
+from strela.alert_generator import generate_alerts
+from strela.alertstates import BaseAlertStateRepository, DoubleDownAlertState
+from strela.history import History
+from strela import resampling
+from strela.resampling import DailyResampler, resample_daily
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def create_hourly_history(days: int, seed: int = 0) -> History:
+    timestamps = pd.date_range("2020-01-01", periods=24 * days, freq="H")
+    rng = np.random.default_rng(seed)
+    return History(timestamps.to_numpy(), 100 + rng.normal(size=len(timestamps)))
+
+
+@pytest.mark.parametrize(
+    "rule, expected",
+    [
+        ("last", [3, 5]),
+        ("first", [1, 4]),
+        ("min", [0, 4]),
+        ("max", [3, 5]),
+        ("mean", [1.5, 4.5]),
+    ],
+)
+def test_resample_daily(rule, expected):
+    hist = History(
+        pd.to_datetime(
+            ["2020-01-01 09:00", "2020-01-01 12:00", "2020-01-01 15:00"]
+            + ["2020-01-01 18:00", "2020-01-02 09:00", "2020-01-02 18:00"]
+        ).to_numpy(),
+        np.array([1, 2, 0, 3, 4, 5]),
+    )
+    daily = resample_daily(hist, rule)
+    assert daily.to_dataframe().index.equals(
+        pd.DatetimeIndex(["2020-01-01", "2020-01-02"])
+    )
+    assert daily.values.tolist() == expected
+
+
+def test_daily_histories_are_passed_on():
+    hist = History.from_dataframe(create_metric_history_df())
+    assert resample_daily(hist) is hist
+    assert DailyResampler()("A", hist) is hist
+    with pytest.raises(ValueError):
+        DailyResampler("close")
+
+
+def test_resampler_reuses_the_complete_days(mocker):
+    resampler = DailyResampler("min")
+    hist = create_hourly_history(100)
+    first = resampler("A", History(hist.timestamps[:-30], hist.values[:-30]))
+    spy = mocker.spy(resampling, "_resample")
+    second = resampler("A", hist)
+    # Only the last days were resampled, with the same result as from scratch:
+    assert len(spy.call_args.args[0]) == 2 * 24
+    expected = resample_daily(hist, "min")
+    assert np.array_equal(second.timestamps, expected.timestamps)
+    assert np.array_equal(second.values, expected.values)
+    assert np.array_equal(first.values[:-2], second.values[: len(first) - 2])
+
+    # A revised history is resampled from scratch:
+    revised = History(hist.timestamps, hist.values - 1)
+    assert np.array_equal(resampler("A", revised).values, expected.values - 1)
+
+
+def test_generate_alerts_with_intraday_histories():
+    daily = create_metric_history_df()
+    daily.iloc[-1]["close"] = 0
+    # The same history with 24 hourly entries per day, the lowest at the daily value:
+    hourly = daily.loc[daily.index.repeat(24)]
+    hours = np.tile(np.arange(24), len(daily))
+    hourly.index = hourly.index + pd.to_timedelta(hours, "h")
+    hourly = hourly.add(hours, axis=0)
+
+    def run(hist, resampler=None):
+        return generate_alerts(
+            DoubleDownAlertState,
+            lambda _: hist,
+            [DummySymbol("A")],
+            AlertToTextTemplate("", "", "Price"),
+            BaseAlertStateRepository("x"),
+            resampler=resampler,
+        )
+
+    expected = run(daily)
+    assert expected and run(hourly, DailyResampler("min")) == expected
@@ -0,0 +1,161 @@
+"""Tests for the `strela.sharding` module."""
+
+# pylint: disable=missing-function-docstring
+
+import pytest
+from strela.alert_generator import RunStats, generate_alerts
+from strela.alertstates import AlertStateRepository, DoubleDownAlertState
+from strela.sharding import (
+    current_num_shards,
+    load_shard_results,
+    make_shard_tasks,
+    merge_shard_results,
+    partition,
+    rebalance,
+    run_shard,
+    run_sharded,
+    save_shard_result,
+    shard_of,
+    shard_repository_name,
+)
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def dropping_history(symbol):
+    """Module-level (i.e., picklable) callback: Symbols whose name starts with "D" have
+    a drop at the end of their history.
+    """
+    df = create_metric_history_df()
+    if symbol.name.startswith("D"):
+        df.loc["2020-08-01", "close"] = 0.7
+    return df
+
+
+SYMBOLS = [DummySymbol(f"{prefix}{i}") for i in range(20) for prefix in "DX"]
+TEMPLATE = AlertToTextTemplate("", "", "Price")
+
+
+def test_shard_of_is_stable_and_in_range():
+    names = [f"S{i}" for i in range(1000)]
+    shards = [shard_of(name, 7) for name in names]
+    assert shards == [shard_of(name, 7) for name in names]
+    assert set(shards) == set(range(7))
+    with pytest.raises(ValueError):
+        shard_of("X", 0)
+
+
+def test_growing_moves_symbols_only_to_the_new_shard():
+    names = [f"S{i}" for i in range(1000)]
+    moved = [name for name in names if shard_of(name, 4) != shard_of(name, 5)]
+    assert all(shard_of(name, 5) == 4 for name in moved)
+    assert 100 < len(moved) < 300  # ~ 1/5
+
+
+def test_partition():
+    shards = partition(SYMBOLS, 3)
+    assert sorted(i for positions in shards for i in positions) == list(
+        range(len(SYMBOLS))
+    )
+    for shard, positions in enumerate(shards):
+        assert positions == sorted(positions)
+        assert all(shard_of(SYMBOLS[i].name, 3) == shard for i in positions)
+
+
+def test_run_sharded_equals_unsharded(tmpdir):
+    expected = generate_alerts(
+        DoubleDownAlertState,
+        dropping_history,
+        SYMBOLS,
+        TEMPLATE,
+        AlertStateRepository("unsharded", folder=str(tmpdir)),
+    )
+    alerts, stats = run_sharded(
+        DoubleDownAlertState,
+        dropping_history,
+        SYMBOLS,
+        TEMPLATE,
+        "repo",
+        num_shards=3,
+        folder=str(tmpdir),
+    )
+    assert len(alerts) == 20
+    assert alerts == expected
+    assert (stats.symbols, stats.prefiltered, stats.alerts) == (40, 20, 20)
+
+    # The states are stored in the shards:
+    for shard, positions in enumerate(partition(SYMBOLS, 3)):
+        repo = AlertStateRepository(shard_repository_name("repo", shard), str(tmpdir))
+        assert sorted(repo.symbol_names()) == sorted(
+            SYMBOLS[i].name for i in positions if SYMBOLS[i].name.startswith("D")
+        )
+
+    # So a second run doesn't alert again:
+    alerts, stats = run_sharded(
+        DoubleDownAlertState,
+        dropping_history,
+        SYMBOLS,
+        TEMPLATE,
+        "repo",
+        num_shards=3,
+        folder=str(tmpdir),
+    )
+    assert not alerts
+    assert stats.skipped_unchanged == 40
+
+
+@pytest.mark.parametrize("new_num_shards", [5, 2])
+def test_rebalance(tmpdir, new_num_shards):
+    args = (DoubleDownAlertState, dropping_history, SYMBOLS, TEMPLATE, "repo")
+    run_sharded(*args, num_shards=3, folder=str(tmpdir))
+    assert current_num_shards("repo", str(tmpdir)) == 3
+
+    moved = rebalance("repo", new_num_shards, str(tmpdir))
+    assert current_num_shards("repo", str(tmpdir)) == new_num_shards
+    assert moved == sum(
+        shard_of(symbol.name, 3) != shard_of(symbol.name, new_num_shards)
+        for symbol in SYMBOLS
+    )
+    for shard in range(max(3, new_num_shards)):
+        repo = AlertStateRepository(shard_repository_name("repo", shard), str(tmpdir))
+        names = set(repo.symbol_names()) | set(repo.lookup_fingerprints())
+        names |= set(repo.lookup_last_seen()[1])
+        assert all(shard_of(name, new_num_shards) == shard for name in names)
+
+    # Nothing got lost: No alerts and nothing evaluated again, and every symbol still
+    # counts as seen in the latest run.
+    for symbol in SYMBOLS:
+        repo = AlertStateRepository(
+            shard_repository_name("repo", shard_of(symbol.name, new_num_shards)),
+            str(tmpdir),
+        )
+        runs, last_seen = repo.lookup_last_seen()
+        assert last_seen[symbol.name] == runs
+    alerts, stats = run_sharded(*args, num_shards=new_num_shards, folder=str(tmpdir))
+    assert not alerts
+    assert stats.skipped_unchanged == 40
+
+
+def test_shard_results_via_files(tmpdir):
+    tasks = make_shard_tasks(
+        DoubleDownAlertState,
+        dropping_history,
+        SYMBOLS,
+        TEMPLATE,
+        "repo",
+        4,
+        folder=str(tmpdir / "repos"),
+    )
+    for task in reversed(tasks):
+        save_shard_result(run_shard(task), str(tmpdir / "results"))
+    alerts, stats = merge_shard_results(load_shard_results(str(tmpdir / "results"), 4))
+    assert alerts == generate_alerts(
+        DoubleDownAlertState,
+        dropping_history,
+        SYMBOLS,
+        TEMPLATE,
+        AlertStateRepository("unsharded", folder=str(tmpdir)),
+    )
+    assert stats == RunStats(40, 0, 0, 20, 20, 20)
+    with pytest.raises(FileNotFoundError):
+        load_shard_results(str(tmpdir / "results"), 5)
@@ -0,0 +1,57 @@
+"""Tests for the `strela.sharedhistories` module."""
+
+# pylint: disable=missing-function-docstring
+
+import concurrent.futures
+import numpy as np
+import pytest
+from strela.alertstates import DoubleDownAlertState, FluctulertState
+from strela.history import History, as_history
+from strela.sharedhistories import (
+    SharedHistories,
+    evaluate_in_processes,
+    evaluate_shared,
+)
+from .helpers import create_random_histories
+
+
+def test_histories_are_views_on_the_block():
+    histories = [as_history(df) for df in create_random_histories(5, seed=4)]
+    histories.append(History(np.zeros(0, dtype=np.int64), np.zeros(0)))
+    with SharedHistories.create(histories) as shared:
+        attached = SharedHistories.attach(shared.name)
+        assert len(attached) == 6
+        for i, hist in enumerate(histories):
+            view = attached[i]
+            assert np.array_equal(view.timestamps, hist.timestamps)
+            assert np.array_equal(view.values, hist.values, equal_nan=True)
+            assert np.shares_memory(view.values, attached[0].values) == (i == 0)
+            assert not view.values.flags.writeable
+        assert attached.dataframe(0).index.equals(histories[0].to_dataframe().index)
+        del view
+        attached.close()
+
+
+def test_empty_block():
+    with SharedHistories.create([]) as shared:
+        assert len(shared) == 0
+
+
+@pytest.mark.parametrize("alertstate_class", [FluctulertState, DoubleDownAlertState])
+def test_evaluate_in_processes_matches_the_states(alertstate_class):
+    histories = create_random_histories(40, seed=5)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        records = evaluate_in_processes(
+            alertstate_class, histories, executor, chunk_size=7
+        )
+    states = [alertstate_class(hist) for hist in histories]
+    assert len(records) == 40
+    assert records["ringing"].tolist() == [s.is_ringing() for s in states]
+    assert records["status"].tolist() == [s.status()[:32] for s in states]
+    assert any(records["ringing"])
+
+
+def test_evaluate_in_this_process():
+    with SharedHistories.create(create_random_histories(3, seed=6)) as shared:
+        records = evaluate_shared(shared.name, FluctulertState, 1, 3)
+    assert len(records) == 2
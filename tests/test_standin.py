@@ -0,0 +1,75 @@
+"""Tests for the `strela.standin` module."""
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pytest
+from strela.standin import (
+    HttpCallback,
+    StandInError,
+    StandInProfile,
+    StandInSource,
+    StandInSymbol,
+    Throttled,
+    main,
+    run_load_test,
+    serve,
+    synthetic_history,
+)
+
+FAST = dict(median_latency=0.001, latency_sigma=0, history_length=50)
+
+
+def test_synthetic_histories_are_deterministic():
+    hist = synthetic_history("A", 50)
+    assert len(hist) == 50
+    assert np.array_equal(hist.values, synthetic_history("A", 50).values)
+    assert not np.array_equal(hist.values, synthetic_history("B", 50).values)
+
+
+def test_injected_failures():
+    symbol = StandInSymbol("A")
+    with pytest.raises(StandInError):
+        StandInSource(StandInProfile(error_rate=1, **FAST))(symbol)
+    with pytest.raises(Throttled):
+        StandInSource(StandInProfile(throttle_rate=1, **FAST))(symbol)
+    assert len(StandInSource(StandInProfile(**FAST))(symbol)) == 50
+
+
+def test_http_round_trip():
+    server = serve(StandInSource(StandInProfile(**FAST)))
+    host, port = server.server_address[:2]
+    try:
+        hist = HttpCallback(f"http://{host}:{port}")(StandInSymbol("A/B"))
+        assert np.array_equal(hist.values, synthetic_history("A/B", 50).values)
+        assert np.array_equal(hist.timestamps, synthetic_history("A/B", 50).timestamps)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    server = serve(StandInSource(StandInProfile(throttle_rate=1, **FAST)))
+    host, port = server.server_address[:2]
+    try:
+        with pytest.raises(Throttled):
+            HttpCallback(f"http://{host}:{port}")(StandInSymbol("A"))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_load_test():
+    source = StandInSource(
+        StandInProfile(error_rate=0.1, median_latency=0.005, history_length=50)
+    )
+    results = run_load_test(source, symbol_count=100, concurrencies=[1, 8])
+    assert [r.concurrency for r in results] == [1, 8]
+    assert all(0 < r.errors < 30 for r in results)
+    assert all(0 < r.p50 <= r.p95 <= r.p99 <= r.seconds for r in results)
+    # (More concurrency, more throughput and less queueing:)
+    assert results[1].symbols_per_second > results[0].symbols_per_second
+    assert results[1].p99 < results[0].p99
+
+
+def test_cli(capsys):
+    main(["--symbols", "20", "--concurrency", "2", "--median-latency", "0", "--http"])
+    assert "concurrency    2:" in capsys.readouterr().out
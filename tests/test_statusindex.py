@@ -0,0 +1,108 @@
+"""Tests for the `strela.statusindex` module."""
+
+# pylint: disable=missing-function-docstring
+
+from strela.alert_generator import generate_alerts
+from strela.alertstates import (
+    AlertStateRepository,
+    BaseAlertStateRepository,
+    DoubleDownAlertState,
+    FluctulertState,
+)
+from strela.statusindex import StatusEntry, StatusIndex, main
+from strela.templates import AlertToTextTemplate
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def create_entry(symbol: str, status: str, ringing: bool = False) -> StatusEntry:
+    return StatusEntry(
+        "repo", symbol, "DoubleDownAlertState", ringing, status, 1.0, None, "now"
+    )
+
+
+def test_update_and_query():
+    index = StatusIndex(":memory:")
+    index.update(
+        [
+            create_entry("A", "20% (4×)", ringing=True),
+            create_entry("B", "10% (2×)"),
+            create_entry("C", ""),
+            create_entry("D", None),
+        ]
+    )
+    assert [e.symbol for e in index.query(ringing=True)] == ["A"]
+    assert [e.symbol for e in index.query(active=True)] == ["A", "B"]
+    assert [e.symbol for e in index.query(active=False)] == ["C"]
+    assert len(index.query(alert_type="DoubleDownAlertState", repo="repo")) == 4
+    assert not index.query(alert_type="FluctulertState")
+
+    index.update([create_entry("A", "")])
+    index.remove("repo", "B")
+    assert not index.query(active=True)
+    assert index.query(symbol="A")[0] == create_entry("A", "")
+
+
+def test_generate_alerts_keeps_the_index_up_to_date(tmpdir):
+    index = StatusIndex(str(tmpdir / "index.sqlite"))
+    dropping = create_metric_history_df()
+    dropping.iloc[-1]["close"] = 0
+    # (An active double-down level that isn't ringing anymore, and whose last value
+    # alone couldn't activate one:)
+    dropped = create_metric_history_df()
+    dropped.iloc[-20:, 0] = 0.85
+    dropped.iloc[-15:, 0] = 0.95
+    histories = {
+        "DROP": dropping,
+        "DROPPED": dropped,
+        "FLAT": create_metric_history_df(),
+    }
+    symbols = [DummySymbol(name) for name in histories]
+    for alertstate_class in [DoubleDownAlertState, FluctulertState]:
+        generate_alerts(
+            alertstate_class,
+            lambda symbol: histories[symbol.name],
+            symbols,
+            AlertToTextTemplate("", "", "Price"),
+            AlertStateRepository(
+                alertstate_class.__name__, str(tmpdir), status_index=index
+            ),
+        )
+
+    entries = index.query(ringing=True)
+    assert [(e.repo, e.symbol) for e in entries] == [
+        ("doubledownalertstate", "DROP"),
+        ("fluctulertstate", "DROP"),
+    ]
+    assert entries[0].status == "50% (10×)"
+    assert entries[1].status.startswith("3d↓")
+    assert entries[0].latest_value == 0 and entries[0].as_of == "2020-08-01T00:00:00"
+    # (Not ringing, but active, so the prefilter keeps it:)
+    active = index.query(active=True, alert_type="DoubleDownAlertState")
+    assert [(e.symbol, e.ringing, e.status) for e in active] == [
+        ("DROP", True, "50% (10×)"),
+        ("DROPPED", False, "10% (2×)"),
+    ]
+    # The flat histories are prefiltered, which proves they're not active:
+    flat = index.query(symbol="FLAT")
+    assert len(flat) == 2
+    assert all(not e.ringing and e.status == "" for e in flat)
+
+    # Removing a state removes its entry:
+    AlertStateRepository("FluctulertState", str(tmpdir), index).delete_state("DROP")
+    assert len(index.query(symbol="DROP")) == 1
+
+
+def test_in_memory_repository_without_index():
+    repo = BaseAlertStateRepository("x")
+    repo.record_status(FluctulertState, [])
+    repo.delete_state("X")
+
+
+def test_cli(tmpdir, capsys):
+    index = StatusIndex(str(tmpdir / "index.sqlite"))
+    index.update([create_entry("A", "20% (4×)", ringing=True), create_entry("B", "")])
+    index.close()
+    main(["--db", str(tmpdir / "index.sqlite"), "--active"])
+    out = capsys.readouterr().out
+    assert "20% (4×)" in out and " B " not in out
+    assert "1 entries." in out
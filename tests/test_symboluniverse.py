@@ -0,0 +1,115 @@
+"""Test the cached loading of the symbol universe."""
+
+# pylint: disable=missing-function-docstring
+
+import os
+import pickle
+import pytest
+from tessa.symbol import SymbolCollection
+from strela import config
+from strela.symboluniverse import load_symbol_universe, default_cache_path
+
+SYMBOLS_YAML = """\
+bitcoin:
+  source: coingecko
+  watch: True
+MSFT:
+  watch: True
+ethereum:
+  source: coingecko
+AAPL:
+  watch: True
+"""
+
+
+@pytest.fixture(autouse=True)
+def patch_repository_folder(mocker, tmp_path):
+    """The cache goes to the repository folder; use a temporary one."""
+    folder = tmp_path / "repo"
+    folder.mkdir()
+    mocker.patch.object(config, "ALERT_REPOSITORY_FOLDER", str(folder))
+
+
+@pytest.fixture(name="symbols_file")
+def fixture_symbols_file(tmp_path):
+    file = tmp_path / "symbols.yaml"
+    file.write_text(SYMBOLS_YAML)
+    yield file
+
+
+@pytest.fixture(name="load_yaml_spy")
+def fixture_load_yaml_spy(mocker):
+    yield mocker.spy(SymbolCollection, "load_yaml")
+
+
+def test_select(symbols_file):
+    universe = load_symbol_universe(symbols_file)
+    assert len(universe) == 4
+    names = lambda symbols: [s.name for s in symbols]
+    assert names(universe.select(watch=True, source="coingecko")) == ["bitcoin"]
+    assert names(universe.select(watch=True, exclude_source="coingecko")) == [
+        "MSFT",
+        "AAPL",
+    ]
+    assert names(universe.select(source="coingecko")) == ["bitcoin", "ethereum"]
+    assert names(universe.select()) == ["bitcoin", "MSFT", "ethereum", "AAPL"]
+
+
+def test_second_load_uses_cache(symbols_file, load_yaml_spy):
+    load_symbol_universe(symbols_file)
+    assert os.path.isfile(default_cache_path(symbols_file))
+    universe = load_symbol_universe(symbols_file)
+    assert load_yaml_spy.call_count == 1
+    assert [s.name for s in universe.select(watch=True)] == ["bitcoin", "MSFT", "AAPL"]
+
+
+def test_touched_but_unchanged_file_uses_cache(symbols_file, load_yaml_spy):
+    load_symbol_universe(symbols_file)
+    stat = os.stat(symbols_file)
+    os.utime(symbols_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    load_symbol_universe(symbols_file)
+    assert load_yaml_spy.call_count == 1
+
+
+def test_changed_file_invalidates_cache(symbols_file, load_yaml_spy):
+    load_symbol_universe(symbols_file)
+    symbols_file.write_text(SYMBOLS_YAML + "GOOG:\n  watch: True\n")
+    stat = os.stat(symbols_file)
+    os.utime(symbols_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    universe = load_symbol_universe(symbols_file)
+    assert load_yaml_spy.call_count == 2
+    assert universe.symbols[-1].name == "GOOG"
+
+
+def test_unwritable_cache_is_not_an_error(symbols_file, tmp_path):
+    cache_path = str(tmp_path / "nonexisting-folder" / "cache")
+    assert len(load_symbol_universe(symbols_file, cache_path=cache_path)) == 4
+
+
+def test_cache_is_in_repository_folder(symbols_file):
+    load_symbol_universe(symbols_file)
+    assert os.path.dirname(default_cache_path(symbols_file)) == (
+        config.ALERT_REPOSITORY_FOLDER
+    )
+    # (Nothing gets written next to the symbols file.)
+    assert sorted(os.listdir(os.path.dirname(symbols_file))) == ["repo", "symbols.yaml"]
+
+
+def test_cache_of_other_tessa_version_is_ignored(symbols_file, load_yaml_spy):
+    load_symbol_universe(symbols_file)
+    cache_path = default_cache_path(symbols_file)
+    with open(cache_path, "rb") as file:
+        cached = pickle.load(file)
+    cached["tessa_version"] = "0.0.1"
+    with open(cache_path, "wb") as file:
+        pickle.dump(cached, file)
+    load_symbol_universe(symbols_file)
+    assert load_yaml_spy.call_count == 2
+
+
+def test_no_cache_without_repository_folder(mocker, symbols_file, load_yaml_spy):
+    mocker.patch.object(config, "ALERT_REPOSITORY_FOLDER", None)
+    assert default_cache_path(symbols_file) is None
+    load_symbol_universe(symbols_file)
+    load_symbol_universe(symbols_file)
+    assert load_yaml_spy.call_count == 2
@@ -0,0 +1,142 @@
+"""Tests for the `strela.thresholds` module."""
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pytest
+from strela.alert_generator import RunStats, generate_alerts, generate_symbol_alerts
+from strela.alertstates import (
+    BaseAlertStateRepository,
+    DoubleDownAlertState,
+    FluctulertState,
+)
+from strela.symboluniverse import load_symbol_universe
+from strela.templates import AlertToTextTemplate
+from strela.thresholds import SymbolThresholds, ThresholdSymbol, resolve_thresholds
+from .helpers import DummySymbol, create_random_histories
+
+
+def test_resolve_thresholds():
+    defaults = FluctulertState.default_thresholds()
+    assert np.array_equal(resolve_thresholds(FluctulertState, None), defaults)
+    assert np.array_equal(resolve_thresholds(FluctulertState, 2), 2 * defaults)
+    triggers = list(range(1, len(defaults) + 1))
+    assert np.array_equal(resolve_thresholds(FluctulertState, triggers), triggers)
+    with pytest.raises(ValueError):
+        resolve_thresholds(FluctulertState, [0.1, 0.2])
+    with pytest.raises(ValueError, match="positive"):
+        resolve_thresholds(FluctulertState, -1)
+    with pytest.raises(ValueError, match="ascending"):
+        resolve_thresholds(DoubleDownAlertState, [0.5, 0.4, 0.3, 0.2, 0.1])
+    with pytest.raises(ValueError, match=r"in \(0, 1\)"):
+        resolve_thresholds(DoubleDownAlertState, 2)  # (Up to a 100% decline.)
+
+
+def test_thresholds_from_the_symbols_file(tmp_path):
+    symbols_file = tmp_path / "symbols.yaml"
+    symbols_file.write_text(
+        "BTC:\n"
+        "  alert_thresholds:\n"
+        "    FluctulertState: 2\n"
+        "    DoubleDownAlertState: [0.2, 0.3, 0.4, 0.5, 0.6]\n"
+        "AAPL:\n"
+        "  watch: true\n",
+        encoding="utf-8",
+    )
+    universe = load_symbol_universe(
+        symbols_file, which_class=ThresholdSymbol, cache_path=str(tmp_path / "cache")
+    )
+    table = SymbolThresholds.from_symbols(DoubleDownAlertState, universe.symbols)
+    assert table.names == ["BTC"]
+    aligned = table.aligned(["AAPL", "BTC", "XYZ"])
+    assert np.array_equal(aligned[1], [0.2, 0.3, 0.4, 0.5, 0.6])
+    assert list(table.is_default(aligned)) == [True, False, True]
+
+    # (A subclass uses the entry of its base class.)
+    class MyFluctulertState(FluctulertState):
+        pass
+
+    table = SymbolThresholds.from_symbols(MyFluctulertState, universe.symbols)
+    assert np.array_equal(
+        table.aligned(["BTC"])[0], 2 * FluctulertState.default_thresholds()
+    )
+
+
+def test_invalid_thresholds_fail_when_loaded():
+    symbols = [
+        DummySymbol("GOOD"),
+        DummySymbol("BAD"),
+    ]
+    symbols[0].alert_thresholds = {"DoubleDownAlertState": 1.5}  # type: ignore
+    symbols[1].alert_thresholds = {  # type: ignore
+        "DoubleDownAlertState": [0.2, 0.1, 0.3, 0.4, 0.5]
+    }
+    with pytest.raises(ValueError, match="DoubleDownAlertState thresholds of BAD"):
+        SymbolThresholds.from_symbols(DoubleDownAlertState, symbols)
+
+
+def test_states_use_their_thresholds():
+    histories = create_random_histories(20, seed=3)
+    for hist in histories:
+        state = FluctulertState(hist, thresholds=np.full(8, np.inf))
+        assert not state.is_ringing()
+    with pytest.raises(ValueError):
+        DoubleDownAlertState(histories[0], thresholds=[0.5, 0.4, 0.3, 0.2, 0.1])
+    state = DoubleDownAlertState(histories[0], thresholds=[0.2, 0.3, 0.4, 0.5, 0.6])
+    assert [level.trigger for level in state.levels] == [0.2, 0.3, 0.4, 0.5, 0.6]
+    assert DoubleDownAlertState.levels[0].trigger == 0.1
+
+
+@pytest.mark.parametrize("alertstate_class", [FluctulertState, DoubleDownAlertState])
+def test_generate_alerts_with_per_symbol_thresholds(alertstate_class):
+    histories = create_random_histories(600, seed=1)
+    symbols = [DummySymbol(f"S{i}") for i in range(len(histories))]
+    table = SymbolThresholds(
+        alertstate_class, {f"S{i}": [0.5, 1, 1.5][i % 3] for i in range(0, 600, 2)}
+    )
+    expected = [
+        symbol.name
+        for symbol, hist, thresholds in zip(
+            symbols, histories, table.aligned([s.name for s in symbols])
+        )
+        if alertstate_class(hist, thresholds=thresholds).is_ringing()
+    ]
+    for prefilter in [False, True]:
+        stats = RunStats()
+        alerts = generate_symbol_alerts(
+            alertstate_class,
+            lambda symbol: histories[int(symbol.name[1:])],
+            symbols,
+            AlertToTextTemplate("", "", "Price"),
+            BaseAlertStateRepository("x"),
+            stats=stats,
+            prefilter=prefilter,
+            thresholds=table,
+        )
+        assert [symbol.name for symbol, _ in alerts] == expected
+        assert (stats.prefiltered > 0) == prefilter
+    # (The thresholds make a difference.)
+    assert expected != [
+        symbol.name
+        for symbol, hist in zip(symbols, histories)
+        if alertstate_class(hist).is_ringing()
+    ]
+
+
+def test_changed_thresholds_are_evaluated_again():
+    histories = create_random_histories(50, seed=2)
+    symbols = [DummySymbol(f"S{i}") for i in range(len(histories))]
+    repo = BaseAlertStateRepository("x")
+    for thresholds, evaluated in [(None, 50), (None, 0), (2, 1), (2, 0)]:
+        stats = RunStats()
+        generate_alerts(
+            FluctulertState,
+            lambda symbol: histories[int(symbol.name[1:])],
+            symbols,
+            AlertToTextTemplate("", "", "Price"),
+            repo,
+            stats=stats,
+            prefilter=False,
+            thresholds=thresholds and SymbolThresholds(FluctulertState, {"S7": 2}),
+        )
+        assert stats.evaluated == evaluated
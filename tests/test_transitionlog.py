@@ -0,0 +1,93 @@
+"""Tests for the `strela.transitionlog` module."""
+
+# pylint: disable=missing-function-docstring
+
+import os
+import numpy as np
+from strela.alert_generator import generate_alerts
+from strela.alertstates import AlertStateRepository, DoubleDownAlertState
+from strela.history import History
+from strela.templates import AlertToTextTemplate
+from strela.transitionlog import TRANSITION_RECORD, TransitionLog
+from .helpers import DummySymbol, create_metric_history_df
+
+
+def fill(log, count):
+    for day in range(count):
+        log.append(
+            "repo",
+            f"S{day % 3}",
+            bytes([day]) * 16,
+            float(day),
+            "2020-01-01",
+            timestamp=np.datetime64("2021-01-01") + np.timedelta64(day, "D"),
+        )
+
+
+def test_append_and_query(tmp_path):
+    log = TransitionLog(str(tmp_path / "log"), segment_records=4)
+    fill(log, 10)
+    transitions = log.query(start="2021-01-03", end="2021-01-07")
+    assert [t.latest_value for t in transitions] == [2, 3, 4, 5]
+    assert transitions[0].fingerprint == bytes([2]) * 16
+    assert transitions[0].as_of == np.datetime64("2020-01-01")
+    assert [t.latest_value for t in log.timeline("S1")] == [1, 4, 7]
+    assert not log.query(repo="other")
+    assert len(log.query()) == 10
+    log.close()
+
+    # Reopened, incl. a record that got truncated:
+    (segment,) = [n for n in os.listdir(tmp_path / "log") if n.endswith("03.log")]
+    with open(tmp_path / "log" / segment, "ab") as file:
+        file.write(b"\0" * (TRANSITION_RECORD.itemsize // 2))
+    log = TransitionLog(str(tmp_path / "log"), segment_records=4)
+    fill(log, 1)  # (An earlier timestamp is moved up to the latest one.)
+    assert len(log.query()) == 11
+    assert log.query()[-1].timestamp == np.datetime64("2021-01-10")
+
+
+def test_compact(tmp_path):
+    log = TransitionLog(str(tmp_path / "log"), segment_records=4)
+    fill(log, 10)
+    log.segment_records = 100
+    assert log.compact(before="2021-01-04") == (3, 1)
+    assert [t.latest_value for t in log.query()] == list(range(3, 10))
+    fill(log, 1)
+    log.close()
+    segments = [n for n in os.listdir(tmp_path / "log") if n.endswith(".log")]
+    assert len(segments) == 1
+    assert len(TransitionLog(str(tmp_path / "log")).query()) == 8
+
+
+def test_interrupted_compaction_leaves_the_old_segments(tmp_path):
+    log = TransitionLog(str(tmp_path / "log"), segment_records=4)
+    fill(log, 10)
+    log.close()
+    # (A new segment written before the switch to the new manifest:)
+    (tmp_path / "log" / "segment-00000009.log").write_bytes(b"garbage")
+    log = TransitionLog(str(tmp_path / "log"))
+    assert len(log.query()) == 10
+    assert not (tmp_path / "log" / "segment-00000009.log").exists()
+
+
+def test_generate_alerts_logs_the_alerts(tmp_path):
+    log = TransitionLog(str(tmp_path / "log"))
+    repo = AlertStateRepository("x", str(tmp_path), transition_log=log)
+    dropping = create_metric_history_df()
+    dropping.iloc[-1]["close"] = 0
+    histories = {"DROP": dropping, "FLAT": create_metric_history_df()}
+    symbols = [DummySymbol(name) for name in histories]
+    for _ in range(2):
+        generate_alerts(
+            DoubleDownAlertState,
+            lambda symbol: histories[symbol.name],
+            symbols,
+            AlertToTextTemplate("", "", "Price"),
+            repo,
+        )
+    # (The second run doesn't alert again.)
+    (transition,) = log.query()
+    assert (transition.repo, transition.symbol) == ("x", "DROP")
+    assert transition.latest_value == 0
+    assert transition.fingerprint == History.from_dataframe(dropping).fingerprint()
+    assert transition.as_of == np.datetime64("2020-08-01")
@@ -0,0 +1,159 @@
+"""Test the VolatilityFluctulertState class and the rolling moments behind it."""
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pytest
+from strela.alert_generator import RunStats, generate_alerts
+from strela.alertstates import (
+    BaseAlertStateRepository,
+    FluctulertState,
+    LiveVolatilityFluctulertState,
+    VolatilityFluctulertState,
+)
+from strela.history import NS_PER_DAY, History
+from strela import indicators as indicators_module
+from strela.indicators import RollingMoments, indicators_for
+from strela.templates import AlertToTextTemplate
+from strela.thresholds import SymbolThresholds
+from .helpers import DummySymbol, create_random_histories
+
+
+def random_walk(volatility: float, last_move: float, length: int = 400) -> History:
+    rng = np.random.default_rng(0)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, volatility, length)))
+    if last_move:
+        values[-1] = values[-4] * (1 + last_move)
+    return History((np.arange(length) + 18_000) * NS_PER_DAY, values)
+
+
+def test_rolling_moments_are_accurate():
+    rng = np.random.default_rng(0)
+    values = 1e9 + rng.normal(0, 1, 1000)
+    moments = RollingMoments(90)
+    for i, value in enumerate(values.tolist()):
+        moments.update(value)
+        if i % 37 == 0 or i == len(values) - 1:
+            window = values[max(i - 89, 0) : i + 1]
+            assert moments.mean == pytest.approx(window.mean(), abs=1e-6)
+            if len(window) > 1:
+                assert moments.variance == pytest.approx(window.var(ddof=1), rel=1e-6)
+            # (Bit for bit from the tail only.)
+            tail = RollingMoments.from_values(values[: i + 1], 90)
+            assert (tail.mean, tail.variance) == (moments.mean, moments.variance)
+    assert np.isnan(RollingMoments(90).variance)
+
+
+def test_rolling_moments_leave_out_missing_values():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 1, 500)
+    values[rng.choice(500, 60, replace=False)] = np.nan
+    values[:20] = np.nan
+    moments = RollingMoments(30)
+    for i, value in enumerate(values.tolist()):
+        moments.update(value)
+        window = values[max(i - 29, 0) : i + 1]
+        window = window[np.isfinite(window)]
+        if len(window) > 1:
+            assert moments.mean == pytest.approx(window.mean(), abs=1e-12)
+            assert moments.variance == pytest.approx(window.var(ddof=1), rel=1e-9)
+        else:
+            assert np.isnan(moments.variance)
+        start = RollingMoments.tail_start(i + 1, 30)
+        tail = RollingMoments.from_values(values[start : i + 1], 30, offset=start)
+        assert np.array_equal(
+            [tail.mean, tail.variance], [moments.mean, moments.variance], equal_nan=True
+        )
+    with pytest.raises(ValueError):
+        RollingMoments.from_values(values[-10:], 30, offset=490)
+
+
+def test_return_moments_only_read_the_tail(mocker):
+    spy = mocker.spy(indicators_module, "log_returns")
+    hist = random_walk(0.01, 0, length=5000)
+    _, variance = indicators_for(hist).return_moments(90)
+    assert len(spy.call_args.args[0]) <= 2 * 90 + 1
+    returns = np.diff(np.log(hist.values))[-90:]
+    assert variance == pytest.approx(returns.var(ddof=1))
+
+
+def test_triggers_scale_with_the_volatility():
+    calm = random_walk(0.005, 0.04)
+    assert not FluctulertState(calm).is_ringing()
+    state = VolatilityFluctulertState(calm)
+    assert state.is_ringing()
+    returns = np.diff(np.log(calm.values))[-90:]
+    assert state.volatility == pytest.approx(returns.std(ddof=1))
+    assert [ps.dtrigger for ps in state.stats][:2] == [0.025, 0.035]
+    assert "(Volatility 0.6%/d)" in state.textify()  # (Incl. the move.)
+
+    volatile = random_walk(0.06, 0)
+    state = VolatilityFluctulertState(volatile)
+    scale = state.volatility / VolatilityFluctulertState.reference_volatility
+    assert scale > 2
+    assert [ps.dtrigger for ps in state.stats][:2] == pytest.approx(
+        [0.05 * scale, 0.07 * scale]
+    )
+
+    def ringing_periods(state):
+        return sum(ps.mintriggers() or ps.maxtriggers() for ps in state.stats)
+
+    assert ringing_periods(state) < ringing_periods(FluctulertState(volatile))
+
+
+def test_short_histories_use_the_fixed_triggers():
+    state = VolatilityFluctulertState(random_walk(0.06, 0, length=2))
+    assert np.isnan(state.volatility)
+    assert [ps.dtrigger for ps in state.stats] == [
+        trigger for _, trigger in FluctulertState.period_trigger_config
+    ]
+
+
+@pytest.mark.parametrize("with_thresholds", [False, True])
+def test_prefilter_doesnt_change_alerts(with_thresholds):
+    histories = create_random_histories(600, seed=4)
+    symbols = [DummySymbol(f"S{i}") for i in range(len(histories))]
+    thresholds = None
+    if with_thresholds:
+        thresholds = SymbolThresholds(
+            VolatilityFluctulertState, {f"S{i}": 0.5 for i in range(0, 600, 3)}
+        )
+    results = []
+    for prefilter in [False, True]:
+        stats = RunStats()
+        alerts = generate_alerts(
+            VolatilityFluctulertState,
+            lambda symbol: histories[int(symbol.name[1:])],
+            symbols,
+            AlertToTextTemplate("", "", "Price"),
+            BaseAlertStateRepository("x"),
+            stats=stats,
+            prefilter=prefilter,
+            thresholds=thresholds,
+        )
+        results.append((alerts, stats))
+    (alerts, _), (prefiltered_alerts, prefiltered_stats) = results
+    assert alerts and prefiltered_alerts == alerts
+    assert prefiltered_stats.prefiltered > 0
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_live_state_equals_batch(seed):
+    hist = create_random_histories(4 * (seed + 1), seed=seed)[-1]
+    values = hist.values.copy()
+    values[len(values) // 2] = np.nan
+    hist = History(hist.timestamps, values)
+    live = LiveVolatilityFluctulertState()
+    for i, (timestamp, value) in enumerate(zip(hist.timestamps, hist.values)):
+        live.update(timestamp, value)
+        if i % 40 == 0 or i == len(hist) - 1:
+            batch = VolatilityFluctulertState(
+                History(hist.timestamps[: i + 1], hist.values[: i + 1])
+            )
+            snapshot = live.snapshot()
+            assert np.array_equal(
+                [(p.dtrigger, p.dmin, p.dmax) for p in snapshot.stats],
+                [(p.dtrigger, p.dmin, p.dmax) for p in batch.stats],
+                equal_nan=True,
+            )
+            assert live.is_ringing() == batch.is_ringing()